@@ -0,0 +1,222 @@
+"""
+Move animations from board state deltas.
+
+A delta from the undo cache says which pieces moved, which were removed and
+which were added, which is all an animation needs: moved pieces slide from
+square to square, removed pieces fade out and added pieces fade in (or the
+other way around when stepping back). Progress depends only on the time
+elapsed since the animation started, never on the number of frames, so a
+dropped frame makes pieces jump ahead rather than slow down.
+
+The Animator queues animations and plays them one after another. When
+moves arrive faster than they can be shown (replaying a game, stepping
+through history), queued animations speed up, and fast_forward() skips them.
+
+Does not import pygame; positions are in board squares and drawing is up to
+the caller (board.BoardView).
+"""
+
+import time
+from collections import deque
+
+from boardstate import BoardState, Delta
+
+MOVE_TIME = 0.2  # seconds per animation at normal speed
+MAX_SPEEDUP = 8  # fastest catch-up speed when animations are queued
+
+
+def square_position(sq: int) -> tuple[float, float]:
+    """
+    :param sq: the square, from 0 (a1) to 63 (h8).
+    :return: (file, rank) of the square, from (0, 0) to (7, 7).
+    """
+    return float(sq & 7), float(sq >> 3)
+
+
+def ease(t: float) -> float:
+    """
+    Smoothstep: starts and ends slowly.
+
+    :param t: linear progress, from 0 to 1.
+    :return: eased progress, from 0 to 1.
+    """
+    return t * t * (3 - 2 * t)
+
+
+class MoveAnimation:
+    """
+    One delta, animated forwards (playing a move) or backwards (undoing it).
+    """
+
+    __slots__ = ("delta", "reverse", "duration", "squares")
+
+    def __init__(self, delta: Delta, reverse: bool = False,
+                 duration: float = MOVE_TIME) -> None:
+        """
+        Constructor.
+
+        :param delta: the delta between the two board states.
+        :param reverse: (optional) animate from the later state back to the
+                        earlier one.
+        :param duration: (optional) length in seconds.
+        """
+        self.delta = delta
+        self.reverse = reverse
+        self.duration = duration
+        # every square whose piece is drawn by the animation rather than
+        # from the board state
+        self.squares = frozenset(
+            [sq for fr, to, _ in delta.moved for sq in (fr, to)]
+            + [sq for sq, _ in delta.removed + delta.added])
+
+    def sprites(self, t: float) -> list[tuple[int, float, float, float]]:
+        """
+        Get where the animated pieces are at some point of the animation.
+
+        :param t: linear progress, from 0 to 1.
+        :return: (value, file, rank, opacity) of each piece, with values as
+                 in BoardState and opacity from 0 to 1; fading pieces first,
+                 so moving pieces are drawn on top.
+        """
+        if self.reverse:
+            t = 1 - t
+        sprites = [(value, *square_position(sq), 1 - t)
+                   for sq, value in self.delta.removed]
+        sprites += [(value, *square_position(sq), t)
+                    for sq, value in self.delta.added]
+
+        e = ease(t)
+        for fr, to, value in self.delta.moved:
+            (x0, y0), (x1, y1) = square_position(fr), square_position(to)
+            opacity = 1.0
+            if any(sq == to for sq, _ in self.delta.added):
+                opacity = 1 - t  # promoted: the new piece fades in over it
+            sprites.append((value, x0 + (x1 - x0) * e, y0 + (y1 - y0) * e,
+                            opacity))
+        return sprites
+
+
+class Animator:
+    """
+    Plays move animations one after another on a board state.
+
+    The board state always shows the end of the current animation: a
+    delta is applied (or reverted) when its animation starts, and the
+    animation draws the pieces on its squares until it ends.
+    """
+
+    def __init__(self, state: BoardState = None) -> None:
+        """
+        Constructor.
+
+        :param state: (optional) the starting board state; defaults to an
+                      empty board. It is changed in place as animations
+                      start.
+        """
+        self.state = BoardState() if state is None else state
+        self.queue: deque[tuple[Delta, bool]] = deque()
+        self.current: MoveAnimation = None
+        self.start = 0.0  # time.perf_counter() when current started
+        # changes whenever the pieces that are not animated change
+        self.version = 0
+
+    def play(self, delta: Delta, reverse: bool = False) -> None:
+        """
+        Queue the animation of a delta.
+
+        :param delta: the delta from the current end state to the next.
+        :param reverse: (optional) animate undoing the delta instead; it
+                        must be the last delta applied.
+        """
+        now = time.perf_counter()
+        if not self.queue and (self.current is None or now - self.start
+                               >= self.current.duration):
+            if self.current is not None:
+                self.current = None
+                self.version += 1
+            self.start = now  # not since the last animation ended
+        self.queue.append((delta, reverse))
+
+    def set_state(self, state: BoardState) -> None:
+        """
+        Jump to a board state without animating, dropping queued
+        animations.
+
+        :param state: the new board state; it is copied.
+        """
+        self.queue.clear()
+        self.current = None
+        self.state = state.copy()
+        self.version += 1
+
+    def fast_forward(self) -> None:
+        """
+        Finish the current animation and all queued ones at once.
+        """
+        self.current = None
+        while self.queue:
+            self._apply(*self.queue.popleft())
+        self.version += 1
+
+    def update(self, now: float = None) -> MoveAnimation | None:
+        """
+        Advance to a point in time: finish animations that are over and
+        start queued ones, carrying over the time left so the sequence
+        keeps its pace even if frames were dropped.
+
+        :param now: (optional) a time.perf_counter() time; defaults to now.
+        :return: the animation playing at that time, if any.
+        """
+        if now is None:
+            now = time.perf_counter()
+        while True:
+            if self.current is not None:
+                if now - self.start < self.current.duration:
+                    return self.current
+                self.start += self.current.duration
+                self.current = None
+                self.version += 1
+            if not self.queue:
+                return None
+
+            delta, reverse = self.queue.popleft()
+            self._apply(delta, reverse)
+            speedup = min(1 + len(self.queue), MAX_SPEEDUP)
+            self.current = MoveAnimation(delta, reverse, MOVE_TIME / speedup)
+            self.version += 1
+
+    def is_animating(self, now: float = None) -> bool:
+        """
+        :param now: (optional) a time.perf_counter() time; defaults to now.
+        :return: whether an animation is playing.
+        """
+        return self.update(now) is not None
+
+    def hidden(self, now: float = None) -> frozenset[int]:
+        """
+        :param now: (optional) a time.perf_counter() time; defaults to now.
+        :return: the squares whose pieces the current animation draws, so a
+                 static board layer should leave them out.
+        """
+        current = self.update(now)
+        return frozenset() if current is None else current.squares
+
+    def sprites(self, now: float = None) \
+            -> list[tuple[int, float, float, float]]:
+        """
+        :param now: (optional) a time.perf_counter() time; defaults to now.
+        :return: the animated pieces at that time, as from
+                 MoveAnimation.sprites(); empty when nothing is playing.
+        """
+        if now is None:
+            now = time.perf_counter()
+        current = self.update(now)
+        if current is None:
+            return []
+        return current.sprites((now - self.start) / current.duration)
+
+    def _apply(self, delta: Delta, reverse: bool) -> None:
+        if reverse:
+            self.state.revert(delta)
+        else:
+            self.state.apply(delta)
@@ -0,0 +1,243 @@
+"""
+Lazy asset manager.
+
+Paths are relative to the repository root (e.g. "res/font/...ttf"), so the
+game starts from any working directory. Nothing is read from disk until it
+is first used; preload() reads images ahead of time in a background thread
+while the first frames are drawn.
+
+For a faster cold start, build a bundle of every image already decoded to
+raw pixels, from this directory:
+
+$ python3 assets.py --bundle
+
+The bundle lives in src/cache and is ignored once any image changes.
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+import pygame
+import pygame.freetype
+from pygame import Surface
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     "..", ".."))
+CACHE_DIR = os.path.join(ROOT, "src", "cache")
+BUNDLE_PATH = os.path.join(CACHE_DIR, "assets.bundle")
+BUNDLE_VERSION = 1
+IMAGE_PATTERNS = ["res/pieces/*/*.png"]
+
+# pygame renamed tostring/fromstring to tobytes/frombytes in 2.1.3
+_to_bytes = getattr(pygame.image, "tobytes", None) or pygame.image.tostring
+_from_bytes = getattr(pygame.image, "frombytes", None) \
+    or pygame.image.fromstring
+
+
+def asset_path(relative: str) -> str:
+    """
+    Resolve a path relative to the repository root.
+
+    :param relative: e.g. "res/pieces/fide/icon.png".
+    :return: the absolute path.
+    """
+    return os.path.join(ROOT, relative)
+
+
+def image_paths() -> list[str]:
+    """
+    :return: every image the game may load, relative to the repository root.
+    """
+    return sorted(os.path.relpath(path, ROOT).replace(os.sep, "/")
+                  for pattern in IMAGE_PATTERNS
+                  for path in glob.glob(asset_path(pattern)))
+
+
+def _bundle_key(paths: list[str]) -> str:
+    """
+    :param paths: images in the bundle.
+    :return: a key that changes whenever any of the images does.
+    """
+    digest = hashlib.sha256(bytes([BUNDLE_VERSION]))
+    for path in paths:
+        stat = os.stat(asset_path(path))
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def build_bundle(path: str = BUNDLE_PATH) -> int:
+    """
+    Decode every image and save the raw pixels in one file.
+
+    :param path: (optional) where to write the bundle.
+    :return: the number of images bundled.
+    """
+    paths = image_paths()
+    images = {}
+    for relative in paths:
+        surface = pygame.image.load(asset_path(relative))
+        images[relative] = (surface.get_size(), _to_bytes(surface, "RGBA"))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}"
+    with open(temporary, "wb") as file:
+        pickle.dump((_bundle_key(paths), images), file,
+                    pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+    return len(images)
+
+
+#===============================================================================
+# Fonts
+#===============================================================================
+class LazyFont:
+    """
+    A freetype font that is only opened when first used. Stands in for
+    pygame.freetype.Font everywhere a font is expected.
+    """
+
+    def __init__(self, path: str, size: float) -> None:
+        """
+        Constructor.
+
+        :param path: font file, relative to the repository root.
+        :param size: default text size.
+        """
+        self.path = path
+        self.size = size
+        self._font: pygame.freetype.Font = None
+
+    def load(self) -> pygame.freetype.Font:
+        """
+        Open the font, if it isn't open yet.
+
+        :return: the font.
+        """
+        if self._font is None:
+            if not pygame.freetype.get_init():
+                pygame.freetype.init()
+            self._font = pygame.freetype.Font(asset_path(self.path),
+                                              self.size)
+        return self._font
+
+    def __getattr__(self, name: str):
+        return getattr(self.load(), name)
+
+
+#===============================================================================
+# Images
+#===============================================================================
+class AssetManager:
+    """
+    Loads images on first use (or ahead of time with preload()) and keeps
+    them for the rest of the run.
+    """
+
+    def __init__(self, bundle: str = BUNDLE_PATH) -> None:
+        """
+        Constructor. Reads nothing yet.
+
+        :param bundle: (optional) path of the precompiled bundle, used if
+                       it exists and is up to date.
+        """
+        self.bundle = bundle
+        self._bundled: dict[str, tuple[tuple[int, int], bytes]] = None
+        self._loaded: dict[str, Surface | None] = {}  # not converted yet
+        self._images: dict[str, Surface | None] = {}  # ready to blit
+        self._lock = threading.Lock()
+
+    def image(self, path: str) -> Surface | None:
+        """
+        Get an image, loading it now if it wasn't loaded or preloaded yet.
+        Once the display is set up, images are converted to its pixel
+        format.
+
+        :param path: image file, relative to the repository root.
+        :return: the image, or None if the file does not exist (e.g. an army
+                 with no artwork yet).
+        """
+        image = self._images.get(path)
+        if image is not None or path in self._images:
+            return image
+
+        with self._lock:
+            image = self._load(path)
+        if image is not None and pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+            self._images[path] = image
+        elif image is None:
+            self._images[path] = None
+        return image
+
+    def preload(self, paths: list[str] = None) -> threading.Thread:
+        """
+        Load images in a background thread.
+
+        :param paths: (optional) images to load; defaults to image_paths().
+        :return: the (daemon) thread, already started.
+        """
+        def work() -> None:
+            for path in image_paths() if paths is None else paths:
+                with self._lock:
+                    self._load(path)
+
+        thread = threading.Thread(target=work, name="preload", daemon=True)
+        thread.start()
+        return thread
+
+    def _load(self, path: str) -> Surface | None:
+        """
+        Decode an image from the bundle or from its file. Call with the lock
+        held.
+        """
+        if path in self._loaded:
+            return self._loaded[path]
+        if self._bundled is None:
+            self._bundled = self._read_bundle()
+
+        if path in self._bundled:
+            size, pixels = self._bundled.pop(path)
+            image = _from_bytes(pixels, size, "RGBA")
+        elif os.path.exists(asset_path(path)):
+            image = pygame.image.load(asset_path(path))
+        else:
+            image = None
+        self._loaded[path] = image
+        return image
+
+    def _read_bundle(self) -> dict:
+        try:
+            with open(self.bundle, "rb") as file:
+                key, images = pickle.load(file)
+            if key == _bundle_key(list(images)):
+                return images
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            pass
+        return {}
+
+
+ASSETS = AssetManager()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Asset bundle tools.")
+    parser.add_argument("--bundle", action="store_true",
+                        help=f"build {os.path.relpath(BUNDLE_PATH)}")
+    args = parser.parse_args()
+
+    if args.bundle:
+        start = time.perf_counter()
+        count = build_bundle()
+        print(f"bundled {count} images in "
+              f"{time.perf_counter() - start:.2f} s")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
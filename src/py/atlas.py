@@ -0,0 +1,116 @@
+"""
+Piece sprite atlas.
+
+All piece images of all armies are scaled to the board's square size once
+and packed into a single surface converted to the display's pixel format,
+so drawing a piece is one plain blit of an area of that surface: no
+per-pixel format conversion and no scaling per frame. The atlas is rebuilt
+only when a resolution change changes the square size.
+"""
+
+import math
+
+import pygame
+from pygame import Surface, Rect
+from pygame.locals import SRCALPHA
+
+from settings import *
+
+
+def get_square_size() -> int:
+    """
+    Get the absolute size of a board square at the current resolution.
+
+    :return: the side of a square, in pixels.
+    """
+    return max(1, int(get_resolution()[1] * BOARD_SQUARE_SCALAR))
+
+
+class SpriteAtlas:
+    """
+    Every piece image, pre-scaled and packed into one surface.
+    """
+
+    def __init__(self, pieces: list[Piece] = None) -> None:
+        """
+        Constructor. The atlas is built on first use, since converting
+        surfaces needs the display to be set up.
+
+        :param pieces: (optional) pieces to pack; defaults to PIECES.
+        """
+        self.pieces = PIECES if pieces is None else pieces
+        self.square = 0
+        self.surface: Surface = None
+        self.rects: dict[tuple[int, int], Rect] = {}  # (code, color) -> area
+        add_listener(self._on_settings)
+
+    def build(self, square: int) -> None:
+        """
+        Scale every piece image to a square size and pack them in a grid.
+
+        :param square: the side of a board square, in pixels.
+        """
+        images = [((piece.code, color), image)
+                  for piece in self.pieces
+                  for color, image in enumerate((piece.white, piece.black))
+                  if image is not None]
+        columns = max(1, math.ceil(math.sqrt(len(images))))
+        rows = max(1, math.ceil(len(images) / columns))
+
+        surface = Surface((columns * square, rows * square), SRCALPHA)
+        self.rects = {}
+        for i, (key, image) in enumerate(images):
+            rect = Rect(i % columns * square, i // columns * square,
+                        square, square)
+            surface.blit(pygame.transform.smoothscale(image, rect.size), rect)
+            self.rects[key] = rect
+
+        self.surface = surface.convert_alpha()
+        self.square = square
+
+    def get(self, code: int, color: int) -> Rect | None:
+        """
+        Get the area of a piece's sprite, building the atlas on first use.
+
+        :param code: piece code, as in pieces.csv.
+        :param color: 0 for White, 1 for Black.
+        :return: the sprite's area within self.surface, or None if the piece
+                 has no image.
+        """
+        if self.surface is None:
+            self.build(get_square_size())
+        return self.rects.get((code, color))
+
+    def blit(self, surface: Surface, code: int, color: int,
+             position: tuple[float, float]) -> Rect | None:
+        """
+        Draw a piece.
+
+        :param surface: the surface to draw onto.
+        :param code: piece code, as in pieces.csv.
+        :param color: 0 for White, 1 for Black.
+        :param position: absolute (x, y) of the square's top left corner.
+        :return: the area drawn, or None if the piece has no image.
+        """
+        area = self.get(code, color)
+        if area is None:
+            return None
+        return surface.blit(self.surface, position, area)
+
+    def sprite(self, code: int, color: int) -> Surface | None:
+        """
+        Get a piece's sprite as a surface sharing the atlas's pixels, e.g.
+        for animations that need a Surface.
+
+        :param code: piece code, as in pieces.csv.
+        :param color: 0 for White, 1 for Black.
+        :return: a subsurface of the atlas, or None if the piece has no
+                 image. It becomes stale when the atlas is rebuilt.
+        """
+        area = self.get(code, color)
+        return None if area is None else self.surface.subsurface(area)
+
+    def _on_settings(self) -> None:
+        # only a resolution change can change the square size
+        if self.surface is not None and self.square != get_square_size():
+            self.build(get_square_size())
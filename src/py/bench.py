@@ -0,0 +1,283 @@
+"""
+Headless frame-time benchmark.
+
+Runs each screen under SDL's dummy video driver (no window) at several
+resolutions, replaying scripted mouse and keyboard input: the pointer visits
+and clicks every component, types into every text box, then idles. Records
+per-frame times, per-component draw times and memory allocated per frame,
+and writes them to a JSON file. Usage, from this directory:
+
+$ python3 bench.py --output bench.json
+$ python3 bench.py --baseline bench.json
+
+With --baseline, exits with status 1 if any screen's 95th percentile frame
+time got more than --tolerance slower than in the baseline file.
+"""
+
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # before pygame starts
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import pygame
+from pygame.event import Event
+from pygame.locals import *
+
+from settings import *
+from renderer import Renderer
+from ui import Drawable, TextBox
+import menu, choose
+
+SCREENS = {"menu": menu, "choose": choose}
+RESOLUTIONS = [(1280, 720), (1920, 1080), (3840, 2160)]
+
+
+#===============================================================================
+# Input script
+#===============================================================================
+def _mouse(kind: int, position: tuple[int, int]) -> Event:
+    if kind == MOUSEMOTION:
+        return Event(kind, pos=position, rel=(0, 0), buttons=(0, 0, 0))
+    return Event(kind, pos=position, button=1)
+
+
+def _key(key: int, unicode: str) -> Event:
+    return Event(KEYDOWN, key=key, unicode=unicode, mod=0)
+
+
+def make_script(screen, frames: int) -> list[list[Event]]:
+    """
+    Script the input of a benchmark run, one list of events per frame.
+
+    :param screen: the screen module.
+    :param frames: total number of frames; frames after the scripted input
+                   have no input (idle).
+    :return: the events of each frame.
+    """
+    script = []
+    for component in screen.components:
+        x, y = component.get_rect().center
+        script += [[_mouse(MOUSEMOTION, (x, y))], [],
+                   [_mouse(MOUSEBUTTONDOWN, (x, y))], [],
+                   [_mouse(MOUSEBUTTONUP, (x, y))], []]
+        if isinstance(component, TextBox):
+            script += [[_key(ord(char), char)] for char in "Player 1"]
+            script += [[_key(K_BACKSPACE, "")]] * 3
+        script += [[_mouse(MOUSEMOTION, (0, 0))], []]
+    script = script[:frames]
+    return script + [[] for _ in range(frames - len(script))]
+
+
+def _reset(screen) -> None:
+    """
+    Put a screen's components back in their initial state.
+    """
+    screen.pointer.reset()
+    screen.pointer.focused = None
+    for component in screen.components:
+        if isinstance(component, TextBox):
+            component.text = ""
+            component.selected = False
+
+
+def _name(index: int, component: Drawable) -> str:
+    text = getattr(component, "text", "") or getattr(component, "prompt", "")
+    return f"{index}:{type(component).__name__}:{text}"
+
+
+#===============================================================================
+# Measurement
+#===============================================================================
+def run(name: str, resolution: tuple[int, int], frames: int) -> dict:
+    """
+    Benchmark one screen at one resolution.
+
+    :param name: key of SCREENS.
+    :param resolution: display size.
+    :param frames: frames to measure.
+    :return: the measurements.
+    """
+    screen = SCREENS[name]
+    display = pygame.display.set_mode(resolution)
+    set_resolution(resolution)
+    _reset(screen)
+    script = make_script(screen, frames)
+
+    # time each component's draw by wrapping it on the instance
+    draw_times = {_name(i, c): [] for i, c in enumerate(screen.components)}
+    for i, component in enumerate(screen.components):
+        def timed(surface, draw=component.draw,
+                  times=draw_times[_name(i, component)]):
+            start = time.perf_counter()
+            draw(surface)
+            times.append(time.perf_counter() - start)
+        component.draw = timed
+
+    try:
+        frame_times, painted = _play(screen, display, script)
+    finally:
+        for component in screen.components:
+            del component.draw
+
+    # again with allocation tracing, which would skew the times above
+    _reset(screen)
+    tracemalloc.start()
+    try:
+        alloc_peaks, net_blocks = _play(screen, display, script, True)
+    finally:
+        tracemalloc.stop()
+
+    return dict(
+        screen=name,
+        resolution=list(resolution),
+        frames=frames,
+        input_frames=sum(1 for events in script if events),
+        frame_ms=summarize(frame_times),
+        painted_pixels=summarize(painted, scale=1),
+        alloc_peak_bytes=summarize(alloc_peaks, scale=1),
+        net_blocks=summarize(net_blocks, scale=1),
+        components={key: dict(draws=len(times),
+                              mean_ms=round(1000 * statistics.fmean(times), 4)
+                              if times else 0.0)
+                    for key, times in draw_times.items()},
+    )
+
+
+def _play(screen, display: pygame.Surface, script: list[list[Event]],
+          allocations: bool = False) -> tuple[list[float], list[float]]:
+    """
+    Replay a script, rendering each frame like the main loop does.
+
+    :return: per frame, the time in seconds and the pixels repainted; or,
+             if allocations is set, the peak bytes allocated (tracemalloc
+             must be running) and the net change in allocated blocks.
+    """
+    renderer = Renderer()
+    first, second = [], []
+    for events in script:
+        if allocations:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+
+        for event in events:
+            if event.type == KEYDOWN:
+                screen.send_key_down(event)
+            else:
+                screen.send_mouse(event)
+        rects = renderer.draw(display, screen)
+        screen.update()
+
+        if allocations:
+            first.append(tracemalloc.get_traced_memory()[1] - base)
+            second.append(sys.getallocatedblocks() - blocks)
+        else:
+            first.append(time.perf_counter() - start)
+            second.append(sum(rect.width * rect.height for rect in rects))
+        pygame.event.clear()  # events posted by clicked buttons
+    return first, second
+
+
+def summarize(values: list[float], scale: float = 1000) -> dict:
+    """
+    :param values: one measurement per frame.
+    :param scale: (optional) multiplier, e.g. 1000 for seconds to ms.
+    :return: mean, median, 95th and 99th percentiles and maximum.
+    """
+    ordered = sorted(value * scale for value in values)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return dict(mean=round(statistics.fmean(ordered), 4),
+                p50=round(percentile(0.5), 4),
+                p95=round(percentile(0.95), 4),
+                p99=round(percentile(0.99), 4),
+                max=round(ordered[-1], 4))
+
+
+def regressions(results: dict, baseline: dict,
+                tolerance: float) -> list[str]:
+    """
+    Compare 95th percentile frame times with a baseline.
+
+    :param results: output of this run.
+    :param baseline: output of an earlier run.
+    :param tolerance: allowed slowdown, e.g. 0.2 for 20%.
+    :return: one message per screen and resolution that got slower.
+    """
+    before = {(entry["screen"], tuple(entry["resolution"])): entry
+              for entry in baseline["runs"]}
+    messages = []
+    for entry in results["runs"]:
+        w, h = entry["resolution"]
+        old = before.get((entry["screen"], (w, h)))
+        if old is None:
+            continue
+        new_p95, old_p95 = entry["frame_ms"]["p95"], old["frame_ms"]["p95"]
+        if new_p95 > old_p95 * (1 + tolerance):
+            messages.append(f"{entry['screen']} at {w}x{h}: p95 "
+                            f"{old_p95:.3f} -> {new_p95:.3f} ms")
+    return messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--screens", nargs="+", default=list(SCREENS),
+                        choices=SCREENS)
+    parser.add_argument("--resolutions", nargs="+", metavar="WxH",
+                        default=[f"{w}x{h}" for w, h in RESOLUTIONS])
+    parser.add_argument("--frames", type=int, default=300,
+                        help="frames per screen and resolution")
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="earlier output to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed p95 slowdown against the baseline")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:  # read first, in case it is also the output file
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    pygame.init()
+    results = dict(
+        python=platform.python_version(),
+        pygame=pygame.version.ver,
+        sdl_driver=os.environ["SDL_VIDEODRIVER"],
+        time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        runs=[],
+    )
+    for name in args.screens:
+        for resolution in args.resolutions:
+            w, h = map(int, resolution.lower().split("x"))
+            result = run(name, (w, h), args.frames)
+            results["runs"].append(result)
+            frame = result["frame_ms"]
+            print(f"{name:<8}{w:>5}x{h:<5} mean {frame['mean']:.3f} ms, "
+                  f"p95 {frame['p95']:.3f} ms, max {frame['max']:.3f} ms",
+                  flush=True)
+    pygame.quit()
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=1)
+
+    if baseline is not None:
+        messages = regressions(results, baseline, args.tolerance)
+        for message in messages:
+            print(f"regression: {message}")
+        if messages:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
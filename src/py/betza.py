@@ -0,0 +1,398 @@
+"""
+Compiler from Betza's funny notation to precomputed move tables.
+
+Notation is read left to right as a series of atoms, each optionally
+preceded by lowercase modifiers and followed by a range:
+
+* Atoms: W (1,0), F (1,1), D (2,0), N (2,1), A (2,2), H (3,0), C (3,1),
+  Z (3,2), G (3,3), and the compounds K = WF, R = WW, B = FF, Q = RB.
+* Range: a doubled atom (WW, NN) slides without limit, and a number (W4, R4)
+  slides at most that many steps. A bare atom leaps.
+* Mode: m moves without capturing, c only captures.
+* Direction: f(orward), b(ack), l(eft), r(ight), h(orizontal), v = fb and
+  s = lr. Several letters select every direction any of them selects, except
+  that f or b directly followed by l or r selects only the directions between
+  the two (e.g. flF). For oblique atoms like N, v and s select the moves that
+  go further vertically and sideways respectively.
+
+Directions are from White's point of view; Black's tables are mirrored.
+Compiled tables are cached on disk, keyed by the contents of pieces.csv.
+"""
+
+import hashlib
+import os
+import pickle
+
+CACHE_VERSION = 2
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "..", "cache")
+
+#===============================================================================
+# Parsing
+#===============================================================================
+MOVE = 1
+CAPTURE = 2
+BOTH = MOVE | CAPTURE
+
+ATOMS = {
+    "W": (1, 0), "F": (1, 1), "D": (2, 0), "N": (2, 1), "A": (2, 2),
+    "H": (3, 0), "C": (3, 1), "Z": (3, 2), "G": (3, 3),
+}
+
+# compound letter -> list of (atom, range)
+COMPOUNDS = {
+    "K": [("W", 1), ("F", 1)],
+    "R": [("W", 0)],
+    "B": [("F", 0)],
+    "Q": [("W", 0), ("F", 0)],
+}
+
+
+def symmetric(x: int, y: int) -> list[tuple[int, int]]:
+    """
+    Get every reflection and rotation of a leap.
+
+    :param x: one coordinate of the leap.
+    :param y: the other coordinate of the leap.
+    :return: the distinct (dx, dy) offsets of the leap.
+    """
+    offsets = []
+    for a, b in ((x, y), (y, x)):
+        for dx, dy in ((a, b), (-a, b), (a, -b), (-a, -b)):
+            if (dx, dy) not in offsets:
+                offsets.append((dx, dy))
+    return offsets
+
+
+def _selector(letters: str):
+    """
+    Build a direction predicate from modifier letters.
+
+    :param letters: direction letters, e.g. "fh" or "fl".
+    :return: a predicate on (dx, dy), or None if every direction is allowed.
+    """
+    letters = letters.replace("fb", "v").replace("bf", "v") \
+        .replace("lr", "s").replace("rl", "s")
+    if not letters:
+        return None
+
+    def single(letter: str):
+        if letter == "f":
+            return lambda dx, dy: dy > 0
+        if letter == "b":
+            return lambda dx, dy: dy < 0
+        if letter == "l":
+            return lambda dx, dy: dx < 0
+        if letter == "r":
+            return lambda dx, dy: dx > 0
+        if letter == "h":
+            return lambda dx, dy: dy == 0
+        if letter == "v":
+            return lambda dx, dy: abs(dy) > abs(dx) if dx and dy else dy != 0
+        if letter == "s":
+            return lambda dx, dy: abs(dx) > abs(dy) if dx and dy else dx != 0
+        raise ValueError(f"unknown direction modifier {letter!r}")
+
+    parts = []
+    i = 0
+    while i < len(letters):
+        if letters[i] in "fb" and i + 1 < len(letters) \
+                and letters[i + 1] in "lr":
+            first, second = single(letters[i]), single(letters[i + 1])
+            parts.append(lambda dx, dy, p=first, q=second:
+                         p(dx, dy) and q(dx, dy))
+            i += 2
+        else:
+            parts.append(single(letters[i]))
+            i += 1
+    return lambda dx, dy: any(part(dx, dy) for part in parts)
+
+
+def parse(notation: str) -> list[tuple[int, int, int, int]]:
+    """
+    Parse funny notation into movement atoms.
+
+    :param notation: e.g. "fhRhbK".
+    :return: a list of (dx, dy, range, mode) atoms, from White's point of
+             view. A range of 1 is a leap and 0 an unlimited slide.
+    """
+    result = []
+    i = 0
+    while i < len(notation):
+        start = i
+        while i < len(notation) and notation[i].islower():
+            i += 1
+        modifiers = notation[start:i]
+        if i == len(notation):
+            raise ValueError(f"modifiers without a piece in {notation!r}")
+        letter = notation[i]
+        i += 1
+
+        if letter in COMPOUNDS:
+            parts = COMPOUNDS[letter]
+        elif letter in ATOMS:
+            parts = [(letter, 1)]
+        else:
+            raise ValueError(f"unknown piece letter {letter!r} in {notation!r}")
+
+        if i < len(notation) and notation[i] == letter and letter in ATOMS:
+            parts = [(letter, 0)]
+            i += 1
+        digits = i
+        while i < len(notation) and notation[i].isdigit():
+            i += 1
+        if digits < i:
+            parts = [(atom, int(notation[digits:i])) for atom, _ in parts]
+
+        mode = BOTH
+        if "m" in modifiers:
+            mode = MOVE
+        elif "c" in modifiers:
+            mode = CAPTURE
+        keep = _selector(modifiers.replace("m", "").replace("c", ""))
+
+        for atom, rng in parts:
+            for dx, dy in symmetric(*ATOMS[atom]):
+                if keep is None or keep(dx, dy):
+                    atom_tuple = (dx, dy, rng, mode)
+                    if atom_tuple not in result:
+                        result.append(atom_tuple)
+    return result
+
+
+def is_colorbound(atoms: list[tuple[int, int, int, int]]) -> bool:
+    """
+    Get whether a piece can only ever reach squares of one color.
+
+    :param atoms: movement atoms from parse().
+    :return: whether every atom keeps the square color.
+    """
+    return all((dx + dy) % 2 == 0 for dx, dy, _, _ in atoms)
+
+
+#===============================================================================
+# Tables
+#===============================================================================
+def _leap_table(offsets: list[tuple[int, int]]) -> list[int]:
+    """
+    Precompute the squares reached by a set of leaps from every square.
+
+    :param offsets: (dx, dy) offsets of the leaps.
+    :return: a list of 64 bitboards.
+    """
+    table = []
+    for sq in range(64):
+        x, y = sq & 7, sq >> 3
+        bb = 0
+        for dx, dy in offsets:
+            if 0 <= x + dx < 8 and 0 <= y + dy < 8:
+                bb |= 1 << (x + dx + 8 * (y + dy))
+        table.append(bb)
+    return table
+
+
+_rays: dict[tuple[int, int, int], list[int]] = {}
+
+
+def _ray_table(dx: int, dy: int, rng: int) -> list[int]:
+    """
+    Precompute (or fetch) the squares on an empty board reached by sliding
+    in one direction from every square.
+
+    :param dx: file step.
+    :param dy: rank step.
+    :param rng: maximum number of steps, or 0 for unlimited.
+    :return: a list of 64 bitboards.
+    """
+    key = (dx, dy, rng)
+    if key not in _rays:
+        table = []
+        for sq in range(64):
+            x, y = sq & 7, sq >> 3
+            bb = 0
+            steps = 0
+            while True:
+                x, y = x + dx, y + dy
+                steps += 1
+                if not (0 <= x < 8 and 0 <= y < 8) or (rng and steps > rng):
+                    break
+                bb |= 1 << (x + 8 * y)
+            table.append(bb)
+        _rays[key] = table
+    return _rays[key]
+
+
+def ride(sq: int, ray: list[int], full: list[int], positive: bool,
+         occupied: int) -> int:
+    """
+    Get the squares attacked by a slide, stopping at the first blocker.
+
+    :param sq: starting square.
+    :param ray: (possibly range-limited) ray table of the slide.
+    :param full: unlimited ray table in the same direction.
+    :param positive: whether square indices increase along the ray.
+    :param occupied: bitboard of all occupied squares.
+    :return: bitboard of attacked squares, including the blocker.
+    """
+    attacks = ray[sq]
+    blockers = attacks & occupied
+    if blockers:
+        if positive:
+            attacks &= ~full[(blockers & -blockers).bit_length() - 1]
+        else:
+            attacks &= ~full[blockers.bit_length() - 1]
+    return attacks
+
+
+class MoveTables:
+    """
+    Precomputed move and attack tables of one piece type for one color.
+    """
+
+    def __init__(self, atoms: list[tuple[int, int, int, int]]) -> None:
+        """
+        Constructor.
+
+        :param atoms: (dx, dy, range, mode) atoms, already oriented for
+                      the color these tables belong to.
+        """
+        self.leaps = self.quiet_leaps = self.capture_leaps = None
+        self.rides = []
+        self.reverse_rides = []
+
+        reverse_leaps = []
+        for mode in (BOTH, MOVE, CAPTURE):
+            offsets = [(dx, dy) for dx, dy, rng, m in atoms
+                       if rng == 1 and m == mode]
+            if not offsets:
+                continue
+            table = _leap_table(offsets)
+            if mode == BOTH:
+                self.leaps = table
+            elif mode == MOVE:
+                self.quiet_leaps = table
+            else:
+                self.capture_leaps = table
+            if mode & CAPTURE:
+                reverse_leaps += [(-dx, -dy) for dx, dy in offsets]
+        self.reverse_leaps = _leap_table(reverse_leaps)
+
+        for dx, dy, rng, mode in atoms:
+            if rng == 1:
+                continue
+            self.rides.append((_ray_table(dx, dy, rng), _ray_table(dx, dy, 0),
+                               dy * 8 + dx > 0, mode))
+            if mode & CAPTURE:
+                self.reverse_rides.append(
+                    (_ray_table(-dx, -dy, rng), _ray_table(-dx, -dy, 0),
+                     dy * 8 + dx < 0)
+                )
+
+        # every square this piece could attack a given square from,
+        # ignoring blockers; used to skip pieces cheaply in attack tests
+        self.reach = list(self.reverse_leaps)
+        for ray, _, _ in self.reverse_rides:
+            for sq in range(64):
+                self.reach[sq] |= ray[sq]
+
+        # the forward counterparts, for attack maps
+        self.attack_leaps = [
+            (self.leaps[sq] if self.leaps is not None else 0)
+            | (self.capture_leaps[sq] if self.capture_leaps is not None
+               else 0)
+            for sq in range(64)
+        ]
+        self.capture_rides = [(ray, full, positive)
+                              for ray, full, positive, mode in self.rides
+                              if mode & CAPTURE]
+
+    def targets(self, sq: int, own: int, enemy: int) -> int:
+        """
+        Get the pseudo-legal destination squares of a piece.
+
+        :param sq: square the piece stands on.
+        :param own: bitboard of the mover's pieces.
+        :param enemy: bitboard of the opponent's pieces.
+        :return: bitboard of destination squares.
+        """
+        occupied = own | enemy
+        targets = 0
+        if self.leaps is not None:
+            targets = self.leaps[sq] & ~own
+        if self.quiet_leaps is not None:
+            targets |= self.quiet_leaps[sq] & ~occupied
+        if self.capture_leaps is not None:
+            targets |= self.capture_leaps[sq] & enemy
+        for ray, full, positive, mode in self.rides:
+            attacks = ride(sq, ray, full, positive, occupied)
+            if mode == BOTH:
+                targets |= attacks & ~own
+            elif mode == MOVE:
+                targets |= attacks & ~occupied
+            else:
+                targets |= attacks & enemy
+        return targets
+
+    def attacks(self, sq: int, occupied: int) -> int:
+        """
+        Get the squares a piece attacks, i.e. could capture on if an enemy
+        piece stood there, including squares of its own side (defended).
+
+        :param sq: square the piece stands on.
+        :param occupied: bitboard of all pieces.
+        :return: bitboard of attacked squares.
+        """
+        attacks = self.attack_leaps[sq]
+        for ray, full, positive in self.capture_rides:
+            attacks |= ride(sq, ray, full, positive, occupied)
+        return attacks
+
+
+def compile_notation(notation: str) -> tuple[MoveTables, MoveTables]:
+    """
+    Compile funny notation into move tables for both colors.
+
+    :param notation: e.g. "fhRhbK".
+    :return: a (White tables, Black tables) pair.
+    """
+    atoms = parse(notation)
+    return (MoveTables(atoms),
+            MoveTables([(dx, -dy, rng, mode) for dx, dy, rng, mode in atoms]))
+
+
+#===============================================================================
+# Disk cache
+#===============================================================================
+def load(notations: list[str], source: bytes) \
+        -> dict[str, tuple[MoveTables, MoveTables]]:
+    """
+    Compile a set of notations, reusing the disk cache if it was built
+    from the same source data.
+
+    :param notations: funny notation strings to compile.
+    :param source: contents of the file the notations came from; the cache
+                   is rebuilt whenever it changes.
+    :return: a map from notation to (White tables, Black tables).
+    """
+    key = hashlib.sha256(source + bytes([CACHE_VERSION])).hexdigest()
+    path = os.path.join(CACHE_DIR, "betza.pickle")
+
+    try:
+        with open(path, "rb") as file:
+            cached_key, tables = pickle.load(file)
+        if cached_key == key and all(n in tables for n in notations):
+            return tables
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError,
+            AttributeError):
+        pass
+
+    tables = {notation: compile_notation(notation) for notation in notations}
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}"
+        with open(temporary, "wb") as file:
+            pickle.dump((key, tables), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    except OSError:
+        pass  # read-only install; compiling again next time is fine
+    return tables
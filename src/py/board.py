@@ -1,9 +1,196 @@
 """Board UI components."""
 
+import time
+
 import pygame
+from pygame import Surface, Rect
 from pygame.locals import *
 
-from constants import *
+from settings import *
+from animation import Animator
+from atlas import SpriteAtlas, get_square_size
+from boardstate import BoardState, Delta
+from ui import Drawable, Transition
+
+
+class BoardView(Drawable):
+    """
+    The board and its pieces, with moves animated.
+
+    The squares and every piece that is not moving are pre-composited onto
+    a static layer, rebuilt only when those pieces or the layout change, so
+    a frame of an animation is one blit of the layer plus one blit per
+    moving piece.
+    """
+
+    def __init__(self, position: tuple[float, float], sprites: SpriteAtlas,
+                 state: BoardState = None) -> None:
+        """
+        Constructor.
+
+        :param position: board center's (x, y) relative position.
+        :param sprites: the piece sprites.
+        :param state: (optional) the board state to show; it is copied.
+        """
+        self.position = position
+        self.sprites = sprites
+        self.animator = Animator(None if state is None else state.copy())
+
+        self.rect: Rect = None
+        self.square = 0
+        self.layer: Surface = None
+        self.layer_key: tuple = None
+        self.faded: dict[int, Surface] = {}  # value -> sprite copy
+        self.threats = 0  # bitboard of squares outlined, for assist mode
+
+    def play(self, delta: Delta) -> None:
+        """
+        Animate a move.
+
+        :param delta: the delta from the board state shown last.
+        """
+        self.animator.play(delta)
+
+    def undo(self, delta: Delta) -> None:
+        """
+        Animate taking back a move.
+
+        :param delta: the delta of the move, from the undo cache.
+        """
+        self.animator.play(delta, reverse=True)
+
+    def set_state(self, state: BoardState) -> None:
+        """
+        Show a board state without animating.
+
+        :param state: the board state; it is copied.
+        """
+        self.animator.set_state(state)
+
+    def show_threats(self, threats: int) -> None:
+        """
+        Outline squares, e.g. the pieces the opponent attacks, from
+        Position.threats(). Cheap to call every frame: the static layer is
+        only rebuilt when the squares change.
+
+        :param threats: bitboard of squares; 0 for none.
+        """
+        self.threats = threats
+
+    def fast_forward(self) -> None:
+        """
+        Skip to the end of all queued animations, e.g. when jumping through
+        history.
+        """
+        self.animator.fast_forward()
+
+    def update_layout(self) -> None:
+        """
+        Resolve the board's absolute bounds and square size.
+        """
+        self.square = get_square_size()
+        size = 8 * self.square
+        self.rect = Rect(0, 0, size, size)
+        self.rect.center = (self.position[0] * get_resolution()[0],
+                            self.position[1] * get_resolution()[1])
+        self.faded.clear()
+
+    def draw(self, surface: Surface) -> None:
+        """
+        Draw the board to the given surface.
+
+        :param surface: the surface to draw to.
+        """
+        self.check_layout()
+        now = time.perf_counter()
+        sprites = self.animator.sprites(now)
+
+        key = (self._layout_key, self.animator.version, self.threats)
+        if key != self.layer_key:
+            self.layer_key = key
+            self.build_layer(self.animator.hidden(now))
+        surface.blit(self.layer, self.rect)
+
+        for value, file, rank, opacity in sprites:
+            self.blit_piece(surface, value, file, rank, opacity)
+
+    def build_layer(self, hidden: frozenset[int]) -> None:
+        """
+        Draw the squares and the pieces that are not animated onto the
+        static layer.
+
+        :param hidden: squares whose pieces are left out.
+        """
+        if self.layer is None or self.layer.get_size() != self.rect.size:
+            self.layer = Surface(self.rect.size).convert()
+        for sq in range(64):
+            file, rank = sq & 7, sq >> 3
+            area = Rect(file * self.square, (7 - rank) * self.square,
+                        self.square, self.square)
+            self.layer.fill(C_LIGHT_SQUARE if (file + rank) & 1
+                            else C_DARK_SQUARE, area)
+            if self.threats >> sq & 1:
+                pygame.draw.rect(self.layer, C_THREAT, area,
+                                 max(1, self.square // 16))
+            value = self.animator.state[sq]
+            if value and sq not in hidden:
+                self.sprites.blit(self.layer, (value - 1) >> 1,
+                                  (value - 1) & 1, area.topleft)
+
+    def blit_piece(self, surface: Surface, value: int, file: float,
+                   rank: float, opacity: float = 1.0) -> None:
+        """
+        Draw a piece anywhere on the board.
+
+        :param surface: the surface to draw to.
+        :param value: the piece, as in BoardState.
+        :param file: file from 0 (a) to 7 (h); may be fractional.
+        :param rank: rank from 0 (1) to 7 (8); may be fractional.
+        :param opacity: (optional) from 0 (invisible) to 1.
+        """
+        position = (self.rect.x + file * self.square,
+                    self.rect.y + (7 - rank) * self.square)
+        code, color = (value - 1) >> 1, (value - 1) & 1
+        if opacity >= 1:
+            self.sprites.blit(surface, code, color, position)
+            return
+        if opacity <= 0:
+            return
+
+        # per-surface alpha on a copy, since the atlas is shared
+        faded = self.faded.get(value)
+        if faded is None:
+            sprite = self.sprites.sprite(code, color)
+            if sprite is None:
+                return
+            faded = self.faded[value] = sprite.copy()
+        faded.set_alpha(int(255 * opacity))
+        surface.blit(faded, position)
+
+    def get_rect(self) -> Rect:
+        """
+        Get the area this board draws to.
+
+        :return: the absolute bounding rectangle.
+        """
+        self.check_layout()
+        return self.rect
+
+    def get_state(self) -> tuple:
+        """
+        :return: the static layer's version, the outlined squares and the
+                 animated pieces.
+        """
+        return (self.animator.version, self.threats,
+                tuple(self.animator.sprites()))
+
+    def next_update(self) -> float | None:
+        """
+        :return: now while animating, or None.
+        """
+        now = time.perf_counter()
+        return now if self.animator.is_animating(now) else None
+
 
 class Label:
     pass
@@ -11,5 +198,24 @@ class Label:
 class Button:
     pass
 
-class Screenwipe:
-    pass
+class Screenwipe(Transition):
+    """
+    Wipe from one screen to another: the incoming screen is revealed from
+    left to right behind a moving edge, e.g. when a game starts or ends.
+    """
+
+    def composite(self, surface: Surface, t: float) -> None:
+        """
+        Show the incoming snapshot left of the edge and the outgoing one
+        right of it.
+
+        :param surface: the surface to draw to.
+        :param t: eased progress, from 0 to 1.
+        """
+        w, h = self.new.get_size()
+        edge = int(t * w)
+        surface.blit(self.new, (0, 0), Rect(0, 0, edge, h))
+        surface.blit(self.old, (edge, 0), Rect(edge, 0, w - edge, h))
+        if 0 < edge < w:
+            pygame.draw.line(surface, C_LIGHT_SQUARE, (edge, 0), (edge, h),
+                             max(1, w // 400))
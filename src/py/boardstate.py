@@ -0,0 +1,207 @@
+"""
+Lightweight board states and the deltas between them.
+
+A BoardState is one flat bytearray: 64 squares (a1 to h8), then the side to
+move, the castling rights and the en passant square. Squares use the same
+values as movegen.Position's mailbox: 0 for empty, or (code << 1 | color) + 1.
+Copying is a single buffer copy, and bytes() of a state is its serialized
+form.
+"""
+
+SIDE = 64
+CASTLING = 65
+EP = 66
+SIZE = 67
+
+NO_EP = 255
+
+
+class Delta:
+    """
+    The difference between two consecutive board states: pieces moved,
+    pieces removed (e.g., capture) and pieces added (e.g., promotion), plus
+    the castling and en passant rights before and after. The side to move
+    always changes.
+
+    Applying a delta removes pieces, then moves pieces, then adds pieces; an
+    added piece may replace a piece that just moved (promotion).
+    """
+
+    __slots__ = ("moved", "removed", "added", "castling", "ep")
+
+    def __init__(self, moved: tuple = (), removed: tuple = (),
+                 added: tuple = (), castling: tuple[int, int] = (0, 0),
+                 ep: tuple[int, int] = (NO_EP, NO_EP)) -> None:
+        """
+        Constructor.
+
+        :param moved: (from, to, value) triples, e.g. both pieces when
+                      castling.
+        :param removed: (square, value) pairs, e.g. a captured piece.
+        :param added: (square, value) pairs, e.g. a promoted piece.
+        :param castling: castling rights (before, after).
+        :param ep: en passant square (before, after); NO_EP if none.
+        """
+        self.moved = moved
+        self.removed = removed
+        self.added = added
+        self.castling = castling
+        self.ep = ep
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Delta) and all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return (f"Delta(moved={self.moved}, removed={self.removed}, "
+                f"added={self.added}, castling={self.castling}, "
+                f"ep={self.ep})")
+
+
+class BoardState:
+    """
+    A board state: piece placement, side to move, castling rights and
+    en passant square, in SIZE bytes.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes | bytearray = None) -> None:
+        """
+        Constructor.
+
+        :param data: (optional) serialized state, e.g. from bytes(state).
+                     Defaults to an empty board with White to move.
+        """
+        if data is None:
+            self.data = bytearray(SIZE)
+            self.data[EP] = NO_EP
+        else:
+            if len(data) != SIZE:
+                raise ValueError(f"a board state is {SIZE} bytes, "
+                                 f"not {len(data)}")
+            self.data = bytearray(data)
+
+    def copy(self) -> "BoardState":
+        """
+        Copy this state.
+
+        :return: an independent BoardState.
+        """
+        return BoardState(self.data)
+
+    def __bytes__(self) -> bytes:
+        return bytes(self.data)
+
+    def __getitem__(self, sq: int) -> int:
+        return self.data[sq]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, BoardState) and self.data == other.data
+
+    def __hash__(self) -> int:
+        return hash(bytes(self.data))
+
+    @property
+    def side(self) -> int:
+        return self.data[SIDE]
+
+    @property
+    def castling(self) -> int:
+        return self.data[CASTLING]
+
+    @property
+    def ep(self) -> int:
+        """
+        :return: the en passant square, or -1 if there is none.
+        """
+        ep = self.data[EP]
+        return -1 if ep == NO_EP else ep
+
+    def piece_at(self, sq: int) -> tuple[int, int] | None:
+        """
+        Get the piece on a square.
+
+        :param sq: the square, from 0 (a1) to 63 (h8).
+        :return: a (color, code) pair, or None if the square is empty.
+        """
+        value = self.data[sq]
+        if not value:
+            return None
+        return (value - 1) & 1, (value - 1) >> 1
+
+    def apply(self, delta: Delta) -> None:
+        """
+        Change this state in place into the next one.
+
+        :param delta: the delta from this state to the next.
+        """
+        data = self.data
+        for sq, _ in delta.removed:
+            data[sq] = 0
+        for fr, to, value in delta.moved:
+            data[fr] = 0
+            data[to] = value
+        for sq, value in delta.added:
+            data[sq] = value
+        data[SIDE] ^= 1
+        data[CASTLING] = delta.castling[1]
+        data[EP] = delta.ep[1]
+
+    def revert(self, delta: Delta) -> None:
+        """
+        Change this state in place back into the previous one.
+
+        :param delta: the delta from the previous state to this one.
+        """
+        data = self.data
+        for sq, _ in delta.added:
+            data[sq] = 0
+        for fr, to, value in reversed(delta.moved):
+            data[to] = 0
+            data[fr] = value
+        for sq, value in delta.removed:
+            data[sq] = value
+        data[SIDE] ^= 1
+        data[CASTLING] = delta.castling[0]
+        data[EP] = delta.ep[0]
+
+
+def encode_delta(delta: Delta) -> bytes:
+    """
+    Pack a delta into a few bytes: a header with the number of moved,
+    removed and added pieces, then their squares and values, then the
+    castling and en passant rights before and after.
+
+    :param delta: the delta.
+    :return: the packed delta, usually 8 to 11 bytes.
+    """
+    data = bytearray((len(delta.moved) | len(delta.removed) << 2
+                      | len(delta.added) << 4,))
+    for fr, to, value in delta.moved:
+        data += bytes((fr, to, value))
+    for sq, value in delta.removed + delta.added:
+        data += bytes((sq, value))
+    data += bytes(delta.castling + delta.ep)
+    return bytes(data)
+
+
+def decode_delta(data: bytes) -> Delta:
+    """
+    Unpack a delta packed by encode_delta().
+
+    :param data: the packed delta.
+    :return: the delta.
+    """
+    moved, removed, added = data[0] & 3, data[0] >> 2 & 3, data[0] >> 4 & 3
+    i = 1 + 3 * moved
+    j = i + 2 * removed
+    k = j + 2 * added
+    return Delta(
+        tuple(tuple(data[n:n + 3]) for n in range(1, i, 3)),
+        tuple(tuple(data[n:n + 2]) for n in range(i, j, 2)),
+        tuple(tuple(data[n:n + 2]) for n in range(j, k, 2)),
+        (data[k], data[k + 1]),
+        (data[k + 2], data[k + 3])
+    )
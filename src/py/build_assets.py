@@ -0,0 +1,239 @@
+"""
+Rasterize the piece SVGs in src/svg into the PNGs in res/pieces.
+
+Every army folder under src/svg is built; each SVG becomes one PNG per size,
+named after the first word of the SVG's name (e.g. "bB waffle.svg" becomes
+bB.png). The first size goes to res/pieces/<army>/, which the game loads;
+other sizes go to res/pieces/<army>/<size>/. SVGs whose contents have not
+changed since their PNGs were last built are skipped. Usage, from any
+directory:
+
+$ python3 build_assets.py
+$ python3 build_assets.py --sizes 128 64 256 --backend cairosvg --force
+
+The backend is Inkscape's command line if it is installed, or else the
+cairosvg package (pip install cairosvg).
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     "..", ".."))
+SVG_DIR = os.path.join(ROOT, "src", "svg")
+PNG_DIR = os.path.join(ROOT, "res", "pieces")
+MANIFEST_PATH = os.path.join(ROOT, "src", "cache", "build_assets.json")
+SIZES = [128, 64, 256]
+
+
+#===============================================================================
+# Backends
+#===============================================================================
+def rasterize_inkscape(svg: str, png: str, size: int) -> None:
+    """
+    Render an SVG with the Inkscape command line (version 1.0 or later).
+
+    :param svg: source SVG path.
+    :param png: output PNG path.
+    :param size: width and height of the output, in pixels.
+    """
+    subprocess.run(["inkscape", svg, "-w", str(size), "-h", str(size),
+                    "-o", png], check=True, capture_output=True)
+
+
+def rasterize_cairosvg(svg: str, png: str, size: int) -> None:
+    """
+    Render an SVG with the cairosvg package, where Inkscape is not
+    installed.
+
+    :param svg: source SVG path.
+    :param png: output PNG path.
+    :param size: width and height of the output, in pixels.
+    """
+    import cairosvg  # optional; only needed for this backend
+    cairosvg.svg2png(url=svg, write_to=png, output_width=size,
+                     output_height=size)
+
+
+BACKENDS = {
+    "inkscape": rasterize_inkscape,
+    "cairosvg": rasterize_cairosvg,
+}
+
+
+def default_backend() -> str:
+    """
+    :return: "inkscape" if it is on the PATH, else "cairosvg".
+    """
+    return "inkscape" if shutil.which("inkscape") else "cairosvg"
+
+
+#===============================================================================
+# Jobs
+#===============================================================================
+def output_paths(army: str, svg_name: str, sizes: list[int]) \
+        -> list[tuple[str, int]]:
+    """
+    Get the PNGs one SVG is rendered to.
+
+    :param army: army folder.
+    :param svg_name: file name of the SVG, e.g. "bB waffle.svg".
+    :param sizes: output sizes; the first is the size the game loads.
+    :return: (PNG path, size) pairs.
+    """
+    name = os.path.splitext(svg_name)[0].split()[0] + ".png"
+    return [(os.path.join(PNG_DIR, army, name) if i == 0
+             else os.path.join(PNG_DIR, army, str(size), name), size)
+            for i, size in enumerate(sizes)]
+
+
+def find_jobs(sizes: list[int], armies: list[str] = None) -> list[dict]:
+    """
+    Find every SVG to render.
+
+    :param sizes: output sizes.
+    :param armies: (optional) army folders to build; defaults to all of the
+                   folders in src/svg.
+    :return: one job per SVG, with its army, path, content hash and outputs.
+    """
+    if armies is None:
+        armies = sorted(name for name in os.listdir(SVG_DIR)
+                        if os.path.isdir(os.path.join(SVG_DIR, name)))
+    jobs = []
+    for army in armies:
+        for svg_name in sorted(os.listdir(os.path.join(SVG_DIR, army))):
+            if not svg_name.endswith(".svg"):
+                continue
+            svg = os.path.join(SVG_DIR, army, svg_name)
+            with open(svg, "rb") as file:
+                digest = hashlib.sha256(file.read()).hexdigest()
+            jobs.append(dict(army=army, svg=svg, hash=digest,
+                             outputs=output_paths(army, svg_name, sizes)))
+    return jobs
+
+
+def render(job: dict) -> tuple[dict, str | None]:
+    """
+    Render one SVG to all of its outputs. Runs in a worker process.
+
+    :param job: job from find_jobs(), plus the backend's name.
+    :return: the job, and an error message or None.
+    """
+    try:
+        for png, size in job["outputs"]:
+            os.makedirs(os.path.dirname(png), exist_ok=True)
+            BACKENDS[job["backend"]](job["svg"], png, size)
+    except Exception as error:  # report and carry on with the other jobs
+        return job, f"{type(error).__name__}: {error}"
+    return job, None
+
+
+#===============================================================================
+# Manifest
+#===============================================================================
+def load_manifest(path: str = MANIFEST_PATH) -> dict[str, str]:
+    """
+    :param path: (optional) manifest file.
+    :return: map from PNG path (relative to the repository root) to the hash
+             of the SVG it was built from; empty if there is no manifest.
+    """
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest: dict[str, str],
+                  path: str = MANIFEST_PATH) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}"
+    with open(temporary, "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(temporary, path)
+
+
+def is_fresh(job: dict, manifest: dict[str, str]) -> bool:
+    """
+    :param job: job from find_jobs().
+    :param manifest: manifest from load_manifest().
+    :return: whether every output exists and was built from the same SVG.
+    """
+    return all(os.path.exists(png)
+               and manifest.get(os.path.relpath(png, ROOT)) == job["hash"]
+               for png, _ in job["outputs"])
+
+
+#===============================================================================
+# Runner
+#===============================================================================
+def build(sizes: list[int] = None, armies: list[str] = None,
+          backend: str = None, workers: int = None,
+          force: bool = False) -> tuple[int, int, list[str]]:
+    """
+    Render every changed SVG on a process pool.
+
+    :param sizes: (optional) output sizes; defaults to SIZES.
+    :param armies: (optional) army folders; defaults to all.
+    :param backend: (optional) key of BACKENDS; defaults to
+                    default_backend().
+    :param workers: (optional) worker processes; defaults to the CPU count.
+    :param force: (optional) whether to render unchanged SVGs too.
+    :return: numbers of SVGs rendered and skipped, and error messages.
+    """
+    backend = backend or default_backend()
+    manifest = load_manifest()
+    jobs = find_jobs(sizes or SIZES, armies)
+    todo = [dict(job, backend=backend) for job in jobs
+            if force or not is_fresh(job, manifest)]
+
+    errors = []
+    if todo:
+        with multiprocessing.Pool(min(workers or os.cpu_count(),
+                                      len(todo))) as pool:
+            for job, error in pool.imap_unordered(render, todo):
+                name = os.path.relpath(job["svg"], SVG_DIR)
+                if error is not None:
+                    errors.append(f"{name}: {error}")
+                    continue
+                for png, _ in job["outputs"]:
+                    manifest[os.path.relpath(png, ROOT)] = job["hash"]
+                print(f"rendered {name}", flush=True)
+        save_manifest(manifest)
+    return len(todo) - len(errors), len(jobs) - len(todo), errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES,
+                        help="output sizes in pixels; the first is the one "
+                             "the game loads")
+    parser.add_argument("--armies", nargs="+",
+                        help="army folders to build (default: all)")
+    parser.add_argument("--backend", choices=BACKENDS,
+                        help="rasterizer (default: inkscape if installed, "
+                             "else cairosvg)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--force", action="store_true",
+                        help="render unchanged SVGs too")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rendered, skipped, errors = build(args.sizes, args.armies, args.backend,
+                                      args.workers, args.force)
+    for error in errors:
+        print(f"error: {error}")
+    print(f"{rendered} rendered, {skipped} unchanged, {len(errors)} failed "
+          f"in {time.perf_counter() - start:.1f} s")
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
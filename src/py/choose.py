@@ -1,8 +1,10 @@
 """Screen where players choose armies before battle."""
 
 from ui import *
+from hittest import Pointer
 
 components: list[Drawable] = []
+pointer = Pointer(components)
 
 #===============================================================================
 # Setup
@@ -40,11 +42,16 @@ def display(surface: Surface) -> None:
 
 def update() -> None:
     """
-    Check for input and post events as needed.
+    Called on each frame. Input arrives through send_mouse() and
+    send_key_down().
     """
-    for component in components:
-        if isinstance(component, TextBox):
-            component.check_click()
+
+
+def send_mouse(event: Event) -> None:
+    """
+    Callback for mouse events. Selects the text box that is clicked.
+    """
+    pointer.handle(event)
 
 
 def send_key_down(key_down: Event) -> None:
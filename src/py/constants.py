@@ -2,14 +2,20 @@
 
 import pygame
 from pygame.locals import USEREVENT
-import pygame.freetype
 from pygame.freetype import Font
 
+from assets import ASSETS, LazyFont, asset_path
+
 #===============================================================================
 # Graphics settings
 #===============================================================================
 FRAME_RATE = 60
-APP_ICON_PATH = "../../res/pieces/fide/icon.png"
+TEXT_CACHE_SIZE = 256  # rendered text surfaces kept by ui.render_text()
+PROFILER_FONT_SIZE = 20
+PROFILER_REFRESH = 15  # frames between profiler overlay updates
+IDLE_TIMEOUT = 1.0  # longest sleep between frames when nothing changes
+ENGINE_POLL_INTERVAL = 0.05  # seconds between polls while the engine thinks
+APP_ICON_PATH = asset_path("res/pieces/fide/icon.png")
 
 
 #===============================================================================
@@ -17,26 +23,41 @@ APP_ICON_PATH = "../../res/pieces/fide/icon.png"
 #===============================================================================
 class Piece:
     def __init__(self, code: int, symbol: str, name: str,
-                 army: str, file: str) -> None:
+                 army: str, file: str, betza: str, value: int) -> None:
         self.code = int(code)
         self.symbol = symbol
         self.name = name
         self.army = army
         self.file = file
-
-        self.black = pygame.image.load(f"../../res/pieces/{army}/b{file}.png")
-        self.white = pygame.image.load(f"../../res/pieces/{army}/w{file}.png")
-
-
-with open("../pieces.csv") as csv:
+        self.betza = betza
+        self.value = int(value)
+
+    @property
+    def black(self) -> pygame.Surface | None:
+        """
+        :return: the black piece image (loaded on first use), or None if the
+                 army has no artwork yet.
+        """
+        return ASSETS.image(f"res/pieces/{self.army}/b{self.file}.png")
+
+    @property
+    def white(self) -> pygame.Surface | None:
+        """
+        :return: the white piece image (loaded on first use), or None if the
+                 army has no artwork yet.
+        """
+        return ASSETS.image(f"res/pieces/{self.army}/w{self.file}.png")
+
+
+with open(asset_path("src/pieces.csv")) as csv:
     csv.readline()  # discard header line
     data: list[str] = csv.readlines()
     PIECES = [Piece(*line.strip().split(",")) for line in data]
 
 PIECE_MAP = {piece.name.lower(): piece.code for piece in PIECES}
 
-ICONS = [pygame.image.load(f"../../res/pieces/{folder}/icon.png")
-         for folder in ["fide", "clob"]]
+# army icons on the menu; load with ASSETS.image()
+ICON_PATHS = [f"res/pieces/{folder}/icon.png" for folder in ["fide", "clob"]]
 
 #===============================================================================
 # Color presets
@@ -63,13 +84,14 @@ C_TEXT_BOX_ACTIVE_LIGHT = (170, 170, 170)
 
 C_DARK_SQUARE = (80, 30, 80)
 C_LIGHT_SQUARE = (180, 180, 180)
+C_THREAT = (200, 40, 40)  # assist mode: outline of attacked pieces
 
 #===============================================================================
 # Fonts
 #===============================================================================
-pygame.freetype.init()
-F_TITLE = Font("../../res/font/PlusJakartaSans-Bold.ttf", 96)
-F_BUTTON = Font("../../res/font/PlusJakartaSans-SemiBold.ttf", 48)
+# opened on first use
+F_TITLE = LazyFont("res/font/PlusJakartaSans-Bold.ttf", 96)
+F_BUTTON = LazyFont("res/font/PlusJakartaSans-SemiBold.ttf", 48)
 # TODO: subtitle font
 
 #===============================================================================
@@ -81,12 +103,24 @@ GO_PLAY = USEREVENT + 2
 GO_TUTORIAL = USEREVENT + 3
 GO_OPTIONS = USEREVENT + 4
 GO_CREDITS = USEREVENT + 5
+ENGINE_MOVE = USEREVENT + 6  # posted by engine_service when a move is ready
+LAN_MESSAGE = USEREVENT + 7  # posted by game.wake_network() for lan.py
 
 #===============================================================================
 # Screens
 #===============================================================================
 MENU = 0
 CHOOSE = 1
+PLAY = 2
+TUTORIAL = 3
+OPTIONS = 4
+CREDITS = 5
+
+# screen each navigation event goes to
+SCREEN_EVENTS = {GO_MENU: MENU, GO_CHOOSE: CHOOSE, GO_PLAY: PLAY,
+                 GO_TUTORIAL: TUTORIAL, GO_OPTIONS: OPTIONS,
+                 GO_CREDITS: CREDITS}
+TRANSITION_TIME = 0.35  # in seconds
 
 #===============================================================================
 # Miscellaneous
@@ -97,5 +131,6 @@ CENTER = 2
 RIGHT = 3
 
 BUTTON_PADDING_SCALAR = 0.02
+BOARD_SQUARE_SCALAR = 0.1  # board square size relative to display height
 
-CARET_BLINK_PERIOD = 90  # in frames
+CARET_BLINK_PERIOD = 1.5  # in seconds
@@ -0,0 +1,423 @@
+"""
+Computer opponent: iterative deepening alpha-beta search.
+
+The search is negamax alpha-beta with a transposition table, aspiration
+windows, killer and history move ordering, principal variation search and
+quiescence search, all under a hard wall-clock budget per move. The
+evaluation starts from the piece values in pieces.csv.
+
+Usage, from this directory, to watch the engine think:
+
+$ python3 engine.py --armies clob nutty --time 5
+"""
+
+import argparse
+import time
+
+import profiler
+from movegen import *
+from ttable import TranspositionTable, EXACT, LOWER, UPPER
+
+#===============================================================================
+# Evaluation
+#===============================================================================
+INFINITY = 1_000_000
+MATE = 100_000
+MATE_BOUND = MATE - 1000  # scores beyond this are mates
+
+VALUES = [piece.value for piece in PIECE_TYPES]
+
+
+def _center_bonus(sq: int) -> int:
+    x, y = sq & 7, sq >> 3
+    return 12 - 2 * (abs(2 * x - 7) + abs(2 * y - 7)) // 2
+
+
+# bonuses from White's point of view; Black uses the mirrored square
+CENTER = [_center_bonus(sq) for sq in range(64)]
+PAWN_ADVANCE = [0 if sq >> 3 in (0, 7) else
+                6 * ((sq >> 3) - 1) + (4 if 2 <= (sq & 7) <= 5 else 0)
+                for sq in range(64)]
+KING_SHELTER = [10 if sq >> 3 == 0 else -10 * (sq >> 3) for sq in range(64)]
+
+
+def evaluate(pos: Position) -> int:
+    """
+    Statically evaluate a position.
+
+    :param pos: the position.
+    :return: the score in centipawns, from the side to move's point of view.
+    """
+    score = 0
+    for color in (WHITE, BLACK):
+        flip = 0 if color == WHITE else 56
+        bbs = pos.bb[color]
+        side = 0
+        for code in pos.codes[color]:
+            bb = bbs[code]
+            if not bb:
+                continue
+            piece = PIECE_TYPES[code]
+            side += piece.value * bb.bit_count()
+            bonus = PAWN_ADVANCE if piece.pawn \
+                else KING_SHELTER if piece.royal else CENTER
+            while bb:
+                bit = bb & -bb
+                bb ^= bit
+                side += bonus[(bit.bit_length() - 1) ^ flip]
+        score += side if color == WHITE else -side
+    return score if pos.side == WHITE else -score
+
+
+#===============================================================================
+# Search
+#===============================================================================
+class SearchInfo:
+    """
+    Progress report of a search, sent after every completed iteration.
+    """
+
+    def __init__(self, depth: int, score: int, nodes: int, elapsed: float,
+                 pv: list[int]) -> None:
+        """
+        Constructor.
+
+        :param depth: depth reached.
+        :param score: score in centipawns, from the side to move's point of
+                      view; beyond +-MATE_BOUND, a forced mate.
+        :param nodes: nodes searched so far.
+        :param elapsed: seconds since the search started.
+        :param pv: principal variation, starting with the best move.
+        """
+        self.depth = depth
+        self.score = score
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.pv = pv
+
+    @property
+    def move(self) -> int:
+        return self.pv[0] if self.pv else 0
+
+    @property
+    def nps(self) -> int:
+        return int(self.nodes / self.elapsed) if self.elapsed > 0 else 0
+
+    def __str__(self) -> str:
+        if abs(self.score) > MATE_BOUND:
+            plies = MATE - abs(self.score)
+            score = f"mate {(plies + 1) // 2 * (1 if self.score > 0 else -1)}"
+        else:
+            score = f"cp {self.score}"
+        return (f"depth {self.depth} score {score} nodes {self.nodes} "
+                f"nps {self.nps} time {self.elapsed:.2f} "
+                f"pv {' '.join(move_name(move) for move in self.pv)}")
+
+
+class _Timeout(Exception):
+    pass
+
+
+class Search:
+    """
+    A searcher that keeps its transposition table and move ordering
+    statistics from one move to the next.
+    """
+
+    CHECK_INTERVAL = 1023  # nodes between clock checks, minus one
+    ASPIRATION = 35  # initial aspiration half-window, in centipawns
+    MAX_PLY = 64
+
+    def __init__(self, megabytes: float = 16) -> None:
+        """
+        Constructor.
+
+        :param megabytes: (optional) transposition table budget.
+        """
+        self.tt = TranspositionTable(megabytes)
+        self.history = [[0] * 4096 for _ in range(2)]
+        self.killers = [[0, 0] for _ in range(self.MAX_PLY)]
+        self.pos: Position = None
+        self.nodes = 0
+        self.deadline = 0.0
+        self.should_stop = None
+
+    @profiler.timed("engine.search")
+    def search(self, pos: Position, time_limit: float = None,
+               depth_limit: int = None, should_stop=None,
+               info=None) -> SearchInfo:
+        """
+        Find the best move within a time and/or depth limit.
+
+        :param pos: the position to search; restored before returning.
+        :param time_limit: (optional) hard limit in seconds.
+        :param depth_limit: (optional) maximum depth in plies.
+        :param should_stop: (optional) function polled during the search;
+                            the search ends as soon as it returns True.
+        :param info: (optional) function called with a SearchInfo after each
+                     completed iteration.
+        :return: the SearchInfo of the deepest completed iteration. Its move
+                 is 0 only if there is no legal move.
+        """
+        self.pos = pos
+        self.nodes = 0
+        self.should_stop = should_stop
+        start = time.perf_counter()
+        self.deadline = start + time_limit if time_limit else float("inf")
+        self.tt.new_search()
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+        for table in self.history:
+            for i in range(len(table)):
+                table[i] >>= 3
+
+        plies = len(pos.history)
+        legal = pos.legal_moves()
+        result = SearchInfo(0, 0, 0, 0.0, legal[:1])
+        if len(legal) <= 1:
+            return result
+
+        score = 0
+        for depth in range(1, min(depth_limit or self.MAX_PLY,
+                                  self.MAX_PLY) + 1):
+            window = self.ASPIRATION
+            alpha, beta = -INFINITY, INFINITY
+            if depth >= 4:
+                alpha, beta = score - window, score + window
+            try:
+                with profiler.section(f"engine.depth{depth}"):
+                    while True:
+                        score = self._negamax(depth, alpha, beta, 0)
+                        if alpha < score < beta:
+                            break
+                        window *= 4
+                        if score <= alpha:
+                            alpha = max(score - window, -INFINITY)
+                        else:
+                            beta = min(score + window, INFINITY)
+            except _Timeout:
+                while len(pos.history) > plies:
+                    pos.unmake()
+                break
+
+            elapsed = time.perf_counter() - start
+            result = SearchInfo(depth, score, self.nodes, elapsed,
+                                self._principal_variation(depth))
+            if info is not None:
+                info(result)
+            if abs(score) > MATE_BOUND:
+                break
+            # another iteration takes several times as long as this one,
+            # so don't start one that would almost surely be cut off
+            if time_limit and elapsed > time_limit / 2:
+                break
+
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def _check_time(self) -> None:
+        if time.perf_counter() >= self.deadline \
+                or (self.should_stop is not None and self.should_stop()):
+            raise _Timeout()
+
+    def _principal_variation(self, depth: int) -> list[int]:
+        pos = self.pos
+        pv = []
+        while len(pv) < depth:
+            entry = self.tt.probe(pos.hash)
+            if entry is None or entry[0] not in pos.legal_moves():
+                break
+            pv.append(entry[0])
+            pos.make(entry[0])
+        for _ in pv:
+            pos.unmake()
+        return pv
+
+    def _order(self, moves: list[int], tt_move: int, ply: int) -> list[int]:
+        """
+        Sort moves best-first: the transposition table move, then captures
+        and promotions by most valuable victim and least valuable attacker,
+        then killer moves, then the rest by history score.
+        """
+        board = self.pos.board
+        history = self.history[self.pos.side]
+        killers = self.killers[ply] if ply < self.MAX_PLY else (0, 0)
+
+        def key(move: int) -> int:
+            if move == tt_move:
+                return -1 << 40
+            victim = board[(move >> 6) & 63]
+            if victim or move >> 15:
+                gain = VALUES[(victim - 1) >> 1] if victim else 0
+                if move >> 15:
+                    gain += VALUES[(move >> 15) - 1]
+                return -(1 << 30) - 16 * gain \
+                    + VALUES[(board[move & 63] - 1) >> 1] // 16
+            if move == killers[0] or move == killers[1]:
+                return -(1 << 29)
+            return -history[move & 4095]
+
+        moves.sort(key=key)
+        return moves
+
+    def _negamax(self, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        if not self.nodes & self.CHECK_INTERVAL:
+            self._check_time()
+        pos = self.pos
+
+        if ply:
+            if pos.halfmove >= 100 or pos.repetitions():
+                return 0
+            # mate distance pruning
+            alpha = max(alpha, -MATE + ply)
+            beta = min(beta, MATE - ply - 1)
+            if alpha >= beta:
+                return alpha
+
+        us = pos.side
+        them = us ^ 1
+        in_check = pos.attacked(pos.king_square(us), them)
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= self.MAX_PLY:
+            return self._quiesce(alpha, beta, ply)
+
+        tt_move = 0
+        entry = self.tt.probe(pos.hash)
+        if entry is not None:
+            tt_move, tt_score, tt_depth, bound = entry
+            if ply and tt_depth >= depth:
+                tt_score = _from_tt(tt_score, ply)
+                if bound == EXACT \
+                        or (bound == LOWER and tt_score >= beta) \
+                        or (bound == UPPER and tt_score <= alpha):
+                    return tt_score
+
+        original_alpha = alpha
+        best, best_move = -INFINITY, 0
+        legal = 0
+        for move in self._order(pos.pseudo_legal_moves(), tt_move, ply):
+            pos.make(move)
+            if pos.attacked(pos.king_square(us), them):
+                pos.unmake()
+                continue
+            legal += 1
+            if legal == 1:
+                score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            else:
+                score = -self._negamax(depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            pos.unmake()
+
+            if score > best:
+                best, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not pos.board[(move >> 6) & 63] \
+                                and not move >> 15:
+                            self._reward(move, depth, ply)
+                        break
+
+        if not legal:
+            return -MATE + ply if in_check else 0
+
+        if best >= beta:
+            bound = LOWER
+        elif best > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+            best_move = 0
+        self.tt.store(pos.hash, best_move, _to_tt(best, ply), depth, bound)
+        return best
+
+    def _reward(self, move: int, depth: int, ply: int) -> None:
+        """
+        Remember a quiet move that caused a beta cutoff.
+        """
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        history = self.history[self.pos.side]
+        history[move & 4095] += depth * depth
+        if history[move & 4095] > 1 << 20:
+            for i in range(len(history)):
+                history[i] >>= 1
+
+    def _quiesce(self, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        if not self.nodes & self.CHECK_INTERVAL:
+            self._check_time()
+        pos = self.pos
+
+        best = evaluate(pos)
+        if best >= beta:
+            return best
+        alpha = max(alpha, best)
+
+        us = pos.side
+        them = us ^ 1
+        for move in self._order(pos.pseudo_legal_moves(True), 0, self.MAX_PLY):
+            pos.make(move)
+            if pos.attacked(pos.king_square(us), them):
+                pos.unmake()
+                continue
+            score = -self._quiesce(-beta, -alpha, ply + 1)
+            pos.unmake()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+
+def _to_tt(score: int, ply: int) -> int:
+    """
+    Convert a mate score to be relative to the stored node, not the root.
+    """
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _from_tt(score: int, ply: int) -> int:
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--armies", nargs=2, default=["fide", "fide"],
+                        choices=ARMIES, metavar=("WHITE", "BLACK"))
+    parser.add_argument("--fen", default=None)
+    parser.add_argument("--time", type=float, default=5.0)
+    parser.add_argument("--depth", type=int, default=None)
+    parser.add_argument("--hash", type=float, default=16, metavar="MB")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="write a Chrome trace of the search")
+    args = parser.parse_args()
+
+    pos = Position.start(*args.armies) if args.fen is None \
+        else Position.from_fen(args.fen, tuple(args.armies))
+    profiler.enable(args.trace is not None)
+    result = Search(args.hash).search(pos, args.time, args.depth, info=print)
+    print(f"bestmove {move_name(result.move) if result.move else '(none)'} "
+          f"depth {result.depth} nodes {result.nodes} nps {result.nps}")
+    if args.trace:
+        profiler.dump_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
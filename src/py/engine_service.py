@@ -0,0 +1,211 @@
+"""
+Asynchronous engine service.
+
+Searches run in a worker process, so neither the search nor the GIL can
+stall the 60 FPS main loop. The main loop calls poll() once per frame, which
+never blocks; when a best move is ready, an ENGINE_MOVE event is posted with
+these attributes:
+
+* move: the encoded best move (0 if there is no legal move).
+* ponder: the expected reply, or 0 if unknown.
+* score, depth, nodes, nps: statistics of the search.
+"""
+
+import multiprocessing
+import queue
+import time
+
+from pygame.event import post, Event
+
+from constants import ENGINE_MOVE
+from engine import Search
+from movegen import Position
+
+
+def _serve(commands, results, stop_id, deadline, megabytes: float) -> None:
+    """
+    Worker process main loop: run searches as commands arrive.
+
+    :param commands: queue of commands from the main process.
+    :param results: queue of results to the main process.
+    :param stop_id: shared int; searches with an id at or below it stop.
+    :param deadline: shared float; wall-clock time (time.time()) at which
+                     the current search must stop.
+    :param megabytes: transposition table budget.
+    """
+    search = Search(megabytes)
+    while True:
+        command = commands.get()
+        if command[0] == "quit":
+            return
+
+        _, search_id, pos, time_limit = command
+
+        def should_stop() -> bool:
+            return stop_id.value >= search_id or time.time() >= deadline.value
+
+        def info(progress) -> None:
+            results.put(("info", search_id, progress.depth, progress.score,
+                         progress.nodes, progress.nps))
+
+        result = search.search(pos, time_limit, should_stop=should_stop,
+                               info=info)
+        results.put(("bestmove", search_id, result.move,
+                     result.pv[1] if len(result.pv) > 1 else 0,
+                     result.score, result.depth, result.nodes, result.nps))
+
+
+class EngineService:
+    """
+    Handle to an engine running in a worker process.
+    """
+
+    def __init__(self, megabytes: float = 16) -> None:
+        """
+        Constructor. The worker process is not started until start() or the
+        first search.
+
+        :param megabytes: (optional) transposition table budget.
+        """
+        self.megabytes = megabytes
+        self.process: multiprocessing.Process = None
+        self.commands: multiprocessing.Queue = None
+        self.results: multiprocessing.Queue = None
+        self.stop_id = multiprocessing.Value("q", 0, lock=False)
+        self.deadline = multiprocessing.Value("d", 0.0, lock=False)
+
+        self.search_id = 0
+        self.thinking = False
+        self.pondering = False
+        self.ponder_move = 0
+        self.ponder_result: tuple = None
+        self.progress: tuple[int, int, int, int] = None  # depth, score, ...
+
+    def start(self) -> None:
+        """
+        Start the worker process, if it isn't running yet.
+        """
+        if self.process is not None and self.process.is_alive():
+            return
+        self.commands = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_serve,
+            args=(self.commands, self.results, self.stop_id, self.deadline,
+                  self.megabytes),
+            daemon=True
+        )
+        self.process.start()
+
+    def go(self, pos: Position, time_limit: float) -> None:
+        """
+        Start searching for the side to move's best move. Any search in
+        progress is stopped and its result discarded.
+
+        :param pos: the position; it is copied, so it may change afterwards.
+        :param time_limit: hard limit in seconds.
+        """
+        self._begin(pos, time_limit)
+        self.pondering = False
+
+    def ponder(self, pos: Position, expected: int) -> None:
+        """
+        Think on the opponent's time: search the position after the move
+        the opponent is expected to play, with no time limit.
+
+        :param pos: the position, with the opponent to move.
+        :param expected: the opponent's expected move, usually the ponder
+                         attribute of the last ENGINE_MOVE event.
+        """
+        if not expected or expected not in pos.legal_moves():
+            return
+        pos.make(expected)
+        try:
+            self._begin(pos, None)
+        finally:
+            pos.unmake()
+        self.pondering = True
+        self.ponder_move = expected
+
+    def ponderhit(self, time_limit: float) -> None:
+        """
+        The opponent played the expected move: keep the ponder search going
+        as a normal search, finishing within the time limit.
+
+        :param time_limit: hard limit in seconds, from now.
+        """
+        if not self.pondering:
+            return
+        self.pondering = False
+        if self.ponder_result is not None:
+            # the ponder search already finished on its own
+            self._post(self.ponder_result)
+            self.ponder_result = None
+        else:
+            self.deadline.value = time.time() + time_limit
+
+    def stop(self) -> None:
+        """
+        Stop the current search. A stopped normal search still reports its
+        best move; a stopped ponder search is discarded.
+        """
+        if self.thinking:
+            self.stop_id.value = self.search_id
+        if self.pondering:
+            self.pondering = False
+            self.search_id += 1  # discards the ponder search's result
+
+    def quit(self) -> None:
+        """
+        Stop the worker process.
+        """
+        if self.process is None:
+            return
+        self.stop()
+        self.commands.put(("quit",))
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+        self.thinking = self.pondering = False
+
+    def poll(self) -> None:
+        """
+        Should be called on each frame; collects results from the worker
+        without blocking, and posts ENGINE_MOVE when a best move is ready.
+        """
+        if self.results is None:
+            return
+        while True:
+            try:
+                message = self.results.get_nowait()
+            except queue.Empty:
+                return
+            if message[1] != self.search_id:
+                continue  # left over from a search that was replaced
+
+            if message[0] == "info":
+                self.progress = message[2:]
+            elif message[0] == "bestmove":
+                self.thinking = False
+                if self.pondering:
+                    self.ponder_result = message[2:]  # wait for ponderhit
+                else:
+                    self._post(message[2:])
+
+    def _post(self, result: tuple) -> None:
+        move, ponder, score, depth, nodes, nps = result
+        post(Event(ENGINE_MOVE, move=move, ponder=ponder, score=score,
+                   depth=depth, nodes=nodes, nps=nps))
+
+    def _begin(self, pos: Position, time_limit: float | None) -> None:
+        self.start()
+        self.stop()
+        self.search_id += 1
+        self.deadline.value = time.time() + time_limit if time_limit \
+            else float("inf")
+        # the queue pickles in a background thread, so send a snapshot
+        self.commands.put(("go", self.search_id, pos.copy(), time_limit))
+        self.thinking = True
+        self.ponder_result = None
+        self.progress = None
@@ -1,6 +1,103 @@
 """Game screen."""
 
-import pygame
 from pygame.locals import *
 
-from constants import *
\ No newline at end of file
+from ui import *
+from atlas import SpriteAtlas
+from board import BoardView
+from engine_service import EngineService
+from hittest import Pointer
+from lan import LanSession
+from movegen import Position
+
+components: list[Drawable] = []
+pointer = Pointer(components)
+
+# computer opponent; its worker process starts on the first search
+opponent = EngineService()
+# piece sprites at the current square size; built on first draw
+sprites = SpriteAtlas()
+# the board, with moves animated
+board = BoardView((0.5, 0.5), sprites)
+components.append(board)
+# the game being played, if any
+position: Position = None
+# the LAN session, when playing over the network; create it with
+# notify=wake_network
+network: LanSession = None
+
+
+#===============================================================================
+# Callback
+#===============================================================================
+def display(surface: Surface) -> None:
+    """
+    Draw the game screen.
+
+    :param surface: the pygame Surface to draw to,
+    """
+    for component in components:
+        component.draw(surface)
+
+
+def update() -> None:
+    """
+    Called on each frame. Input arrives through send_mouse().
+    """
+
+
+def send_mouse(event: Event) -> None:
+    """
+    Callback for mouse events.
+    """
+    pointer.handle(event)
+
+
+def show_threats() -> None:
+    """
+    Outline the player's pieces that the opponent attacks, in assist mode.
+    Reads the position's incremental attack maps, so it is cheap after
+    every move. Also called whenever a setting changes.
+    """
+    if position is None or not get_assist_mode():
+        board.show_threats(0)
+        return
+    color = position.side if network is None else network.color
+    board.show_threats(position.threats(color))
+
+
+add_listener(show_threats)
+
+
+def wake_network() -> None:
+    """
+    Called from the LAN thread when a message arrives, so that an idle main
+    loop wakes up for it.
+    """
+    post(Event(LAN_MESSAGE))
+
+
+def receive_network() -> None:
+    """
+    Callback for LAN_MESSAGE events. Applies the games, moves and resyncs
+    that arrived over the network to the position and the board.
+    """
+    global position
+
+    if network is None:
+        return
+    for message in network.poll():
+        if message[0] == "start":
+            position = Position.start(*message[2])
+            board.set_state(position.state())
+        elif message[0] == "move" and position is not None:
+            board.play(position.delta(message[1]))
+            position.make(message[1])
+        elif message[0] == "reset":
+            position = Position.start(*message[1])
+            for move in message[2]:
+                position.make(move)
+            board.set_state(position.state())
+        else:
+            continue
+        show_threats()
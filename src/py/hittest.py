@@ -0,0 +1,140 @@
+"""
+Event-driven mouse input.
+
+Instead of every component polling the mouse on every frame, each screen
+routes its mouse events through a Pointer, which finds the component under
+the cursor with a HitIndex: a uniform grid of cells, each listing the
+components that overlap it. A lookup checks one cell, so its cost does not
+grow with the number of components. The grid is rebuilt only when the
+layout changes: the settings, or any component running update_layout(),
+e.g. after a label's text changed (counted by Drawable.layouts).
+"""
+
+from pygame import Rect
+from pygame.event import Event
+from pygame.locals import MOUSEMOTION, MOUSEBUTTONDOWN, MOUSEBUTTONUP
+
+from settings import *
+from ui import Drawable
+
+CELL_SIZE = 64  # pixels
+
+
+class HitIndex:
+    """
+    Grid of component bounds for finding the component at a point.
+    """
+
+    def __init__(self, components: list[Drawable]) -> None:
+        """
+        Constructor.
+
+        :param components: the components, in drawing order; later ones are
+                           on top. The list may change afterwards, as long
+                           as invalidate() is called.
+        """
+        self.components = components
+        self.cells: dict[tuple[int, int], list[tuple[Rect, Drawable]]] = {}
+        self.layout: tuple = None
+
+    def invalidate(self) -> None:
+        """
+        Rebuild the grid on the next lookup, e.g. after components were
+        added, moved or resized.
+        """
+        self.layout = None
+
+    def rebuild(self) -> None:
+        """
+        Rebuild the grid from the components' current bounds.
+        """
+        self.cells = {}
+        for component in self.components:
+            rect = component.get_rect()
+            if not rect.width or not rect.height:
+                continue
+            for cx in range(rect.left // CELL_SIZE,
+                            (rect.right - 1) // CELL_SIZE + 1):
+                for cy in range(rect.top // CELL_SIZE,
+                                (rect.bottom - 1) // CELL_SIZE + 1):
+                    self.cells.setdefault((cx, cy), []) \
+                        .append((rect, component))
+        self.layout = self._layout()
+
+    def at(self, position: tuple[int, int]) -> Drawable | None:
+        """
+        Find the topmost component at a point.
+
+        :param position: absolute (x, y), e.g. from a mouse event.
+        :return: the component, or None if there is none there.
+        """
+        if self.layout != self._layout():
+            self.rebuild()
+        x, y = position
+        for rect, component in reversed(
+                self.cells.get((x // CELL_SIZE, y // CELL_SIZE), ())):
+            if rect.collidepoint(x, y):
+                return component
+        return None
+
+    def _layout(self) -> tuple:
+        # Drawable.layouts, so a component that moves or resizes by itself
+        # (e.g. a label whose text changed) is seen too, without asking
+        # every component
+        return get_version(), Drawable.layouts
+
+
+class Pointer:
+    """
+    Routes mouse events to the components of one screen: hover changes,
+    presses, releases, and loss of focus when clicking elsewhere.
+    """
+
+    def __init__(self, components: list[Drawable]) -> None:
+        """
+        Constructor.
+
+        :param components: the screen's components, in drawing order.
+        """
+        self.index = HitIndex(components)
+        self.hovered: Drawable = None
+        self.pressed: Drawable = None
+        self.focused: Drawable = None
+
+    def handle(self, event: Event) -> None:
+        """
+        Should be called on each mouse event while the screen is shown.
+
+        :param event: a MOUSEMOTION, MOUSEBUTTONDOWN or MOUSEBUTTONUP event;
+                      only the left button is handled.
+        """
+        if event.type not in (MOUSEMOTION, MOUSEBUTTONDOWN, MOUSEBUTTONUP):
+            return
+        target = self.index.at(event.pos)
+        if target is not self.hovered:
+            if self.hovered is not None:
+                self.hovered.mouse_leave()
+            if target is not None:
+                target.mouse_enter()
+            self.hovered = target
+
+        if event.type == MOUSEBUTTONDOWN and event.button == 1:
+            if self.focused is not None and self.focused is not target:
+                self.focused.blur()
+            self.focused = self.pressed = target
+            if target is not None:
+                target.mouse_down()
+        elif event.type == MOUSEBUTTONUP and event.button == 1:
+            if self.pressed is not None:
+                self.pressed.mouse_up(self.pressed is target)
+            self.pressed = None
+
+    def reset(self) -> None:
+        """
+        Forget hover and press state, e.g. when leaving the screen.
+        """
+        if self.hovered is not None:
+            self.hovered.mouse_leave()
+        if self.pressed is not None:
+            self.pressed.mouse_up(False)
+        self.hovered = self.pressed = None
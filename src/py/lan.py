@@ -0,0 +1,730 @@
+"""
+LAN multiplayer.
+
+One player hosts a game and the other joins it by address. The networking
+runs on an asyncio event loop in a background thread, so the main loop
+never waits on a socket: it hands its own moves to send_move() and collects
+what arrived with poll(), which never blocks (like engine_service). An
+optional notify callback is called from the network thread whenever
+something arrives, e.g. to post a pygame event that wakes an idle main loop.
+
+Wire format: every message is a frame of a 2-byte length, a 1-byte type and
+a payload, big-endian. Moves travel as from/to square bytes, the moving
+piece's code from pieces.csv and the promotion code, never as board states;
+each side replays them on its own Position. Each side keeps the Zobrist
+hash of every ply, so after a dropped connection the peers compare their
+latest ply and hash, and only the moves the other side missed are sent
+again; if the games diverged, the host sends its whole game.
+
+Poll messages, as tuples:
+
+* ("start", color, armies, base, increment): a new game; color is ours.
+  The host gets it when the other player first connects.
+* ("move", move, clocks): the opponent's move, as an encoded move.
+* ("reset", armies, moves, clocks): the game was replaced by the host's
+  copy; replay all moves from the start.
+* ("connected",), ("disconnected",): the connection came up or went down;
+  a joining player reconnects on its own.
+* ("closed", reason): the session is over.
+
+Clocks are (White, Black) remaining seconds. Usage, from this directory:
+
+$ python3 lan.py --loopback
+"""
+
+import argparse
+import asyncio
+import queue
+import random
+import struct
+import threading
+import time
+from typing import Callable
+
+from movegen import (Position, ARMIES, WHITE, BLACK, move_from, move_to,
+                     move_promotion)
+
+PORT = 47400
+VERSION = 1
+PING_INTERVAL = 1.0  # seconds between latency probes
+TIMEOUT = 5.0  # seconds of silence after which a connection is dropped
+RECONNECT_TIMEOUT = 30.0  # seconds a joining player keeps trying
+
+#===============================================================================
+# Protocol
+#===============================================================================
+START = 1  # host -> join: armies, the joining player's color, time control
+HELLO = 2  # both, on connecting: protocol version, ply and position hash
+MOVE = 3  # one move
+REPLAY = 4  # the moves from some ply on, and the clocks
+RESYNC = 5  # join -> host: games diverged; send the whole game
+PING = 6
+PONG = 7
+BYE = 8  # leaving; don't reconnect
+
+# length of type and payload, type
+HEADER_STRUCT = struct.Struct(">HB")
+# White army, Black army, the receiver's color, base ms, increment ms
+START_STRUCT = struct.Struct(">BBBII")
+# version, ply, hash (0 if no game yet)
+HELLO_STRUCT = struct.Struct(">BHQ")
+# ply, from, to, piece code, promotion code + 1, mover's clock in ms
+MOVE_STRUCT = struct.Struct(">HBBBBI")
+# first ply, White ms, Black ms; then REPLAY_MOVE_STRUCT per move
+REPLAY_STRUCT = struct.Struct(">HII")
+# from, to, promotion code + 1
+REPLAY_MOVE_STRUCT = struct.Struct(">BBB")
+# token, echoed by PONG
+PING_STRUCT = struct.Struct(">I")
+
+
+class ProtocolError(ValueError):
+    """
+    A peer sent something that doesn't fit the game, e.g. an illegal move.
+    """
+
+
+def frame(kind: int, payload: bytes = b"") -> bytes:
+    """
+    :param kind: message type, e.g. MOVE.
+    :param payload: (optional) the message.
+    :return: the framed message.
+    """
+    return HEADER_STRUCT.pack(len(payload) + 1, kind) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[int, bytes]:
+    """
+    Read one framed message.
+
+    :param reader: the connection.
+    :return: the message type and payload.
+    """
+    header = await reader.readexactly(HEADER_STRUCT.size)
+    length, kind = HEADER_STRUCT.unpack(header)
+    if not length:
+        raise ProtocolError("empty frame")
+    return kind, await reader.readexactly(length - 1)
+
+
+def find_move(pos: Position, fr: int, to: int,
+              promotion: int | None) -> int:
+    """
+    Find the legal move with some squares and promotion.
+
+    :param pos: the position.
+    :param fr: origin square.
+    :param to: destination square.
+    :param promotion: piece code promoted to, or None.
+    :return: the encoded move.
+    """
+    for move in pos.legal_moves():
+        if move_from(move) == fr and move_to(move) == to \
+                and move_promotion(move) == promotion:
+            return move
+    raise ProtocolError(f"illegal move {fr}-{to} in {pos.fen()}")
+
+
+def encode_move(pos: Position, move: int, clock: float) -> bytes:
+    """
+    :param pos: the position before the move.
+    :param move: the encoded move.
+    :param clock: the mover's remaining seconds after the move.
+    :return: a MOVE payload, 10 bytes.
+    """
+    promotion = move_promotion(move)
+    return MOVE_STRUCT.pack(len(pos.history), move_from(move), move_to(move),
+                            (pos.board[move_from(move)] - 1) >> 1,
+                            0 if promotion is None else promotion + 1,
+                            max(0, round(1000 * clock)))
+
+
+def decode_move(pos: Position, payload: bytes) -> tuple[int, float]:
+    """
+    :param pos: the position before the move.
+    :param payload: a MOVE payload.
+    :return: the encoded move and the mover's remaining seconds.
+    """
+    ply, fr, to, piece, promotion, clock = MOVE_STRUCT.unpack(payload)
+    if ply != len(pos.history):
+        raise ProtocolError(f"move for ply {ply} at ply {len(pos.history)}")
+    if fr >= 64 or to >= 64:
+        raise ProtocolError(f"no square {max(fr, to)}")
+    if not pos.board[fr] or (pos.board[fr] - 1) >> 1 != piece:
+        raise ProtocolError(f"no piece {piece} on square {fr}")
+    return find_move(pos, fr, to, promotion - 1 if promotion else None), \
+        clock / 1000
+
+
+def encode_replay(ply: int, clocks: tuple[float, float],
+                  moves: list[int]) -> bytes:
+    """
+    :param ply: number of moves before the first one sent.
+    :param clocks: (White, Black) remaining seconds.
+    :param moves: the encoded moves from that ply on.
+    :return: a REPLAY payload, 10 bytes plus 3 per move.
+    """
+    payload = bytearray(REPLAY_STRUCT.pack(
+        ply, *(max(0, round(1000 * clock)) for clock in clocks)))
+    for move in moves:
+        payload += REPLAY_MOVE_STRUCT.pack(move_from(move), move_to(move),
+                                           move >> 15)
+    return bytes(payload)
+
+
+#===============================================================================
+# Game
+#===============================================================================
+class NetGame:
+    """
+    The game as one side of the connection sees it: the position, its moves,
+    the hash after every ply, and the clocks.
+    """
+
+    def __init__(self, armies: tuple[str, str], base: float,
+                 increment: float) -> None:
+        """
+        Constructor.
+
+        :param armies: army folders of White and Black.
+        :param base: starting time on each clock, in seconds.
+        :param increment: seconds added to a clock after each move.
+        """
+        self.armies = tuple(armies)
+        self.base = base
+        self.increment = increment
+        self.pos = Position.start(*armies)
+        self.moves: list[int] = []
+        self.hashes = [self.pos.hash]  # after 0, 1, 2... plies
+        self.clock = [base, base]
+        self.turn_start = time.monotonic()
+
+    def play(self, move: int) -> None:
+        """
+        Play a move and charge the mover's clock.
+
+        :param move: a legal encoded move.
+        """
+        now = time.monotonic()
+        side = self.pos.side
+        self.clock[side] += self.increment - (now - self.turn_start)
+        self.turn_start = now
+        self.pos.make(move)
+        self.moves.append(move)
+        self.hashes.append(self.pos.hash)
+
+    def truncate(self, ply: int) -> None:
+        """
+        Take back moves down to a ply.
+
+        :param ply: number of moves to keep.
+        """
+        while len(self.moves) > ply:
+            self.pos.unmake()
+            self.moves.pop()
+            self.hashes.pop()
+
+    def set_clocks(self, white: float, black: float) -> None:
+        """
+        Take over clock readings, e.g. from the peer; the side to move's
+        clock runs from now.
+        """
+        self.clock = [white, black]
+        self.turn_start = time.monotonic()
+
+    def clocks(self) -> tuple[float, float]:
+        """
+        :return: (White, Black) remaining seconds, now.
+        """
+        clock = list(self.clock)
+        clock[self.pos.side] -= time.monotonic() - self.turn_start
+        return clock[WHITE], clock[BLACK]
+
+
+#===============================================================================
+# Session
+#===============================================================================
+class LanSession:
+    """
+    One side of a LAN game. Create it with host() or join().
+    """
+
+    def __init__(self, hosting: bool, address: str, port: int,
+                 game: NetGame = None, color: int = WHITE,
+                 notify: Callable[[], None] = None) -> None:
+        """
+        Constructor. Starts the network thread.
+
+        :param hosting: whether to listen rather than connect.
+        :param address: address to listen on or connect to.
+        :param port: TCP port; 0 to listen on any free port.
+        :param game: (optional) the game, if hosting.
+        :param color: (optional) our color, if hosting.
+        :param notify: (optional) called from the network thread when
+                       poll() has something new.
+        """
+        self.hosting = hosting
+        self.address = address
+        self.port = port
+        self.game = game
+        self.color = color
+        self.notify = notify
+
+        self.connected = False
+        self.started = False  # whether "start" was posted, when hosting
+        self.closed = False
+        self.latency: float = None  # round trip, in seconds; smoothed
+        self.inbox: queue.Queue[tuple] = queue.Queue()
+
+        self.loop: asyncio.AbstractEventLoop = None
+        self._stop: asyncio.Event = None
+        self._writer: asyncio.StreamWriter = None
+        self._pings: dict[int, float] = {}
+        self._ready = threading.Event()
+        self.thread = threading.Thread(target=asyncio.run, args=(self._run(),),
+                                       daemon=True)
+        self.thread.start()
+        self._ready.wait()
+
+    @classmethod
+    def host(cls, armies: tuple[str, str] = ("fide", "fide"),
+             base: float = 600.0, increment: float = 0.0,
+             color: int = WHITE, address: str = "0.0.0.0",
+             port: int = PORT, notify: Callable[[], None] = None) \
+            -> "LanSession":
+        """
+        Host a game and wait for a player to join.
+
+        :param armies: (optional) army folders of White and Black.
+        :param base: (optional) starting time on each clock, in seconds.
+        :param increment: (optional) seconds added after each move.
+        :param color: (optional) the host's color.
+        :param address: (optional) address to listen on.
+        :param port: (optional) TCP port; 0 for any free port (see port).
+        :param notify: (optional) as in the constructor.
+        :return: the session.
+        """
+        return cls(True, address, port, NetGame(armies, base, increment),
+                   color, notify)
+
+    @classmethod
+    def join(cls, address: str, port: int = PORT,
+             notify: Callable[[], None] = None) -> "LanSession":
+        """
+        Join a hosted game. A "start" message follows once connected.
+
+        :param address: the host's address.
+        :param port: (optional) the host's TCP port.
+        :param notify: (optional) as in the constructor.
+        :return: the session.
+        """
+        return cls(False, address, port, notify=notify)
+
+    #---------------------------------------------------------------------------
+    # Main thread
+    #---------------------------------------------------------------------------
+    def poll(self) -> list[tuple]:
+        """
+        Collect what arrived since the last call, without blocking.
+
+        :return: the messages, oldest first (see the module docstring).
+        """
+        messages = []
+        while True:
+            try:
+                messages.append(self.inbox.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def send_move(self, move: int) -> None:
+        """
+        Play one of our moves and send it, without blocking. While
+        disconnected, it is sent when the connection comes back.
+
+        :param move: a legal encoded move in the current position.
+        """
+        self.loop.call_soon_threadsafe(self._play_own, move)
+
+    def clocks(self) -> tuple[float, float] | None:
+        """
+        :return: (White, Black) remaining seconds now, or None before the
+                 game starts.
+        """
+        game = self.game
+        return None if game is None else game.clocks()
+
+    def drop_connection(self) -> None:
+        """
+        Cut the connection abruptly, as a network failure would; for testing
+        reconnection.
+        """
+        self.loop.call_soon_threadsafe(self._abort)
+
+    def close(self) -> None:
+        """
+        Leave the game and stop the network thread.
+        """
+        if not self.closed:
+            self.loop.call_soon_threadsafe(self._close)
+            self.thread.join(timeout=1)
+
+    #---------------------------------------------------------------------------
+    # Network thread
+    #---------------------------------------------------------------------------
+    async def _run(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        if self.hosting:
+            try:
+                server = await asyncio.start_server(self._accept,
+                                                    self.address, self.port)
+            except OSError as error:
+                self._post("closed", str(error))
+                self.closed = True
+                self._ready.set()
+                return
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            async with server:
+                await self._stop.wait()
+        else:
+            self._ready.set()
+            await self._connect()
+        if self._writer is not None:
+            self._writer.close()
+        self.closed = True
+
+    async def _connect(self) -> None:
+        delay = 0.1
+        give_up = time.monotonic() + RECONNECT_TIMEOUT
+        while not self._stop.is_set():
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.address, self.port),
+                    TIMEOUT)
+            except (OSError, asyncio.TimeoutError):
+                if time.monotonic() >= give_up:
+                    self._post("closed", "could not reach the host")
+                    return
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, 2.0)
+                continue
+            delay = 0.1
+            await self._serve(reader, writer)
+            give_up = time.monotonic() + RECONNECT_TIMEOUT
+
+    async def _accept(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        if self._writer is not None:
+            self._writer.close()  # the same player, reconnecting
+        game = self.game
+        if not self.started:
+            self.started = True
+            self._post("start", self.color, game.armies, game.base,
+                       game.increment)
+        self._send(START_STRUCT.pack(ARMIES.index(game.armies[0]),
+                                     ARMIES.index(game.armies[1]),
+                                     self.color ^ 1, round(1000 * game.base),
+                                     round(1000 * game.increment)),
+                   START, writer)
+        await self._serve(reader, writer)
+
+    async def _serve(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """
+        Exchange messages over one connection until it closes.
+        """
+        self._writer = writer
+        game = self.game
+        self._send(HELLO_STRUCT.pack(VERSION,
+                                     len(game.moves) if game else 0,
+                                     game.pos.hash if game else 0), HELLO)
+        self.connected = True
+        self._post("connected")
+        pinger = asyncio.create_task(self._ping())
+        try:
+            while not self._stop.is_set():
+                kind, payload = await asyncio.wait_for(read_frame(reader),
+                                                       TIMEOUT)
+                self._handle(kind, payload)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                ConnectionError, OSError, struct.error):
+            pass
+        except Exception as error:
+            # a peer that breaks the protocol (ProtocolError) or a bug; end
+            # the session rather than let the network thread die unnoticed
+            self._post("closed", f"{type(error).__name__}: {error}")
+            self._close()
+        finally:
+            pinger.cancel()
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+                self.connected = False
+                if not self._stop.is_set():
+                    self._post("disconnected")
+
+    async def _ping(self) -> None:
+        while True:
+            token = random.getrandbits(32)
+            self._pings = {token: time.monotonic()}  # only the latest counts
+            self._send(PING_STRUCT.pack(token), PING)
+            await asyncio.sleep(PING_INTERVAL)
+
+    def _handle(self, kind: int, payload: bytes) -> None:
+        """
+        React to one message from the peer.
+        """
+        game = self.game
+        if kind == PING:
+            self._send(payload, PONG)
+        elif kind == PONG:
+            sent = self._pings.pop(PING_STRUCT.unpack(payload)[0], None)
+            if sent is not None:
+                rtt = time.monotonic() - sent
+                self.latency = rtt if self.latency is None \
+                    else 0.8 * self.latency + 0.2 * rtt
+        elif kind == START and not self.hosting:
+            white, black, color, base, increment = START_STRUCT.unpack(payload)
+            if max(white, black) >= len(ARMIES) or color not in (WHITE, BLACK):
+                raise ProtocolError(f"no game with armies {white}, {black} "
+                                    f"and color {color}")
+            armies = ARMIES[white], ARMIES[black]
+            if game is None or game.armies != armies or color != self.color:
+                self.game = NetGame(armies, base / 1000, increment / 1000)
+                self.color = color
+                self._post("start", color, armies, base / 1000,
+                           increment / 1000)
+        elif kind == HELLO:
+            version, ply, key = HELLO_STRUCT.unpack(payload)
+            if version != VERSION:
+                self._post("closed", f"peer speaks protocol {version}, "
+                                     f"not {VERSION}")
+                self._close()
+            elif game is not None:
+                self._sync(ply, key)
+        elif kind == MOVE and game is not None:
+            try:
+                if game.pos.side == self.color:
+                    raise ProtocolError("move out of turn")
+                move, clock = decode_move(game.pos, payload)
+            except ProtocolError:
+                self._diverged()
+                return
+            mover = game.pos.side
+            game.play(move)
+            game.clock[mover] = clock  # the mover's own reading wins
+            self._post("move", move, game.clocks())
+        elif kind == REPLAY and game is not None:
+            self._replay(payload)
+        elif kind == RESYNC and self.hosting:
+            self._send_replay(0)
+        elif kind == BYE:
+            self._post("closed", "the opponent left")
+            self._close()
+
+    def _sync(self, ply: int, key: int) -> None:
+        """
+        Compare the peer's latest ply and hash with our game, and send the
+        moves it missed. The side that is behind waits for the other.
+        """
+        game = self.game
+        if ply > len(game.moves):
+            return  # the peer is ahead and will send us its moves
+        if game.hashes[ply] != key:
+            self._diverged()
+        elif ply < len(game.moves) or self.hosting:
+            self._send_replay(ply)  # the host's clocks win on a tie
+
+    def _diverged(self) -> None:
+        if self.hosting:
+            self._send_replay(0)
+        else:
+            self._send(b"", RESYNC)
+
+    def _send_replay(self, ply: int) -> None:
+        game = self.game
+        self._send(encode_replay(ply, game.clocks(), game.moves[ply:]), REPLAY)
+
+    def _replay(self, payload: bytes) -> None:
+        """
+        Apply the moves the peer sent from some ply on. If that ply is
+        before our last move, the host's game wins: a joining player drops
+        its later moves, and the host sends its whole game instead.
+        """
+        game = self.game
+        ply, white, black = REPLAY_STRUCT.unpack_from(payload)
+        if ply > len(game.moves) or self.hosting and ply < len(game.moves):
+            self._diverged()
+            return
+        reset = ply < len(game.moves)
+        game.truncate(ply)
+
+        new = []
+        try:
+            for offset in range(REPLAY_STRUCT.size, len(payload),
+                                REPLAY_MOVE_STRUCT.size):
+                fr, to, promotion = REPLAY_MOVE_STRUCT.unpack_from(payload,
+                                                                   offset)
+                move = find_move(game.pos, fr, to,
+                                 promotion - 1 if promotion else None)
+                game.play(move)
+                new.append(move)
+        except ProtocolError:
+            self._diverged()
+            return
+        game.set_clocks(white / 1000, black / 1000)
+
+        if reset:
+            self._post("reset", game.armies, list(game.moves), game.clocks())
+        else:
+            for move in new:
+                self._post("move", move, game.clocks())
+
+    def _play_own(self, move: int) -> None:
+        game = self.game
+        if game is None or self._stop.is_set():
+            return
+        mover = game.pos.side
+        clock = game.clocks()[mover] + game.increment
+        payload = encode_move(game.pos, move, clock)
+        game.play(move)
+        game.clock[mover] = clock  # exactly what the peer is told
+        self._send(payload, MOVE)
+
+    def _send(self, payload: bytes, kind: int,
+              writer: asyncio.StreamWriter = None) -> None:
+        writer = writer or self._writer
+        if writer is not None and not writer.is_closing():
+            writer.write(frame(kind, payload))
+
+    def _post(self, *message) -> None:
+        self.inbox.put(message)
+        if self.notify is not None:
+            self.notify()
+
+    def _abort(self) -> None:
+        if self._writer is not None:
+            self._writer.transport.abort()
+
+    def _close(self) -> None:
+        if self._stop.is_set():
+            return
+        self._send(b"", BYE)
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.close()  # after the BYE is flushed
+
+
+#===============================================================================
+# Loopback check
+#===============================================================================
+class _Player:
+    """
+    One side of the loopback check: a session, and the position built from
+    its messages the way game.receive_network() builds it.
+    """
+
+    def __init__(self, session: LanSession) -> None:
+        self.session = session
+        self.position: Position = None
+
+    def wait(self, kind: str, seconds: float = 10.0) -> tuple:
+        """
+        Apply messages until one of some kind arrives.
+        """
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            found = None
+            for message in self.session.poll():
+                self.apply(message)
+                if message[0] == kind and found is None:
+                    found = message
+            if found is not None:
+                return found
+            time.sleep(0.005)
+        raise TimeoutError(f"no {kind!r} message")
+
+    def apply(self, message: tuple) -> None:
+        if message[0] == "start":
+            self.position = Position.start(*message[2])
+        elif message[0] == "move" and self.position is not None:
+            self.position.make(message[1])
+        elif message[0] == "reset":
+            self.position = Position.start(*message[1])
+            for move in message[2]:
+                self.position.make(move)
+
+    def play(self, move: int) -> None:
+        """
+        Play one of our moves, as the UI would.
+        """
+        self.position.make(move)
+        self.session.send_move(move)
+
+
+def loopback(plies: int = 40, seed: int = 0) -> None:
+    """
+    Play a random game between a host and a joining player over the
+    loopback interface, cutting the connection halfway through (with a
+    move made while it is down), and check both sides end up with the
+    same position, in their games and in what their messages show.
+
+    :param plies: (optional) number of moves to play.
+    :param seed: (optional) seed for the random moves.
+    """
+    rng = random.Random(seed)
+    host = LanSession.host(("fide", "fide"), 60, 1, address="127.0.0.1",
+                           port=0)
+    join = LanSession.join("127.0.0.1", host.port)
+    players = [_Player(host), _Player(join)]  # WHITE hosts
+    try:
+        for player in players:
+            player.wait("start")
+        for ply in range(plies):
+            mover = players[ply % 2]
+            other = players[1 - ply % 2]
+            moves = mover.position.legal_moves()
+            if not moves:
+                break
+            if ply == plies // 2:
+                join.drop_connection()
+                players[1].wait("disconnected")
+            start = time.perf_counter()
+            mover.play(rng.choice(moves))
+            other.wait("move")
+            if ply == plies // 2:
+                print(f"ply {ply}: resynced after a dropped connection in "
+                      f"{1000 * (time.perf_counter() - start):.0f} ms")
+
+        time.sleep(2 * PING_INTERVAL)  # for a latency reading
+        assert host.game.pos.hash == join.game.pos.hash, "games differ"
+        assert host.game.moves == join.game.moves, "move lists differ"
+        for player in players:
+            assert player.position.hash == host.game.pos.hash, \
+                "messages differ from the game"
+        white, black = host.clocks()
+        print(f"{len(host.game.moves)} plies, same position on both sides")
+        print(f"clocks {white:.2f} s / {black:.2f} s")
+        if join.latency is not None:
+            print(f"latency {1000 * join.latency:.3f} ms round trip")
+    finally:
+        join.close()
+        host.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--loopback", action="store_true",
+                        help="play a game against ourselves over loopback")
+    parser.add_argument("--plies", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.loopback:
+        loopback(args.plies, args.seed)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Load generator for server.py: many random games at once, over a handful of
+connections, with spectators.
+
+Every game is played by two simulated players who answer each other's
+moves with random legal moves as soon as they arrive, so the server is
+kept as busy as it can be (--think slows them down, for latency at less
+than full load). Players and spectators are spread over a few
+connections, the way a tournament front end would multiplex them. Reports
+the moves relayed per second and the relay latency: the time from a move
+being sent to it arriving at the opponent or a spectator (all in this
+process, so on one clock).
+
+Stalled spectators (--stalled) watch every game but never read, with
+small receive buffers, to check that a slow reader does not hold up
+everyone else: once the games are over they read everything, and the run
+fails unless the server paused them and caught them up (a REPLAY from a
+later ply than 0). Without --server, a server is started on a free port for
+the duration of the run, with a pause threshold (--high-water) low enough
+for a short run to reach. Usage, from this directory:
+
+$ python3 loadgen.py --games 200 --spectators 5 --moves 60 --stalled 2
+"""
+
+import argparse
+import asyncio
+import random
+import socket
+import sys
+import time
+
+from movegen import Position, ARMIES
+from lan import (frame, read_frame, encode_move, START, MOVE, REPLAY,
+                 START_STRUCT, MOVE_STRUCT, REPLAY_STRUCT)
+from server import PLAY, WATCH, ERROR, RESULT, ID_STRUCT, PLAY_STRUCT
+
+STALLED_RCVBUF = 4096  # receive buffer of stalled spectators, in bytes
+QUIET = 1.0  # seconds without a frame after which a stalled one is drained
+
+
+class LoadGame:
+    """
+    One simulated game: the position both players share, and when each
+    move was sent.
+    """
+
+    __slots__ = ("id", "pos", "connections", "players", "sent", "done",
+                 "result")
+
+    def __init__(self, game_id: int, players: tuple[int, int]) -> None:
+        self.id = game_id
+        self.pos = Position.start("fide", "fide")
+        self.connections = players  # the connections that ask for seats
+        # connection index of White and Black, once the server says
+        self.players = [None, None]
+        self.sent: list[float] = []  # time.perf_counter() of each ply
+        self.done = False
+        self.result: str = None  # from the server's RESULT, if it ended
+
+
+class LoadGenerator:
+    """
+    Drives the simulated games and collects latencies.
+    """
+
+    def __init__(self, games: int, spectators: int, moves: int,
+                 connections: int, think: float = 0.0,
+                 seed: int = 0) -> None:
+        """
+        Constructor.
+
+        :param games: number of games played at once.
+        :param spectators: spectators per game.
+        :param moves: plies per game, unless it ends before.
+        :param connections: connections the players and spectators share.
+        :param think: (optional) average seconds a player waits before
+                      answering; 0 answers at once, which saturates the
+                      server.
+        :param seed: (optional) seed for the random moves.
+        """
+        self.rng = random.Random(seed)
+        self.moves = moves
+        self.connections = connections
+        self.spectators = spectators
+        self.think = think
+        self.games = [LoadGame(i, (i % connections, (i + 1) % connections))
+                      for i in range(games)]
+        self.writers: list[asyncio.StreamWriter] = []
+        self.latencies: list[float] = []
+        self.relayed = 0
+        self.errors = 0
+        self.catch_ups = 0  # REPLAYs after the first, to stalled spectators
+        self.remaining = games
+        self.finished = asyncio.Event()
+
+    async def run(self, host: str, port: int, stalled: int = 0) -> float:
+        """
+        Connect, start every game and wait for all of them to end, then
+        drain the stalled spectators.
+
+        :param host: the server's address.
+        :param port: the server's port.
+        :param stalled: (optional) extra spectators that never read.
+        :return: seconds from the first game starting to the last ending.
+        """
+        streams = [await asyncio.open_connection(host, port)
+                   for _ in range(self.connections)]
+        for _ in range(stalled):
+            # a small receive window, so the server's send buffer fills
+            # instead of the kernel's buffers absorbing the whole stream
+            sock = socket.socket()
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                            STALLED_RCVBUF)
+            sock.setblocking(False)
+            await asyncio.get_running_loop().sock_connect(sock, (host, port))
+            reader, writer = await asyncio.open_connection(sock=sock)
+            # or the StreamReader would keep reading into its own buffer
+            writer.transport.pause_reading()
+            streams.append((reader, writer))
+        self.writers = [writer for _, writer in streams]
+        readers = [asyncio.create_task(self.read(index, reader))
+                   for index, (reader, _) in
+                   enumerate(streams[:self.connections])]
+
+        for game in self.games:
+            game_id = ID_STRUCT.pack(game.id)
+            for k in range(self.spectators):
+                watcher = (game.id + 2 + k) % self.connections
+                self.writers[watcher].write(frame(WATCH, game_id))
+            for index in range(self.connections, len(streams)):
+                self.writers[index].write(frame(WATCH, game_id))
+        start = time.perf_counter()
+        for game in self.games:
+            for player in game.connections:
+                self.writers[player].write(frame(PLAY, PLAY_STRUCT.pack(
+                    game.id, ARMIES.index("fide"), ARMIES.index("fide"))))
+
+        try:
+            await self.finished.wait()
+            seconds = time.perf_counter() - start
+            for reader, writer in streams[self.connections:]:
+                writer.transport.resume_reading()
+                await self.drain(reader)
+            return seconds
+        finally:
+            for task in readers:
+                task.cancel()
+            for writer in self.writers:
+                writer.close()
+
+    async def read(self, index: int, reader: asyncio.StreamReader) -> None:
+        """
+        Handle everything one connection receives.
+        """
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                game = self.games[ID_STRUCT.unpack_from(payload)[0]]
+                if kind == MOVE:
+                    self.receive(index, game, payload)
+                elif kind == START:
+                    # seats go in order of arrival, which is up to the
+                    # network, so the colors come from START
+                    color = START_STRUCT.unpack_from(payload,
+                                                     ID_STRUCT.size)[2]
+                    game.players[color] = index
+                    if color == 0 and not game.sent:
+                        self.move(game)
+                elif kind == RESULT:
+                    game.result = payload[ID_STRUCT.size:].decode()
+                elif kind == ERROR:
+                    self.errors += 1
+                    if self.errors <= 5:
+                        print(f"game {game.id}: "
+                              f"{payload[ID_STRUCT.size:].decode()}")
+                # REPLAY: spectators catching up; nothing to check
+        except (asyncio.IncompleteReadError, ConnectionError):
+            if not self.finished.is_set():
+                print(f"connection {index} closed by the server")
+                self.finished.set()
+
+    async def drain(self, reader: asyncio.StreamReader) -> None:
+        """
+        Read a stalled spectator's connection until it goes quiet, counting
+        the REPLAYs that caught it up after a pause.
+        """
+        try:
+            while True:
+                kind, payload = await asyncio.wait_for(read_frame(reader),
+                                                       QUIET)
+                if kind == REPLAY and REPLAY_STRUCT.unpack_from(
+                        payload, ID_STRUCT.size)[0]:
+                    self.catch_ups += 1
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                ConnectionError):
+            pass
+
+    def receive(self, index: int, game: LoadGame, payload: bytes) -> None:
+        """
+        Time a relayed move and, if this connection plays the side to
+        move, answer it.
+        """
+        ply = MOVE_STRUCT.unpack_from(payload, ID_STRUCT.size)[0]
+        self.latencies.append(time.perf_counter() - game.sent[ply])
+        self.relayed += 1
+        # the first copy to reach the mover's connection is the one answered
+        if ply == len(game.sent) - 1 and not game.done \
+                and index == game.players[game.pos.side]:
+            if self.think:
+                # jittered, so the games do not all move in step
+                delay = self.think * self.rng.uniform(0.5, 1.5)
+                asyncio.get_running_loop().call_later(delay, self.move, game)
+            else:
+                self.move(game)
+
+    def move(self, game: LoadGame) -> None:
+        """
+        Play and send a random move for the side to move, or end the game.
+        The server ends games that are over by the rules on its own.
+        """
+        if game.done:
+            return
+        if len(game.sent) >= self.moves or game.pos.outcome() is not None:
+            game.done = True
+            self.remaining -= 1
+            if not self.remaining:
+                self.finished.set()
+            return
+        move = self.rng.choice(game.pos.legal_moves())
+        payload = ID_STRUCT.pack(game.id) \
+            + encode_move(game.pos, move, 600.0)
+        game.pos.make(move)
+        game.sent.append(time.perf_counter())
+        self.writers[game.players[game.pos.side ^ 1]].write(
+            frame(MOVE, payload))
+
+    def report(self, seconds: float, stalled: int = 0) -> bool:
+        """
+        Print throughput and latency percentiles.
+
+        :param seconds: the run's length.
+        :param stalled: (optional) number of stalled spectators.
+        :return: False if there were stalled spectators but none was
+                 paused.
+        """
+        plies = sum(len(game.sent) for game in self.games)
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            return 1000 * latencies[min(len(latencies) - 1,
+                                        int(p * len(latencies)))]
+
+        print(f"{len(self.games)} games, {plies} moves in {seconds:.2f} s: "
+              f"{plies / seconds:.0f} moves/s, "
+              f"{self.relayed / seconds:.0f} relayed moves/s")
+        if latencies:
+            print(f"relay latency: p50 {percentile(0.5):.2f} ms, "
+                  f"p99 {percentile(0.99):.2f} ms, "
+                  f"max {1000 * latencies[-1]:.2f} ms")
+        results: dict[str, int] = {}
+        for game in self.games:
+            if game.result is not None:
+                results[game.result] = results.get(game.result, 0) + 1
+        if results:
+            print("ended on the server: " + ", ".join(
+                f"{count} {text}" for text, count in sorted(results.items())))
+        if self.errors:
+            print(f"{self.errors} errors from the server")
+        if stalled:
+            print(f"stalled spectators: {self.catch_ups} catch-up replays")
+            if not self.catch_ups:
+                print("FAIL: the server never paused a stalled spectator; "
+                      "try more games or moves")
+                return False
+        return True
+
+
+async def start_server(high_water: int) \
+        -> tuple[asyncio.subprocess.Process, int]:
+    """
+    Start server.py on a free loopback port.
+
+    :param high_water: unsent bytes at which it pauses a spectator.
+    :return: the process and the port.
+    """
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "server.py", "--address", "127.0.0.1", "--port", "0",
+        "--stats", "--high-water", str(high_water), "--low-water",
+        str(high_water // 4), stdout=asyncio.subprocess.PIPE)
+    line = await asyncio.wait_for(process.stdout.readline(), 10)
+    port = int(line.split()[-1])
+
+    async def forward() -> None:
+        async for line in process.stdout:
+            print("server:", line.decode().rstrip())
+
+    asyncio.create_task(forward())
+    return process, port
+
+
+async def run(args: argparse.Namespace) -> bool:
+    process = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        port = int(port)
+    else:
+        host = "127.0.0.1"
+        process, port = await start_server(args.high_water)
+    generator = LoadGenerator(args.games, args.spectators, args.moves,
+                              args.connections, args.think / 1000,
+                              args.seed)
+    try:
+        seconds = await asyncio.wait_for(
+            generator.run(host, port, args.stalled), args.timeout)
+        return generator.report(seconds, args.stalled)
+    except asyncio.TimeoutError:
+        print(f"timed out with {generator.remaining} games unfinished")
+        return False
+    finally:
+        if process is not None:
+            await asyncio.sleep(0)
+            process.terminate()
+            await process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--server", metavar="HOST:PORT",
+                        help="use a running server instead of starting one")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--spectators", type=int, default=3,
+                        help="spectators per game")
+    parser.add_argument("--moves", type=int, default=60,
+                        help="plies per game")
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--think", type=float, default=0.0,
+                        help="milliseconds before a player answers")
+    parser.add_argument("--stalled", type=int, default=0,
+                        help="spectators of every game that never read")
+    parser.add_argument("--high-water", type=int, default=32 * 1024,
+                        help="the started server's pause threshold, in "
+                             "bytes")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
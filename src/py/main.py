@@ -1,74 +1,173 @@
-"""Entry point of the program."""
+"""
+Entry point of the program.
+
+Run with --startup-time to print the time to the first frame and exit, or
+with --follow-refresh to animate at the display's refresh rate rather than
+FRAME_RATE.
+F3 toggles the profiling overlay; F4 writes a trace of what was profiled
+(trace-<time>.json, for chrome://tracing, Perfetto or speedscope).
+"""
+
+import time
+
+START_TIME = time.perf_counter()  # before the slower imports below
 
 import sys
 
 import pygame.display
 from pygame.locals import *
 
+import profiler
 from settings import *
-import menu, choose
-
-#===============================================================================
-# Setup
-#===============================================================================
-pygame.init()
-pygame.display.set_caption("Grand Tournament Chess")
-
-display: pygame.Surface = pygame.display.set_mode()
-clock: pygame.time.Clock = pygame.time.Clock()
+from pacing import Pacer
+from renderer import Renderer
+from ui import ProfilerOverlay, Transition
+from board import Screenwipe
+import menu, choose, game
 
-pygame.display.set_icon(
-    pygame.image.load(APP_ICON_PATH)
-    .convert_alpha()
-)
 
-screen = MENU
-screens = [menu, choose]
-set_dark_mode(True)
-set_text_mode(CORNER)
-set_button_mode(CORNER)
-set_resolution(pygame.display.get_window_size())
-
-
-def handle_events() -> None:
+def handle_events(events: list[Event]) -> None:
     """
-    Polls all events from the pygame event queue and handles
-    dispatches.
+    Handles dispatches for the events of a frame.
+
+    :param events: the events, from the pacer.
     """
     global screen
 
-    for event in pygame.event.get():
+    for event in events:
         # Menu
         if event.type == QUIT:
+            game.opponent.quit()
+            if game.network is not None:
+                game.network.close()
             pygame.quit()
             sys.exit()
-        elif event.type == GO_CHOOSE:
-            screen = CHOOSE
-
-        # Choose
+        elif event.type in SCREEN_EVENTS:
+            go(SCREEN_EVENTS[event.type])
+        elif event.type == LAN_MESSAGE:
+            game.receive_network()  # never blocks
+
+        # Debugging
+        elif event.type == KEYDOWN and event.key == K_F3:
+            profiler.enable(not profiler.enabled)
+            renderer.invalidate()  # paints over the overlay when it closes
+        elif event.type == KEYDOWN and event.key == K_F4:
+            print(f"wrote {profiler.dump_trace()}")
+
+        # Input, once the screen is fully shown
+        elif transition is not None:
+            continue
+        elif event.type in (MOUSEMOTION, MOUSEBUTTONDOWN, MOUSEBUTTONUP):
+            screens[screen].send_mouse(event)
         elif event.type == KEYDOWN:
             choose.send_key_down(event)
 
 
-def draw() -> None:
+def go(target: int) -> None:
     """
-    Handles all display.
+    Switch to another screen with a transition: a wipe into or out of a
+    game, a fade otherwise. Screens that don't exist yet are ignored.
+
+    :param target: the screen, e.g. CHOOSE.
     """
-    display.fill(C_BACKGROUND_DARK if get_dark_mode()
-                 else C_BACKGROUND_LIGHT)
+    global screen, transition
 
-    screens[screen].display(display)
-    screens[screen].update()
+    if target not in screens or target == screen:
+        return
+    screens[screen].pointer.reset()
+    old = renderer.snapshot(display, screens[screen])
+    new = renderer.snapshot(display, screens[target])
+    effect = Screenwipe if PLAY in (screen, target) else Transition
+    transition = effect(old, new)
+    pacer.animate(transition.duration)
+    screen = target
 
-    pygame.display.update()
 
+def next_wake() -> float | None:
+    """
+    Get when the next frame is needed even if no input arrives.
+
+    :return: a time.perf_counter() time, or None if only input matters.
+    """
+    times = [time.perf_counter() + ENGINE_POLL_INTERVAL] \
+        if game.opponent.thinking or game.opponent.pondering else []
+    times += [t for t in (component.next_update()
+                          for component in screens[screen].components)
+              if t is not None]
+    if profiler.enabled or transition is not None:
+        times.append(time.perf_counter())  # update every frame
+    return min(times, default=None)
 
-#===============================================================================
-# Mainloop
-#===============================================================================
-while True:
-    # specify amount of time between frames via frame rate
-    clock.tick(FRAME_RATE)
 
-    handle_events()
-    draw()
+def draw() -> None:
+    """
+    Handles all display. Only the areas that changed since the last frame
+    are repainted and sent to the display; during a screen transition, its
+    snapshots are composited instead.
+    """
+    global transition
+
+    if transition is not None:
+        renderer.draw_transition(display, transition,
+                                 overlay if profiler.enabled else None)
+        if transition.is_done():
+            transition = None
+        return
+    renderer.draw(display, screens[screen],
+                  overlay if profiler.enabled else None)
+    with profiler.section("update"):
+        screens[screen].update()
+
+
+# Everything below only runs in the main process. The engine's worker
+# process may import this module (when processes are spawned rather than
+# forked), and must not open a window.
+if __name__ == "__main__":
+    #===========================================================================
+    # Setup
+    #===========================================================================
+    pygame.init()
+    pygame.display.set_caption("Grand Tournament Chess")
+
+    display: pygame.Surface = pygame.display.set_mode()
+    pacer = Pacer(follow_display="--follow-refresh" in sys.argv)
+    renderer = Renderer()
+    overlay = ProfilerOverlay(F_BUTTON)
+
+    pygame.display.set_icon(
+        pygame.image.load(APP_ICON_PATH)
+        .convert_alpha()
+    )
+    ASSETS.preload()  # piece images, while the menu is drawn
+
+    screen = MENU
+    screens = {MENU: menu, CHOOSE: choose, PLAY: game}
+    transition: Transition = None
+    set_dark_mode(True)
+    set_text_mode(CORNER)
+    set_button_mode(CORNER)
+    set_resolution(pygame.display.get_window_size())
+
+    #===========================================================================
+    # Mainloop
+    #===========================================================================
+    first_frame = True
+    while True:
+        # sleeps until input or the next change when idle; full frame rate
+        # while animating
+        events = pacer.wait(next_wake())
+        profiler.begin_frame()
+
+        with profiler.section("events"):
+            game.opponent.poll()  # never blocks; posts ENGINE_MOVE when ready
+            handle_events(events)
+        draw()
+        profiler.end_frame()
+
+        if first_frame:
+            first_frame = False
+            startup_time = time.perf_counter() - START_TIME
+            if "--startup-time" in sys.argv:
+                print(f"first frame after {1000 * startup_time:.0f} ms")
+                pygame.quit()
+                sys.exit()
@@ -5,8 +5,10 @@ from math import sin, cos, pi
 from pygame.locals import *
 
 from ui import *
+from hittest import Pointer
 
 components: list[Drawable] = []
+pointer = Pointer(components)
 
 
 #===============================================================================
@@ -47,20 +49,24 @@ def display(surface: Surface) -> None:
     splash_center = res[0] * 13 / 20, res[1] / 2
     radius = res[1] / 3.8
 
-    for i in range(len(ICONS)):
-        angle = i * (2 * pi / len(ICONS)) + 0.5  # radians
+    for i in range(len(ICON_PATHS)):
+        angle = i * (2 * pi / len(ICON_PATHS)) + 0.5  # radians
         x = radius * cos(angle)
         y = radius * sin(angle)
 
-        icon = ICONS[i]
+        icon = ASSETS.image(ICON_PATHS[i])
         surface.blit(icon, (splash_center[0] + x - icon.get_width() / 2,
                             splash_center[1] + y - icon.get_height() / 2))
 
 
 def update() -> None:
     """
-    Check for input and post events as needed.
+    Called on each frame. Input arrives through send_mouse().
     """
-    for component in components:
-        if isinstance(component, Button):
-            component.check_click()
+
+
+def send_mouse(event: Event) -> None:
+    """
+    Callback for mouse events. Buttons post their events when clicked.
+    """
+    pointer.handle(event)
@@ -0,0 +1,1002 @@
+"""
+Bitboard move generation for every army in pieces.csv.
+
+Bitboards are 64-bit Python ints where bit 0 is a1, bit 7 is h1 and bit 63
+is h8. Every piece's moves are compiled from its funny notation in
+pieces.csv (see betza.py) into per-color, per-square leap masks and slide
+rays, so generating moves never scans the board one square at a time.
+
+This module does not import pygame, so engines and headless tools can use it.
+"""
+
+import copy
+import os
+import random
+
+from betza import MoveTables, ride, is_colorbound, parse, load
+from boardstate import BoardState, Delta, NO_EP
+
+#===============================================================================
+# Squares and bitboards
+#===============================================================================
+WHITE = 0
+BLACK = 1
+
+BB_ALL = (1 << 64) - 1
+BB_FILE_A = 0x0101010101010101
+BB_FILE_H = BB_FILE_A << 7
+BB_RANK_1 = 0xFF
+BB_RANK_3 = BB_RANK_1 << 16
+BB_RANK_6 = BB_RANK_1 << 40
+BB_RANK_8 = BB_RANK_1 << 56
+
+FILES = "abcdefgh"
+
+
+def square_name(sq: int) -> str:
+    """
+    Get the algebraic name of a square.
+
+    :param sq: square index, from 0 (a1) to 63 (h8).
+    :return: the square's name, e.g. "e4".
+    """
+    return FILES[sq & 7] + str((sq >> 3) + 1)
+
+
+def parse_square(name: str) -> int:
+    """
+    Get the index of an algebraically named square.
+
+    :param name: the square's name, e.g. "e4".
+    :return: square index, from 0 (a1) to 63 (h8).
+    """
+    return FILES.index(name[0]) + 8 * (int(name[1]) - 1)
+
+
+#===============================================================================
+# Piece types
+#===============================================================================
+class PieceType:
+    """
+    Static data about one piece of pieces.csv, with its move tables.
+    """
+
+    def __init__(self, code: str, symbol: str, name: str,
+                 army: str, file: str, betza: str, value: str) -> None:
+        """
+        Constructor. Arguments are the columns of pieces.csv.
+
+        :param code: piece number.
+        :param symbol: notation symbol; empty for pawns.
+        :param name: capitalized name.
+        :param army: army folder.
+        :param file: file symbol, which is also the starting slot of the
+                     piece (R, N, B, Q, K or P).
+        :param betza: movement in funny notation.
+        :param value: approximate value in centipawns; 0 for Kings.
+        """
+        self.code = int(code)
+        self.symbol = symbol
+        self.name = name
+        self.army = army
+        self.file = file
+        self.betza = betza
+        self.value = int(value)
+        self.pawn = file == "P"
+        self.royal = file == "K"
+        self.colorbound = is_colorbound(parse(betza))
+        self.tables: tuple[MoveTables, MoveTables] = None
+
+
+PIECES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "..", "pieces.csv")
+
+with open(PIECES_CSV, "rb") as csv:
+    _source = csv.read()
+    PIECE_TYPES = [PieceType(*line.strip().split(","))
+                   for line in _source.decode().splitlines()[1:]
+                   if line.strip()]
+
+_tables = load([piece.betza for piece in PIECE_TYPES], _source)
+for _piece in PIECE_TYPES:
+    _piece.tables = _tables[_piece.betza]
+
+ARMIES = list(dict.fromkeys(piece.army for piece in PIECE_TYPES))
+
+# army -> {file symbol -> piece code}
+ARMY_SLOTS = {army: {piece.file: piece.code for piece in PIECE_TYPES
+                     if piece.army == army}
+              for army in ARMIES}
+
+BACK_RANK = "RNBQKBNR"
+
+
+#===============================================================================
+# Zobrist keys
+#===============================================================================
+# A position's hash is the XOR of one random key per (piece, square), plus
+# keys for the side to move, the castling rights and the en passant file.
+_random = random.Random(0x47544348)  # fixed, so hashes are reproducible
+
+# indexed by mailbox value - 1, i.e. (code << 1 | color), then by square
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(64)]
+              for _ in range(2 * len(PIECE_TYPES))]
+SIDE_KEY = _random.getrandbits(64)
+CASTLING_KEYS = [0] + [_random.getrandbits(64) for _ in range(15)]
+EP_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+
+#===============================================================================
+# Moves
+#===============================================================================
+# A move is an int: from | to << 6 | flag << 12 | (promotion code + 1) << 15
+NORMAL = 0
+DOUBLE_PUSH = 1
+EN_PASSANT = 2
+CASTLE_SHORT = 3
+CASTLE_LONG = 4
+
+CASTLE_WHITE_SHORT = 1
+CASTLE_WHITE_LONG = 2
+CASTLE_BLACK_SHORT = 4
+CASTLE_BLACK_LONG = 8
+
+# castling rights that survive a move touching each square
+_CASTLE_MASK = [15] * 64
+_CASTLE_MASK[4] = 15 ^ (CASTLE_WHITE_SHORT | CASTLE_WHITE_LONG)
+_CASTLE_MASK[0] = 15 ^ CASTLE_WHITE_LONG
+_CASTLE_MASK[7] = 15 ^ CASTLE_WHITE_SHORT
+_CASTLE_MASK[60] = 15 ^ (CASTLE_BLACK_SHORT | CASTLE_BLACK_LONG)
+_CASTLE_MASK[56] = 15 ^ CASTLE_BLACK_LONG
+_CASTLE_MASK[63] = 15 ^ CASTLE_BLACK_SHORT
+
+
+def make_move(fr: int, to: int, flag: int = NORMAL,
+              promotion: int = None) -> int:
+    """
+    Encode a move.
+
+    :param fr: origin square.
+    :param to: destination square. For castling, the King's destination.
+    :param flag: (optional) NORMAL, DOUBLE_PUSH, EN_PASSANT, CASTLE_SHORT
+                 or CASTLE_LONG.
+    :param promotion: (optional) piece code promoted to.
+    :return: the encoded move.
+    """
+    move = fr | to << 6 | flag << 12
+    if promotion is not None:
+        move |= (promotion + 1) << 15
+    return move
+
+
+def move_from(move: int) -> int:
+    return move & 63
+
+
+def move_to(move: int) -> int:
+    return (move >> 6) & 63
+
+
+def move_flag(move: int) -> int:
+    return (move >> 12) & 7
+
+
+def move_promotion(move: int) -> int | None:
+    return (move >> 15) - 1 if move >> 15 else None
+
+
+def move_name(move: int) -> str:
+    """
+    Get the coordinate notation of a move, e.g. "e2e4" or "e7e8[CA]".
+
+    :param move: an encoded move.
+    :return: the move's name.
+    """
+    name = square_name(move_from(move)) + square_name(move_to(move))
+    promotion = move_promotion(move)
+    if promotion is not None:
+        name += f"[{PIECE_TYPES[promotion].symbol}]"
+    return name
+
+
+#===============================================================================
+# Position
+#===============================================================================
+class Position:
+    """
+    A full game state: piece placement, side to move, castling and
+    en passant rights, and the history needed to unmake moves.
+
+    The mailbox `board` holds 0 for an empty square, or
+    (code << 1 | color) + 1 for a piece.
+
+    `attacks` holds, per square, the bitboard of squares attacked by the
+    piece on it (see attack_map()). It is built on first use and then kept
+    up to date incrementally: make() only records which squares changed,
+    and the next read recomputes just the pieces on those squares and the
+    sliding pieces whose rays reach them, for all moves since the last
+    read at once. unmake() restores the previous attacks without
+    recomputing anything.
+    """
+
+    def __init__(self, armies: tuple[str, str] = ("fide", "fide")) -> None:
+        """
+        Constructor. Creates an empty board; see start() and from_fen().
+
+        :param armies: (optional) army folders of White and Black.
+        """
+        self.armies = tuple(armies)
+        self.bb = [[0] * len(PIECE_TYPES) for _ in range(2)]
+        self.occ = [0, 0]
+        self.board = bytearray(64)
+        self.side = WHITE
+        self.castling = 0
+        self.ep = -1
+        self.halfmove = 0
+        self.fullmove = 1
+        self.hash = 0
+        self.history = []
+        self.attacks: list[int] = None
+        self.attack_ply = 0  # length of history the attacks are up to date for
+        self.attack_changes: list[int] = []  # per ply: squares changed
+        # per update: (ply, (square, previous attacks) pairs, previous ply)
+        self.attack_undo: list[tuple[int, list[tuple[int, int]], int]] = []
+
+        slots = [ARMY_SLOTS[army] for army in self.armies]
+        self.pawn_code = tuple(slot["P"] for slot in slots)
+        self.king_code = tuple(slot["K"] for slot in slots)
+        self.promotions = tuple(dict.fromkeys(
+            slot[file] for slot in slots for file in "QRBN"
+        ))
+        self.codes = tuple(
+            tuple(dict.fromkeys(
+                [slots[color][file] for file in "PKQRBN"]
+                + list(self.promotions)
+            ))
+            for color in (WHITE, BLACK)
+        )
+        # pieces whose attacks depend on other pieces' positions
+        self.rider_codes = tuple(
+            tuple(code for code in self.codes[color]
+                  if PIECE_TYPES[code].tables[color].capture_rides)
+            for color in (WHITE, BLACK)
+        )
+
+    @classmethod
+    def start(cls, white: str = "fide", black: str = "fide") -> "Position":
+        """
+        Create the starting position of a game.
+
+        :param white: (optional) White's army folder.
+        :param black: (optional) Black's army folder.
+        :return: a new Position.
+        """
+        pos = cls((white, black))
+        for color, army in enumerate(pos.armies):
+            back, front = (0, 1) if color == WHITE else (7, 6)
+            for x, file in enumerate(BACK_RANK):
+                pos.put(8 * back + x, color, ARMY_SLOTS[army][file])
+                pos.put(8 * front + x, color, ARMY_SLOTS[army]["P"])
+        pos.castling = 15
+        pos.hash = pos.compute_hash()
+        return pos
+
+    def copy(self) -> "Position":
+        """
+        Copy this position, including its move history.
+
+        :return: an independent Position.
+        """
+        other = copy.copy(self)
+        other.bb = [list(bbs) for bbs in self.bb]
+        other.occ = list(self.occ)
+        other.board = bytearray(self.board)
+        other.history = list(self.history)
+        other.attack_changes = list(self.attack_changes)
+        if self.attacks is not None:
+            other.attacks = list(self.attacks)
+            other.attack_undo = list(self.attack_undo)
+        return other
+
+    #---------------------------------------------------------------------------
+    # Board access
+    #---------------------------------------------------------------------------
+    def put(self, sq: int, color: int, code: int) -> None:
+        """
+        Place a piece on an empty square.
+
+        :param sq: the square.
+        :param color: WHITE or BLACK.
+        :param code: piece code.
+        """
+        bit = 1 << sq
+        self.bb[color][code] |= bit
+        self.occ[color] |= bit
+        self.board[sq] = (code << 1 | color) + 1
+        self.hash ^= PIECE_KEYS[code << 1 | color][sq]
+        self.attacks = None
+
+    def compute_hash(self) -> int:
+        """
+        Compute this position's hash from scratch. Normally the hash is
+        kept up to date incrementally in `hash`.
+
+        :return: the 64-bit Zobrist hash.
+        """
+        key = CASTLING_KEYS[self.castling]
+        for sq, value in enumerate(self.board):
+            if value:
+                key ^= PIECE_KEYS[value - 1][sq]
+        if self.side == BLACK:
+            key ^= SIDE_KEY
+        if self.ep >= 0:
+            key ^= EP_KEYS[self.ep & 7]
+        return key
+
+    def repetitions(self) -> int:
+        """
+        Count earlier occurrences of this position. Only positions since the
+        last capture or pawn move can repeat, so only those are checked.
+
+        :return: the number of times this position occurred before.
+        """
+        count = 0
+        history = self.history
+        oldest = max(len(history) - self.halfmove, 0)
+        for i in range(len(history) - 2, oldest - 1, -2):
+            if history[i][5] == self.hash:
+                count += 1
+        return count
+
+    def piece_at(self, sq: int) -> tuple[int, int] | None:
+        """
+        Get the piece on a square.
+
+        :param sq: the square.
+        :return: a (color, code) pair, or None if the square is empty.
+        """
+        value = self.board[sq]
+        if not value:
+            return None
+        return (value - 1) & 1, (value - 1) >> 1
+
+    def king_square(self, color: int) -> int:
+        return self.bb[color][self.king_code[color]].bit_length() - 1
+
+    def attacked(self, sq: int, by: int) -> bool:
+        """
+        Get whether a square is attacked.
+
+        :param sq: the square.
+        :param by: color of the attacking side.
+        :return: whether any piece of that side attacks the square.
+        """
+        bbs = self.bb[by]
+        occupied = self.occ[0] | self.occ[1]
+        for code in self.codes[by]:
+            bb = bbs[code]
+            if not bb:
+                continue
+            tables = PIECE_TYPES[code].tables[by]
+            if not tables.reach[sq] & bb:
+                continue
+            if tables.reverse_leaps[sq] & bb:
+                return True
+            for ray, full, positive in tables.reverse_rides:
+                if ride(sq, ray, full, positive, occupied) & bb:
+                    return True
+        return False
+
+    def attack_map(self, by: int) -> int:
+        """
+        Get every square a side attacks, e.g. for the threat overlay.
+
+        :param by: color of the attacking side.
+        :return: bitboard of squares attacked by any piece of that side,
+                 including squares of its own pieces (defended).
+        """
+        self.sync_attacks()
+        attacks = self.attacks
+        pieces = self.occ[by]
+        result = 0
+        while pieces:
+            bit = pieces & -pieces
+            pieces ^= bit
+            result |= attacks[bit.bit_length() - 1]
+        return result
+
+    def _attacked_any(self, squares: int, by: int) -> bool:
+        """
+        Get whether any of some squares is attacked, reading the attack
+        maps if they are up to date and testing square by square if not,
+        which is cheaper than updating them for a few squares.
+
+        :param squares: bitboard of squares.
+        :param by: color of the attacking side.
+        :return: whether that side attacks any of the squares.
+        """
+        if self.attacks is not None and self.attack_ply == len(self.history):
+            return bool(self.attack_map(by) & squares)
+        while squares:
+            bit = squares & -squares
+            squares ^= bit
+            if self.attacked(bit.bit_length() - 1, by):
+                return True
+        return False
+
+    def threats(self, color: int) -> int:
+        """
+        Get the pieces of a side that the other side attacks.
+
+        :param color: WHITE or BLACK.
+        :return: bitboard of that side's attacked pieces.
+        """
+        return self.attack_map(color ^ 1) & self.occ[color]
+
+    def sync_attacks(self) -> None:
+        """
+        Bring `attacks` up to date with the moves made since it was last
+        read, or build it if there is none.
+        """
+        ply = len(self.history)
+        if self.attacks is None:
+            self.compute_attacks()
+        elif self.attack_ply < ply:
+            changed = 0
+            for squares in self.attack_changes[self.attack_ply:]:
+                changed |= squares
+            self.attack_undo.append(
+                (ply, self._update_attacks(changed), self.attack_ply))
+            self.attack_ply = ply
+
+    def compute_attacks(self) -> None:
+        """
+        Build `attacks` from scratch. Normally it is kept up to date
+        incrementally.
+        """
+        occupied = self.occ[0] | self.occ[1]
+        self.attacks = [0] * 64
+        for sq, value in enumerate(self.board):
+            if value:
+                self.attacks[sq] = PIECE_TYPES[(value - 1) >> 1] \
+                    .tables[(value - 1) & 1].attacks(sq, occupied)
+        self.attack_ply = len(self.history)
+        self.attack_undo = []
+
+    def _update_attacks(self, changed: int) -> list[tuple[int, int]]:
+        """
+        Recompute the attacks of the pieces that moves affected.
+
+        :param changed: bitboard of squares whose contents changed.
+        :return: the (square, previous attacks) pairs, for unmake().
+        """
+        attacks = self.attacks
+        board = self.board
+        occupied = self.occ[0] | self.occ[1]
+
+        # a slide changes when a square it reaches (up to and including its
+        # blocker) is emptied or filled
+        riders = 0
+        for color in (WHITE, BLACK):
+            bbs = self.bb[color]
+            for code in self.rider_codes[color]:
+                riders |= bbs[code]
+        riders &= ~changed
+        todo = changed
+        while riders:
+            bit = riders & -riders
+            riders ^= bit
+            if attacks[bit.bit_length() - 1] & changed:
+                todo |= bit
+
+        saved = []
+        while todo:
+            bit = todo & -todo
+            todo ^= bit
+            sq = bit.bit_length() - 1
+            saved.append((sq, attacks[sq]))
+            value = board[sq]
+            attacks[sq] = PIECE_TYPES[(value - 1) >> 1] \
+                .tables[(value - 1) & 1].attacks(sq, occupied) \
+                if value else 0
+        return saved
+
+    def in_check(self) -> bool:
+        return self.attacked(self.king_square(self.side), self.side ^ 1)
+
+    #---------------------------------------------------------------------------
+    # Move generation
+    #---------------------------------------------------------------------------
+    def pseudo_legal_moves(self, captures: bool = False) -> list[int]:
+        """
+        Generate every move of the side to move, ignoring King safety
+        (except for castling, which is always fully checked).
+
+        :param captures: (optional) if True, only generate captures and
+                         promotions, e.g. for quiescence search.
+        :return: a list of encoded moves.
+        """
+        us = self.side
+        own = self.occ[us]
+        enemy = self.occ[us ^ 1]
+        bbs = self.bb[us]
+        moves = []
+        append = moves.append
+
+        self._pawn_moves(moves, captures)
+
+        for code in self.codes[us]:
+            bb = bbs[code]
+            if not bb or code == self.pawn_code[us]:
+                continue
+            tables = PIECE_TYPES[code].tables[us]
+            while bb:
+                bit = bb & -bb
+                bb ^= bit
+                fr = bit.bit_length() - 1
+                targets = tables.targets(fr, own, enemy)
+                if captures:
+                    targets &= enemy
+                while targets:
+                    bit = targets & -targets
+                    targets ^= bit
+                    append(fr | (bit.bit_length() - 1) << 6)
+
+        if self.castling and not captures:
+            self._castling_moves(moves)
+        return moves
+
+    def _pawn_moves(self, moves: list[int], captures: bool) -> None:
+        us = self.side
+        code = self.pawn_code[us]
+        pawns = self.bb[us][code]
+        if not pawns:
+            return
+        enemy = self.occ[us ^ 1]
+        empty = ~(self.occ[0] | self.occ[1]) & BB_ALL
+
+        if us == WHITE:
+            single = (pawns << 8) & empty
+            double = ((single & BB_RANK_3) << 8) & empty
+            left = ((pawns & ~BB_FILE_A) << 7) & enemy
+            right = ((pawns & ~BB_FILE_H) << 9) & enemy
+            step, last_rank = 8, BB_RANK_8
+        else:
+            single = (pawns >> 8) & empty
+            double = ((single & BB_RANK_6) >> 8) & empty
+            left = ((pawns & ~BB_FILE_A) >> 9) & enemy
+            right = ((pawns & ~BB_FILE_H) >> 7) & enemy
+            step, last_rank = -8, BB_RANK_1
+        if captures:
+            single &= last_rank
+            double = 0
+
+        for targets, delta in ((single, step), (left, step - 1),
+                               (right, step + 1)):
+            while targets:
+                bit = targets & -targets
+                targets ^= bit
+                to = bit.bit_length() - 1
+                move = (to - delta) | to << 6
+                if bit & last_rank:
+                    for promotion in self.promotions:
+                        moves.append(move | (promotion + 1) << 15)
+                else:
+                    moves.append(move)
+
+        while double:
+            bit = double & -double
+            double ^= bit
+            to = bit.bit_length() - 1
+            moves.append((to - 2 * step) | to << 6 | DOUBLE_PUSH << 12)
+
+        if self.ep >= 0:
+            attackers = PIECE_TYPES[code].tables[us].reverse_leaps[self.ep]
+            attackers &= pawns
+            while attackers:
+                bit = attackers & -attackers
+                attackers ^= bit
+                moves.append((bit.bit_length() - 1) | self.ep << 6
+                             | EN_PASSANT << 12)
+
+    def _castling_moves(self, moves: list[int]) -> None:
+        us = self.side
+        them = us ^ 1
+        home = 0 if us == WHITE else 56
+        king = home + 4
+        if not self.bb[us][self.king_code[us]] >> king & 1:
+            return
+        occupied = self.occ[0] | self.occ[1]
+        rights = self.castling >> (2 * us)
+        if not rights & (CASTLE_WHITE_SHORT | CASTLE_WHITE_LONG) \
+                or self._attacked_any(1 << king, them):
+            return
+
+        if rights & CASTLE_WHITE_SHORT \
+                and self.board[home + 7] \
+                and not occupied & (0b01100000 << home) \
+                and not self._attacked_any(0b01100000 << home, them):
+            moves.append(king | (king + 2) << 6 | CASTLE_SHORT << 12)
+
+        if rights & CASTLE_WHITE_LONG \
+                and self.board[home] \
+                and not occupied & (0b00001110 << home):
+            # colorbound pieces castle with the King on b1 and themselves
+            # on c1, so that they stay on the same square color
+            corner = PIECE_TYPES[(self.board[home] - 1) >> 1]
+            target = home + 1 if corner.colorbound else home + 2
+            if not self._attacked_any((1 << king) - (1 << target), them):
+                moves.append(king | target << 6 | CASTLE_LONG << 12)
+
+    def legal_moves(self) -> list[int]:
+        """
+        Generate every legal move of the side to move.
+
+        :return: a list of encoded moves.
+        """
+        us = self.side
+        them = us ^ 1
+        king = self.king_square(us)
+        danger = self.attack_map(them)  # first, so castling can use it too
+        moves = self.pseudo_legal_moves()
+        # When the King is not in check, only a move of the King itself, or
+        # of a piece standing on an attacked square, can expose it (a
+        # slider's ray reaches up to its first blocker), so every other
+        # move is legal without being played.
+        if king < 0 or danger >> king & 1:
+            danger = BB_ALL
+        legal = []
+        for move in moves:
+            fr = move & 63
+            if not danger >> fr & 1 and fr != king \
+                    and (move >> 12) & 7 != EN_PASSANT:
+                legal.append(move)
+                continue
+            self.make(move)
+            if not self.attacked(self.king_square(us), them):
+                legal.append(move)
+            self.unmake()
+        return legal
+
+    def outcome(self) -> tuple[str, str] | None:
+        """
+        Get the result of the game, if it is over.
+
+        :return: None if the game goes on, else a (result, reason) pair,
+                 where result is "1-0", "0-1" or "1/2-1/2", and reason is
+                 "checkmate", "stalemate", "repetition", "fifty moves" or
+                 "insufficient material".
+        """
+        if not self.legal_moves():
+            if self.in_check():
+                return ("0-1" if self.side == WHITE else "1-0"), "checkmate"
+            return "1/2-1/2", "stalemate"
+        if self.halfmove >= 100:
+            return "1/2-1/2", "fifty moves"
+        if self.repetitions() >= 2:
+            return "1/2-1/2", "repetition"
+        if self.occ[WHITE] | self.occ[BLACK] == \
+                self.bb[WHITE][self.king_code[WHITE]] \
+                | self.bb[BLACK][self.king_code[BLACK]]:
+            return "1/2-1/2", "insufficient material"
+        return None
+
+    #---------------------------------------------------------------------------
+    # Make and unmake
+    #---------------------------------------------------------------------------
+    def make(self, move: int) -> None:
+        """
+        Play a move. The move must be pseudo-legal in this position.
+
+        :param move: an encoded move.
+        """
+        fr = move & 63
+        to = (move >> 6) & 63
+        flag = (move >> 12) & 7
+        us = self.side
+        them = us ^ 1
+        board = self.board
+        bbs = self.bb[us]
+
+        cap_sq = to
+        if flag == EN_PASSANT:
+            cap_sq = to - 8 if us == WHITE else to + 8
+        captured = board[cap_sq]
+        self.history.append((move, captured, self.castling, self.ep,
+                             self.halfmove, self.hash))
+        key = self.hash ^ SIDE_KEY ^ CASTLING_KEYS[self.castling]
+        if self.ep >= 0:
+            key ^= EP_KEYS[self.ep & 7]
+
+        if captured:
+            bit = 1 << cap_sq
+            self.bb[them][(captured - 1) >> 1] ^= bit
+            self.occ[them] ^= bit
+            board[cap_sq] = 0
+            key ^= PIECE_KEYS[captured - 1][cap_sq]
+
+        value = board[fr]
+        code = (value - 1) >> 1
+        bits = changed = 1 << fr | 1 << to
+        if captured:
+            changed |= 1 << cap_sq
+        if move >> 15:
+            promotion = (move >> 15) - 1
+            bbs[code] ^= 1 << fr
+            bbs[promotion] ^= 1 << to
+            board[to] = (promotion << 1 | us) + 1
+        else:
+            bbs[code] ^= bits
+            board[to] = value
+        board[fr] = 0
+        self.occ[us] ^= bits
+        key ^= PIECE_KEYS[value - 1][fr] ^ PIECE_KEYS[board[to] - 1][to]
+
+        if flag >= CASTLE_SHORT:
+            corner, dest = self._castle_corner(to, flag)
+            self._shift(corner, dest, us)
+            keys = PIECE_KEYS[board[dest] - 1]
+            key ^= keys[corner] ^ keys[dest]
+            changed |= 1 << corner | 1 << dest
+
+        self.castling &= _CASTLE_MASK[fr] & _CASTLE_MASK[to]
+        key ^= CASTLING_KEYS[self.castling]
+        self.ep = -1
+        if flag == DOUBLE_PUSH:
+            ep = (fr + to) >> 1
+            pawn = self.pawn_code[them]
+            if PIECE_TYPES[pawn].tables[them].reverse_leaps[ep] \
+                    & self.bb[them][pawn]:
+                self.ep = ep
+                key ^= EP_KEYS[ep & 7]
+        self.hash = key
+
+        if captured or code == self.pawn_code[us]:
+            self.halfmove = 0
+        else:
+            self.halfmove += 1
+        if us == BLACK:
+            self.fullmove += 1
+        self.side = them
+        self.attack_changes.append(changed)
+
+    def unmake(self) -> None:
+        """
+        Take back the last move played with make().
+        """
+        move, captured, self.castling, self.ep, self.halfmove, self.hash = \
+            self.history.pop()
+        fr = move & 63
+        to = (move >> 6) & 63
+        flag = (move >> 12) & 7
+        self.side = us = self.side ^ 1
+        them = us ^ 1
+        if us == BLACK:
+            self.fullmove -= 1
+        board = self.board
+        bbs = self.bb[us]
+
+        if flag >= CASTLE_SHORT:
+            corner, dest = self._castle_corner(to, flag)
+            self._shift(dest, corner, us)
+
+        value = board[to]
+        bits = 1 << fr | 1 << to
+        if move >> 15:
+            pawn = self.pawn_code[us]
+            bbs[(value - 1) >> 1] ^= 1 << to
+            bbs[pawn] ^= 1 << fr
+            board[fr] = (pawn << 1 | us) + 1
+        else:
+            bbs[(value - 1) >> 1] ^= bits
+            board[fr] = value
+        board[to] = 0
+        self.occ[us] ^= bits
+
+        if captured:
+            cap_sq = to
+            if flag == EN_PASSANT:
+                cap_sq = to - 8 if us == WHITE else to + 8
+            bit = 1 << cap_sq
+            self.bb[them][(captured - 1) >> 1] ^= bit
+            self.occ[them] ^= bit
+            board[cap_sq] = captured
+
+        self.attack_changes.pop()
+        if self.attack_ply > len(self.history) and self.attacks is not None:
+            undo = self.attack_undo
+            if undo and undo[-1][0] > len(self.history):
+                _, saved, self.attack_ply = undo.pop()
+                attacks = self.attacks
+                for sq, previous in saved:
+                    attacks[sq] = previous
+            if self.attack_ply > len(self.history):
+                self.attacks = None  # built after this move; rebuild
+
+    @staticmethod
+    def _castle_corner(king_to: int, flag: int) -> tuple[int, int]:
+        """
+        Get the squares the castling partner moves between.
+
+        :param king_to: the King's destination.
+        :param flag: CASTLE_SHORT or CASTLE_LONG.
+        :return: the partner's (origin, destination) squares.
+        """
+        home = king_to & 56
+        if flag == CASTLE_SHORT:
+            return home + 7, home + 5
+        return home, king_to + 1
+
+    def _shift(self, fr: int, to: int, color: int) -> None:
+        value = self.board[fr]
+        bits = 1 << fr | 1 << to
+        self.bb[color][(value - 1) >> 1] ^= bits
+        self.occ[color] ^= bits
+        self.board[to] = value
+        self.board[fr] = 0
+
+    #---------------------------------------------------------------------------
+    # Board states
+    #---------------------------------------------------------------------------
+    def state(self) -> BoardState:
+        """
+        Get a lightweight snapshot of this position, without its history.
+
+        :return: a new BoardState.
+        """
+        ep = self.ep if self.ep >= 0 else NO_EP
+        return BoardState(self.board + bytes((self.side, self.castling, ep)))
+
+    @classmethod
+    def from_state(cls, state: BoardState,
+                   armies: tuple[str, str] = ("fide", "fide"),
+                   halfmove: int = 0, fullmove: int = 1) -> "Position":
+        """
+        Create a position from a board state.
+
+        :param state: the board state.
+        :param armies: (optional) army folders of White and Black.
+        :param halfmove: (optional) plies since the last capture or pawn move.
+        :param fullmove: (optional) move number.
+        :return: a new Position.
+        """
+        pos = cls(armies)
+        for sq in range(64):
+            piece = state.piece_at(sq)
+            if piece is not None:
+                pos.put(sq, *piece)
+        pos.side = state.side
+        pos.castling = state.castling
+        pos.ep = state.ep
+        pos.halfmove = halfmove
+        pos.fullmove = fullmove
+        pos.hash = pos.compute_hash()
+        return pos
+
+    def delta(self, move: int) -> Delta:
+        """
+        Describe what a move changes, without playing it.
+
+        :param move: a pseudo-legal move in this position.
+        :return: the delta from this position's state to the next one.
+        """
+        fr = move & 63
+        to = (move >> 6) & 63
+        flag = (move >> 12) & 7
+        board = self.board
+        moved = [(fr, to, board[fr])]
+        removed = ()
+        added = ()
+
+        if flag == EN_PASSANT:
+            cap_sq = to - 8 if self.side == WHITE else to + 8
+            removed = ((cap_sq, board[cap_sq]),)
+        elif board[to]:
+            removed = ((to, board[to]),)
+        if flag >= CASTLE_SHORT:
+            corner, dest = self._castle_corner(to, flag)
+            moved.append((corner, dest, board[corner]))
+        if move >> 15:
+            added = ((to, ((move >> 15) - 1 << 1 | self.side) + 1),)
+
+        before = self.castling, self.ep if self.ep >= 0 else NO_EP
+        self.make(move)
+        after = self.castling, self.ep if self.ep >= 0 else NO_EP
+        self.unmake()
+        return Delta(tuple(moved), removed, added, (before[0], after[0]),
+                     (before[1], after[1]))
+
+    #---------------------------------------------------------------------------
+    # FEN
+    #---------------------------------------------------------------------------
+    def lookup_symbol(self, symbol: str, color: int) -> int:
+        """
+        Find the piece code a color uses for a symbol. The color's own army
+        is searched first, then the opponent's (for promoted pieces).
+
+        :param symbol: uppercase piece symbol; "P" for pawns.
+        :param color: WHITE or BLACK.
+        :return: the piece code.
+        """
+        for army in (self.armies[color], self.armies[color ^ 1]):
+            for piece in PIECE_TYPES:
+                if piece.army == army and (piece.symbol or "P") == symbol:
+                    return piece.code
+        raise ValueError(f"unknown piece symbol {symbol!r}")
+
+    @classmethod
+    def from_fen(cls, fen: str,
+                 armies: tuple[str, str] = ("fide", "fide")) -> "Position":
+        """
+        Create a position from Forsyth-Edwards Notation. Multi-letter
+        symbols are written in brackets, e.g. "[BD]" or "[fa]".
+
+        :param fen: the FEN string; the last four fields are optional.
+        :param armies: (optional) army folders of White and Black.
+        :return: a new Position.
+        """
+        pos = cls(armies)
+        fields = fen.split()
+        rank, x = 7, 0
+        i = 0
+        placement = fields[0]
+        while i < len(placement):
+            char = placement[i]
+            if char == "/":
+                rank, x = rank - 1, 0
+            elif char.isdigit():
+                x += int(char)
+            else:
+                if char == "[":
+                    end = placement.index("]", i)
+                    symbol = placement[i + 1:end]
+                    i = end
+                else:
+                    symbol = char
+                color = WHITE if symbol.isupper() else BLACK
+                pos.put(8 * rank + x, color,
+                        pos.lookup_symbol(symbol.upper(), color))
+                x += 1
+            i += 1
+
+        fields += ["w", "-", "-", "0", "1"][len(fields) - 1:]
+        pos.side = WHITE if fields[1] == "w" else BLACK
+        for char, right in zip("KQkq", (1, 2, 4, 8)):
+            if char in fields[2]:
+                pos.castling |= right
+        if fields[3] != "-":
+            pos.ep = parse_square(fields[3])
+        pos.halfmove = int(fields[4])
+        pos.fullmove = int(fields[5])
+        pos.hash = pos.compute_hash()
+        return pos
+
+    def fen(self) -> str:
+        """
+        Get the Forsyth-Edwards Notation of this position.
+
+        :return: the FEN string.
+        """
+        ranks = []
+        for rank in range(7, -1, -1):
+            text, empty = "", 0
+            for x in range(8):
+                piece = self.piece_at(8 * rank + x)
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    text, empty = text + str(empty), 0
+                symbol = PIECE_TYPES[piece[1]].symbol or "P"
+                if piece[0] == BLACK:
+                    symbol = symbol.lower()
+                text += symbol if len(symbol) == 1 else f"[{symbol}]"
+            if empty:
+                text += str(empty)
+            ranks.append(text)
+
+        castling = "".join(char for char, right in zip("KQkq", (1, 2, 4, 8))
+                           if self.castling & right) or "-"
+        ep = square_name(self.ep) if self.ep >= 0 else "-"
+        return (f"{'/'.join(ranks)} {'wb'[self.side]} {castling} {ep} "
+                f"{self.halfmove} {self.fullmove}")
@@ -0,0 +1,97 @@
+"""
+Adaptive frame pacing.
+
+While something is animating, the main loop runs at the full frame rate.
+Otherwise it sleeps in pygame.event.wait() until an event arrives or until
+the next time something is due to change on its own (a caret blink, an
+engine poll), so an idle screen uses next to no CPU.
+"""
+
+import time
+
+import pygame
+import pygame.display
+import pygame.event
+from pygame.event import Event
+from pygame.locals import NOEVENT
+
+from settings import *
+
+
+def display_refresh_rate() -> int | None:
+    """
+    Get the refresh rate of the display the window is on.
+
+    :return: the rate in Hz, or None if pygame or the platform can't tell.
+    """
+    get_rate = getattr(pygame.display, "get_current_refresh_rate", None)
+    if get_rate is None:  # pygame older than 2.2
+        return None
+    try:
+        rate = get_rate()
+    except pygame.error:
+        return None
+    return rate or None
+
+
+class Pacer:
+    """
+    Decides how long the main loop sleeps before each frame.
+    """
+
+    def __init__(self, frame_rate: int = FRAME_RATE,
+                 follow_display: bool = False) -> None:
+        """
+        Constructor. Create it after the display is set up.
+
+        :param frame_rate: (optional) full frame rate, while animating.
+        :param follow_display: (optional) use the display's refresh rate as
+                               the full frame rate instead, if known.
+        """
+        if follow_display:
+            frame_rate = display_refresh_rate() or frame_rate
+        self.frame_rate = frame_rate
+        self.clock = pygame.time.Clock()
+        self.animate_until = 0.0
+
+    def animate(self, seconds: float = 0.0) -> None:
+        """
+        Run at the full frame rate for a while, e.g. for the length of a
+        screen wipe.
+
+        :param seconds: (optional) how long; 0 for just the next frame.
+        """
+        self.animate_until = max(self.animate_until,
+                                 time.perf_counter() + seconds)
+
+    def is_animating(self, wake_at: float | None = None) -> bool:
+        """
+        :param wake_at: (optional) time.perf_counter() time at which the
+                        next frame is needed anyway.
+        :return: whether the next frame runs at the full frame rate.
+        """
+        now = time.perf_counter()
+        return self.animate_until >= now or (
+            wake_at is not None and wake_at - now < 1 / self.frame_rate)
+
+    def wait(self, wake_at: float | None = None) -> list[Event]:
+        """
+        Wait until the next frame is due, and collect its events.
+
+        :param wake_at: (optional) time.perf_counter() time at which the
+                        next frame is needed even without input, e.g. the
+                        earliest Drawable.next_update().
+        :return: the events that arrived, in order.
+        """
+        events = []
+        if not self.is_animating(wake_at):
+            timeout = IDLE_TIMEOUT if wake_at is None \
+                else min(IDLE_TIMEOUT, wake_at - time.perf_counter())
+            event = pygame.event.wait(max(1, int(1000 * timeout)))
+            if event.type != NOEVENT:
+                events.append(event)
+
+        # never faster than the full frame rate, e.g. during a burst of
+        # mouse motion
+        self.clock.tick(self.frame_rate)
+        return events + pygame.event.get()
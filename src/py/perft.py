@@ -0,0 +1,145 @@
+"""
+Move generation benchmark and correctness check.
+
+Counts the leaf nodes of the legal move tree to a fixed depth and reports
+nodes per second. Usage, from this directory:
+
+$ python3 perft.py --armies fide clob --depth 4
+$ python3 perft.py --fen "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -" --divide 2
+$ python3 perft.py --check
+"""
+
+import argparse
+import sys
+import time
+
+from movegen import *
+
+#===============================================================================
+# Reference node counts
+#===============================================================================
+# (white army, black army, FEN or None for the starting position, counts by
+# depth starting at depth 1). The FIDE counts are the published values; the
+# fairy counts were cross-checked against a naive square-by-square generator.
+REFERENCE = [
+    ("fide", "fide", None, [20, 400, 8902, 197281]),
+    ("fide", "fide",
+     "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -",
+     [48, 2039, 97862]),
+    ("fide", "fide", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -",
+     [14, 191, 2812, 43238]),
+    ("fide", "fide",
+     "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467]),
+    ("clob", "clob",
+     "[bd]3k2[bd]/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/[BD]3K2[BD] w KQkq - 0 1",
+     [23, 528, 12207, 280957]),
+    ("fide", "clob", None, [20, 560, 12458]),
+    ("fide", "nutty", None, [20, 520, 11572]),
+    ("fide", "rookie", None, [20, 480, 10682]),
+    ("clob", "fide", None, [28, 560, 17170]),
+    ("clob", "clob", None, [28, 784, 24035]),
+    ("clob", "nutty", None, [28, 728, 22318]),
+    ("clob", "rookie", None, [28, 672, 20596]),
+    ("nutty", "fide", None, [26, 520, 14659]),
+    ("nutty", "clob", None, [26, 728, 20516]),
+    ("nutty", "nutty", None, [26, 676, 19054]),
+    ("nutty", "rookie", None, [26, 624, 17587]),
+    ("rookie", "fide", None, [24, 480, 13059]),
+    ("rookie", "clob", None, [24, 672, 18276]),
+    ("rookie", "nutty", None, [24, 624, 16974]),
+    ("rookie", "rookie", None, [24, 576, 15667]),
+]
+
+
+def perft(pos: Position, depth: int) -> int:
+    """
+    Count the leaf nodes of the legal move tree.
+
+    :param pos: the position to search from; restored before returning.
+    :param depth: number of plies to search.
+    :return: the number of leaf nodes.
+    """
+    if depth == 0:
+        return 1
+    moves = pos.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        pos.make(move)
+        nodes += perft(pos, depth - 1)
+        pos.unmake()
+    return nodes
+
+
+def divide(pos: Position, depth: int) -> dict[str, int]:
+    """
+    Count leaf nodes separately below each legal move, for debugging.
+
+    :param pos: the position to search from.
+    :param depth: number of plies to search, at least 1.
+    :return: a map from move name to leaf node count.
+    """
+    counts = {}
+    for move in pos.legal_moves():
+        pos.make(move)
+        counts[move_name(move)] = perft(pos, depth - 1)
+        pos.unmake()
+    return counts
+
+
+def check(max_depth: int) -> bool:
+    """
+    Compare perft against every reference count up to a depth.
+
+    :param max_depth: deepest depth to check.
+    :return: whether every count matched.
+    """
+    ok = True
+    for white, black, fen, counts in REFERENCE:
+        for depth, expected in enumerate(counts[:max_depth], start=1):
+            pos = Position.start(white, black) if fen is None \
+                else Position.from_fen(fen, (white, black))
+            nodes = perft(pos, depth)
+            status = "ok" if nodes == expected else f"FAIL (got {nodes})"
+            ok = ok and nodes == expected
+            print(f"{white} vs {black} {fen or 'start'} "
+                  f"depth {depth}: {expected} {status}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--armies", nargs=2, default=["fide", "fide"],
+                        choices=ARMIES, metavar=("WHITE", "BLACK"))
+    parser.add_argument("--fen", default=None)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--divide", type=int, default=None, metavar="DEPTH")
+    parser.add_argument("--check", action="store_true",
+                        help="compare against the reference counts")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check(args.depth) else 1)
+
+    pos = Position.start(*args.armies) if args.fen is None \
+        else Position.from_fen(args.fen, tuple(args.armies))
+
+    if args.divide is not None:
+        counts = divide(pos, args.divide)
+        for name, nodes in sorted(counts.items()):
+            print(f"{name}: {nodes}")
+        print(f"total: {sum(counts.values())}")
+        return
+
+    for depth in range(1, args.depth + 1):
+        start = time.perf_counter()
+        nodes = perft(pos, depth)
+        elapsed = time.perf_counter() - start
+        print(f"depth {depth}: {nodes} nodes in {elapsed:.3f} s "
+              f"({nodes / max(elapsed, 1e-9):,.0f} nodes/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+On-disk position index, for searching game archives.
+
+Answers "how often has this position arisen, and how did each move from it
+score?" for archives far too big to load. Positions are keyed by
+Position.hash, which already tells army pairings apart (every army has its
+own King and Pawn codes), so one index holds every pairing.
+
+An index is a directory of segments. A segment is a file of fixed-size
+records sorted by (hash, next move): the hash (8 bytes), the next move (2,
+as record.move_word(); 0 if the game ended there), then the number of
+games, White wins, draws and Black wins (4 each). Segments are
+memory-mapped and binary searched, so a lookup reads a few pages of each
+segment, not the whole file.
+
+Adding games collects their records in memory, up to BATCH_RECORDS at a
+time, and writes them out sorted as a new segment. The newest segments are
+then merged while the newest is at least half the size of the one before
+it, so an index of n records has about log2(n) segments; merging streams
+records, in constant memory. Segments are written to a temporary file and
+renamed, so an interrupted write never leaves a broken segment, and are
+named after the batches they hold (e.g. 00000003-00000006.seg), so if a
+merge is interrupted after writing its output, opening the index drops the
+segments it replaced. One writer at a time. Does not import pygame. Usage,
+from this directory:
+
+$ python3 posdb.py add games.posdb tournament.gtb more.gtn
+$ python3 posdb.py query games.posdb --armies fide clob --moves e2-e4 e7-e5
+"""
+
+import argparse
+import bisect
+import heapq
+import itertools
+import mmap
+import os
+import struct
+import time
+from typing import Iterable, Iterator
+
+from movegen import *
+from record import GameRecord, RecordError, read_file, parse_move, \
+    move_text, move_word, word_move
+
+MAGIC = b"GTPI"
+VERSION = 1
+BATCH_RECORDS = 1 << 19  # records collected in memory before a segment is
+                         # written; roughly 100 MB
+
+_HEADER = struct.Struct(">4sHQ")  # magic, version, number of records
+_RECORD = struct.Struct(">QHIIII")  # hash, next move, games, White wins,
+                                    # draws, Black wins
+_KEY = struct.Struct(">Q")
+
+# result -> index of the counter it adds to, after games
+_RESULT_COUNTERS = {"1-0": 0, "1/2-1/2": 1, "0-1": 2}
+
+
+#===============================================================================
+# Segments
+#===============================================================================
+class Segment:
+    """
+    One sorted, memory-mapped segment file.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Constructor. Opens and maps the file.
+
+        :param path: the segment's path.
+        """
+        self.path = path
+        self.first, self.last = _batches(path)
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = _HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or len(self.map) != \
+                _HEADER.size + self.count * _RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} segment")
+
+    def key(self, i: int) -> int:
+        """
+        :param i: a record index.
+        :return: the hash of that record.
+        """
+        return _KEY.unpack_from(self.map, _HEADER.size + i * _RECORD.size)[0]
+
+    def find(self, key: int) -> Iterator[tuple]:
+        """
+        :param key: a position hash.
+        :return: the position's records, one per next move.
+        """
+        i = bisect.bisect_left(range(self.count), key, key=self.key)
+        offset = _HEADER.size + i * _RECORD.size
+        while i < self.count:
+            record = _RECORD.unpack_from(self.map, offset)
+            if record[0] != key:
+                return
+            yield record
+            i += 1
+            offset += _RECORD.size
+
+    def records(self) -> Iterator[tuple]:
+        """
+        :return: every record, in order.
+        """
+        return _RECORD.iter_unpack(memoryview(self.map)[_HEADER.size:])
+
+    def close(self) -> None:
+        self.map.close()
+        self.file.close()
+
+
+def _batches(path: str) -> tuple[int, int]:
+    """
+    :param path: a segment's path.
+    :return: the first and last batch numbers in its name.
+    """
+    first, last = os.path.basename(path)[:-len(".seg")].split("-")
+    return int(first), int(last)
+
+
+def _combine(records: Iterable[tuple]) -> Iterator[tuple]:
+    """
+    Sum the counters of consecutive records for the same hash and move.
+    """
+    for (key, word), group in itertools.groupby(records,
+                                                lambda record: record[:2]):
+        first = next(group)
+        counters = list(first[2:])
+        for record in group:
+            for i, count in enumerate(record[2:]):
+                counters[i] += count
+        yield key, word, *counters
+
+
+def _write_segment(path: str, records: Iterable[tuple]) -> None:
+    """
+    Write sorted records as a segment, atomically.
+
+    :param path: the segment's path.
+    :param records: (hash, move, games, White wins, draws, Black wins)
+                    tuples, sorted by hash and move.
+    """
+    temporary = path + ".tmp"
+    count = 0
+    with open(temporary, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, 0))
+        pack = _RECORD.pack
+        for record in records:
+            file.write(pack(*record))
+            count += 1
+        file.seek(0)
+        file.write(_HEADER.pack(MAGIC, VERSION, count))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+#===============================================================================
+# Index
+#===============================================================================
+class PositionIndex:
+    """
+    A directory of segments, searched as one index.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Constructor. Opens an index, creating its directory if needed.
+
+        :param path: the index directory.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.segments: list[Segment] = []  # oldest first
+        last = 0
+        names = [name for name in os.listdir(path) if name.endswith(".seg")]
+        names.sort(key=lambda name: (_batches(name)[0], -_batches(name)[1]))
+        for name in names:
+            if _batches(name)[1] <= last:
+                # merged into the segment before by an interrupted merge
+                os.remove(os.path.join(path, name))
+            else:
+                self.segments.append(Segment(os.path.join(path, name)))
+                last = self.segments[-1].last
+        for name in os.listdir(path):
+            if name.endswith(".tmp"):  # left by an interrupted write
+                os.remove(os.path.join(path, name))
+        self.next_batch = last + 1
+
+    def __enter__(self) -> "PositionIndex":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    def __len__(self) -> int:
+        """
+        :return: the number of records, counting a (position, move) once per
+                 segment it is in.
+        """
+        return sum(segment.count for segment in self.segments)
+
+    #---------------------------------------------------------------------------
+    # Lookups
+    #---------------------------------------------------------------------------
+    def lookup(self, key: int) -> dict[int, list[int]]:
+        """
+        Get what happened after a position, in every game indexed.
+
+        :param key: the position's hash.
+        :return: next move (as record.move_word(); 0 for games that ended
+                 there) -> [games, White wins, draws, Black wins].
+        """
+        moves: dict[int, list[int]] = {}
+        for segment in self.segments:
+            for _, word, *counters in segment.find(key):
+                total = moves.get(word)
+                if total is None:
+                    moves[word] = counters
+                else:
+                    for i, count in enumerate(counters):
+                        total[i] += count
+        return moves
+
+    def explore(self, pos: Position) -> list[tuple[int | None, int, float]]:
+        """
+        Get how each move from a position scored.
+
+        :param pos: the position.
+        :return: (move, games, score) per move, most played first, where
+                 move is None for games that ended in the position and
+                 score is the side to move's (wins + draws / 2) / games
+                 among games with a result.
+        """
+        stats = []
+        for word, (games, white, draws, black) in self.lookup(
+                pos.hash).items():
+            move = word_move(pos, word) if word else None
+            wins = white if pos.side == WHITE else black
+            decided = white + draws + black
+            score = (wins + draws / 2) / decided if decided else 0.5
+            stats.append((move, games, score))
+        stats.sort(key=lambda stat: -stat[1])
+        return stats
+
+    #---------------------------------------------------------------------------
+    # Building
+    #---------------------------------------------------------------------------
+    def add(self, games: Iterable[GameRecord],
+            batch: int = BATCH_RECORDS) -> int:
+        """
+        Index games, e.g. from a record.py reader.
+
+        :param games: the games; any iterable.
+        :param batch: (optional) records collected before writing a segment.
+        :return: the number of games added.
+        """
+        pending: dict[int, list[int]] = {}  # hash << 16 | move -> counters
+        count = 0
+        for game in games:
+            counter = _RESULT_COUNTERS.get(game.result)
+            pos = game.start()
+            for move in itertools.chain(game.moves, (None,)):
+                if move is None:
+                    key = pos.hash << 16
+                else:
+                    key = pos.hash << 16 | move_word(pos, move)
+                counters = pending.get(key)
+                if counters is None:
+                    counters = pending[key] = [0, 0, 0, 0]
+                counters[0] += 1
+                if counter is not None:
+                    counters[1 + counter] += 1
+                if move is not None:
+                    pos.make(move)
+            count += 1
+            if len(pending) >= batch:
+                self._flush(pending)
+        self._flush(pending)
+        return count
+
+    def compact(self) -> None:
+        """
+        Merge every segment into one, for the fastest lookups.
+        """
+        if len(self.segments) > 1:
+            self._merge(len(self.segments))
+
+    def _flush(self, pending: dict[int, list[int]]) -> None:
+        """
+        Write pending records as a new segment and clear them, then merge
+        segments of similar size.
+        """
+        if not pending:
+            return
+        records = ((key >> 16, key & 0xFFFF, *counters)
+                   for key, counters in sorted(pending.items()))
+        self.segments.append(self._write(records, self.next_batch,
+                                         self.next_batch))
+        self.next_batch += 1
+        pending.clear()
+        while len(self.segments) > 1 and \
+                2 * self.segments[-1].count >= self.segments[-2].count:
+            self._merge(2)
+
+    def _merge(self, n: int) -> None:
+        """
+        Replace the n newest segments with one.
+        """
+        old = self.segments[-n:]
+        merged = self._write(_combine(heapq.merge(
+            *(segment.records() for segment in old))), old[0].first,
+            old[-1].last)
+        self.segments[-n:] = [merged]
+        for segment in old:
+            segment.close()
+            os.remove(segment.path)
+
+    def _write(self, records: Iterable[tuple], first: int,
+               last: int) -> Segment:
+        path = os.path.join(self.path, f"{first:08d}-{last:08d}.seg")
+        _write_segment(path, records)
+        return Segment(path)
+
+
+#===============================================================================
+# Command line
+#===============================================================================
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=("add", "compact", "query"))
+    parser.add_argument("index", help="index directory")
+    parser.add_argument("files", nargs="*",
+                        help="add: game records, as for record.py")
+    parser.add_argument("--armies", nargs=2, default=("fide", "fide"),
+                        choices=ARMIES, metavar=("WHITE", "BLACK"))
+    parser.add_argument("--fen", help="query: the starting position")
+    parser.add_argument("--moves", nargs="*", default=[],
+                        help="query: moves from there, e.g. e2-e4 e7-e5")
+    args = parser.parse_args()
+
+    with PositionIndex(args.index) as index:
+        if args.command == "add":
+            for path in args.files:
+                start = time.perf_counter()
+                games = index.add(read_file(path))
+                print(f"{path}: {games} games in "
+                      f"{time.perf_counter() - start:.2f} s")
+            print(f"{len(index)} records in {len(index.segments)} segments")
+        elif args.command == "compact":
+            index.compact()
+            print(f"{len(index)} records in {len(index.segments)} segments")
+        else:
+            pos = GameRecord(args.armies, tags={"FEN": args.fen} if args.fen
+                             else None).start()
+            for text in args.moves:
+                try:
+                    pos.make(parse_move(pos, text, strict=True))
+                except RecordError as error:
+                    parser.error(str(error))
+            start = time.perf_counter()
+            stats = index.explore(pos)
+            seconds = time.perf_counter() - start
+            print(f"{pos.fen()}: {sum(stat[1] for stat in stats)} times "
+                  f"({1000 * seconds:.2f} ms)")
+            for move, games, score in stats:
+                name = "(end)" if move is None else move_text(pos, move)
+                print(f"  {name:12} {games:8} games  {100 * score:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Lightweight profiling hooks.
+
+Code opts in with the section() context manager or the timed() decorator:
+
+    with profiler.section("events"):
+        handle_events()
+
+    @profiler.timed("engine.search")
+    def search(...): ...
+
+While profiling is disabled (the default), a section is a shared no-op
+context and a timed function costs one flag check, so hooks can stay in hot
+paths. While enabled, every section is recorded as a trace event, and the
+sections inside begin_frame()/end_frame() add up to a per-frame phase
+split. dump_trace() writes the events in the Chrome trace format, which
+chrome://tracing, Perfetto and speedscope show as a flame graph.
+
+Does not import pygame, so the engine can use it too.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+FRAME_HISTORY = 300  # frames kept for FPS and percentiles
+TRACE_LIMIT = 200_000  # trace events kept; older ones are dropped
+
+enabled = False
+
+_NULL = contextlib.nullcontext()
+_events: deque = deque(maxlen=TRACE_LIMIT)  # (name, start, duration, thread)
+_frames: deque = deque(maxlen=FRAME_HISTORY)  # (start, duration, phases)
+_phases: dict[str, float] = {}
+_frame_start: float = None
+_origin = time.perf_counter()
+
+
+def enable(value: bool = True) -> None:
+    """
+    Turn recording on or off. Turning it off keeps what was recorded.
+
+    :param value: (optional) whether to record.
+    """
+    global enabled, _frame_start
+    enabled = value
+    _frame_start = None
+
+
+def clear() -> None:
+    """
+    Forget all recorded events and frames.
+    """
+    _events.clear()
+    _frames.clear()
+    _phases.clear()
+
+
+class _Section:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        duration = time.perf_counter() - self.start
+        _events.append((self.name, self.start, duration,
+                        threading.get_ident()))
+        if _frame_start is not None:
+            _phases[self.name] = _phases.get(self.name, 0.0) + duration
+
+
+def section(name: str):
+    """
+    Time a block of code, if profiling is enabled.
+
+    :param name: name of the block, e.g. "display".
+    :return: a context manager.
+    """
+    return _Section(name) if enabled else _NULL
+
+
+def timed(name: str = None):
+    """
+    Decorator: time every call of a function, if profiling is enabled.
+
+    :param name: (optional) section name; defaults to the function's
+                 qualified name.
+    :return: the decorator.
+    """
+    def decorator(function):
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _Section(label):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+#===============================================================================
+# Frames
+#===============================================================================
+def begin_frame() -> None:
+    """
+    Mark the start of a frame's work.
+    """
+    global _frame_start
+    if enabled:
+        _phases.clear()
+        _frame_start = time.perf_counter()
+
+
+def end_frame() -> None:
+    """
+    Mark the end of a frame's work.
+    """
+    global _frame_start
+    if enabled and _frame_start is not None:
+        duration = time.perf_counter() - _frame_start
+        _frames.append((_frame_start, duration, dict(_phases)))
+        _events.append(("frame", _frame_start, duration,
+                        threading.get_ident()))
+        _frame_start = None
+
+
+def frame_stats() -> dict:
+    """
+    Summarize the recent frames.
+
+    :return: fps (from frame start to frame start), frame-time p50, p95, p99
+             and max in ms (work only, not waiting for the next frame), and
+             the mean ms of each phase; empty if fewer than two frames were
+             recorded.
+    """
+    if len(_frames) < 2:
+        return {}
+    starts = [frame[0] for frame in _frames]
+    durations = sorted(1000 * frame[1] for frame in _frames)
+
+    def percentile(p: float) -> float:
+        return durations[min(len(durations) - 1, int(p * len(durations)))]
+
+    phases: dict[str, float] = {}
+    for _, _, split in _frames:
+        for name, seconds in split.items():
+            phases[name] = phases.get(name, 0.0) + 1000 * seconds
+    return dict(
+        fps=(len(starts) - 1) / (starts[-1] - starts[0])
+        if starts[-1] > starts[0] else 0.0,
+        p50=percentile(0.5),
+        p95=percentile(0.95),
+        p99=percentile(0.99),
+        max=durations[-1],
+        phases={name: total / len(_frames) for name, total in phases.items()},
+    )
+
+
+def dump_trace(path: str = None) -> str:
+    """
+    Write the recorded events as a Chrome trace (JSON), for flame graphs.
+
+    :param path: (optional) output file; defaults to trace-<time>.json in
+                 the working directory.
+    :return: the path written.
+    """
+    if path is None:
+        path = time.strftime("trace-%Y%m%d-%H%M%S.json")
+    pid = os.getpid()
+    with open(path, "w") as file:
+        json.dump(dict(traceEvents=[
+            dict(name=name, ph="X", pid=pid, tid=thread,
+                 ts=round(1e6 * (start - _origin), 3),
+                 dur=round(1e6 * duration, 3))
+            for name, start, duration, thread in list(_events)
+        ], displayTimeUnit="ms"), file)
+    return path
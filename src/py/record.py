@@ -0,0 +1,524 @@
+"""
+Game records for every army, as text and as compact binary.
+
+PGN cannot name the armies or write multi-letter symbols like BD or CA, so
+the text format is PGN-like but its own: tag pairs, then the moves in long
+algebraic notation with the Symbol column of pieces.csv, then the result.
+
+[White "fide"]
+[Black "clob"]
+[Result "1-0"]
+[Reason "checkmate"]
+
+1. e2-e4 e7-e5 2. Ng1-f3 FAb8-c6 3. Bf1-c4 CAd8-h4 4. O-O CAh4xf2 ...
+11. d7-d8=CA 1-0
+
+White and Black are army folders; a FEN tag gives a starting position
+other than the usual one. Pawn moves have no symbol, captures are written
+with "x" and promotions with "=" and the new piece's symbol. There are no
+check marks, so writing a game needs no move generation (they are
+accepted, and ignored, when reading).
+
+The binary format is a stream of self-contained games, so files can be
+appended to and concatenated: a 9-byte header (marker, armies, result,
+plies, tag length), the other tags as UTF-8, then 2 bytes per move
+(from | to << 6 | promotion << 12, where promotion is 1 + its index in
+Position.promotions, or 0).
+
+Readers and writers are generators over one game at a time, so archives of
+any size are converted in constant memory. Reading replays each game on a
+Position, which checks that every move is made by a piece of the side to
+move, and fills in the move flags (castling, en passant...); strict=True
+also checks every move is legal, at the cost of generating moves. Does not
+import pygame. Usage, from this directory:
+
+$ python3 record.py games.gtn games.gtb
+$ python3 record.py tournament.jsonl games.gtn
+"""
+
+import argparse
+import json
+import re
+import struct
+import sys
+import time
+from typing import IO, Iterable, Iterator
+
+from movegen import *
+
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+
+MARKER = 0xC7  # first byte of every binary game
+_GAME = struct.Struct(">BBBBHH")  # marker, White, Black, result, plies,
+                                  # tag bytes
+
+_MOVE_TOKEN = re.compile(
+    r"([A-Z]*)([a-h][1-8])([-x])([a-h][1-8])(?:=([A-Z]+))?[+#!?]*$")
+_CASTLE_TOKEN = re.compile(r"(O-O(?:-O)?)[+#!?]*$")
+_NUMBER_TOKEN = re.compile(r"\d+\.(?:\.\.)?$")
+_TAG_LINE = re.compile(r'\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]$')
+
+
+class RecordError(ValueError):
+    """
+    A game record that cannot be read.
+    """
+
+
+#===============================================================================
+# Games
+#===============================================================================
+class GameRecord:
+    """
+    One recorded game: the armies, the moves and the result, plus any other
+    tags (e.g. Event, Reason or FEN), in order.
+    """
+
+    __slots__ = ("armies", "moves", "result", "tags")
+
+    def __init__(self, armies: tuple[str, str], moves: list[int] = None,
+                 result: str = "*", tags: dict[str, str] = None) -> None:
+        """
+        Constructor.
+
+        :param armies: army folders of White and Black.
+        :param moves: (optional) the encoded moves.
+        :param result: (optional) "1-0", "0-1", "1/2-1/2" or "*".
+        :param tags: (optional) other tag names and values.
+        """
+        self.armies = tuple(armies)
+        self.moves = [] if moves is None else moves
+        self.result = result
+        self.tags = {} if tags is None else tags
+
+    def start(self) -> Position:
+        """
+        :return: the position the game starts from.
+        """
+        if "FEN" in self.tags:
+            return Position.from_fen(self.tags["FEN"], self.armies)
+        return Position.start(*self.armies)
+
+    def end(self) -> Position:
+        """
+        :return: the position after the last move, with the moves in its
+                 history.
+        """
+        pos = self.start()
+        for move in self.moves:
+            pos.make(move)
+        return pos
+
+
+def complete_move(pos: Position, fr: int, to: int,
+                  promotion: int | None = None, strict: bool = False) -> int:
+    """
+    Encode a move given by its squares, working out its flag from the
+    position.
+
+    :param pos: the position before the move.
+    :param fr: origin square.
+    :param to: destination square; the King's, when castling (a King
+               moving more than one file castles).
+    :param promotion: (optional) piece code promoted to.
+    :param strict: (optional) check the move is legal, not just made by a
+                   piece of the side to move.
+    :return: the encoded move.
+    """
+    value = pos.board[fr]
+    if not value or (value - 1) & 1 != pos.side:
+        raise RecordError(f"no piece to move on {square_name(fr)} in "
+                          f"{pos.fen()}")
+    code = (value - 1) >> 1
+    flag = NORMAL
+    if code == pos.king_code[pos.side] and abs((to & 7) - (fr & 7)) > 1:
+        flag = CASTLE_SHORT if to > fr else CASTLE_LONG
+    elif code == pos.pawn_code[pos.side]:
+        if to == pos.ep and (to - fr) & 7:
+            flag = EN_PASSANT
+        elif abs(to - fr) == 16:
+            flag = DOUBLE_PUSH
+    move = make_move(fr, to, flag, promotion)
+    if strict and move not in pos.legal_moves():
+        raise RecordError(f"illegal move {move_name(move)} in {pos.fen()}")
+    return move
+
+
+#===============================================================================
+# Text
+#===============================================================================
+def move_text(pos: Position, move: int) -> str:
+    """
+    Get the long algebraic notation of a move, e.g. "FAb8-c6", "CAh4xf2",
+    "d7-d8=CA" or "O-O".
+
+    :param pos: the position before the move.
+    :param move: the encoded move.
+    :return: the move's notation.
+    """
+    flag = move_flag(move)
+    if flag == CASTLE_SHORT:
+        return "O-O"
+    if flag == CASTLE_LONG:
+        return "O-O-O"
+    fr, to = move_from(move), move_to(move)
+    text = PIECE_TYPES[(pos.board[fr] - 1) >> 1].symbol + square_name(fr)
+    text += ("x" if pos.board[to] or flag == EN_PASSANT else "-") \
+        + square_name(to)
+    promotion = move_promotion(move)
+    if promotion is not None:
+        text += "=" + PIECE_TYPES[promotion].symbol
+    return text
+
+
+def parse_move(pos: Position, text: str, strict: bool = False) -> int:
+    """
+    Read a move in long algebraic notation.
+
+    :param pos: the position before the move.
+    :param text: the move's notation, as from move_text().
+    :param strict: (optional) check the move is legal.
+    :return: the encoded move.
+    """
+    castle = _CASTLE_TOKEN.match(text)
+    if castle:
+        home = 0 if pos.side == WHITE else 56
+        if castle.group(1) == "O-O":
+            return complete_move(pos, home + 4, home + 6, None, strict)
+        # as in Position._castling_moves(): the King goes to b1 when the
+        # corner piece is colorbound
+        corner = pos.board[home]
+        colorbound = corner and PIECE_TYPES[(corner - 1) >> 1].colorbound
+        return complete_move(pos, home + 4, home + (1 if colorbound else 2),
+                             None, strict)
+
+    token = _MOVE_TOKEN.match(text)
+    if not token:
+        raise RecordError(f"cannot read move {text!r}")
+    symbol, fr, _, to, promotion = token.groups()
+    fr, to = parse_square(fr), parse_square(to)
+    if pos.board[fr] and \
+            PIECE_TYPES[(pos.board[fr] - 1) >> 1].symbol != symbol:
+        raise RecordError(f"{text!r}: no {symbol or 'pawn'} on "
+                          f"{square_name(fr)}")
+    if promotion is not None:
+        try:
+            promotion = pos.lookup_symbol(promotion, pos.side)
+        except ValueError as error:
+            raise RecordError(f"{text!r}: {error}") from None
+    return complete_move(pos, fr, to, promotion, strict)
+
+
+def _quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _unquote(value: str) -> str:
+    return re.sub(r"\\(.)", r"\1", value)
+
+
+def format_game(game: GameRecord, width: int = 79) -> str:
+    """
+    Write a game as text.
+
+    :param game: the game.
+    :param width: (optional) longest line of moves.
+    :return: the tags, a blank line, the moves and the result, ending in a
+             newline.
+    """
+    tags = {"White": game.armies[0], "Black": game.armies[1],
+            "Result": game.result, **game.tags}
+    lines = [f'[{name} "{_quote(str(value))}"]'
+             for name, value in tags.items()]
+    lines.append("")
+
+    pos = game.start()
+    tokens = []
+    for move in game.moves:
+        if pos.side == WHITE:
+            tokens.append(f"{pos.fullmove}.")
+        elif not tokens:
+            tokens.append(f"{pos.fullmove}...")
+        tokens.append(move_text(pos, move))
+        pos.make(move)
+    tokens.append(game.result)
+
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > width:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def write_text(file: IO[str], games: Iterable[GameRecord]) -> int:
+    """
+    Write games as text, one after another with a blank line between them.
+
+    :param file: a text file.
+    :param games: the games; any iterable, e.g. a reader.
+    :return: the number of games written.
+    """
+    count = 0
+    for game in games:
+        if count:
+            file.write("\n")
+        file.write(format_game(game))
+        count += 1
+    return count
+
+
+def read_text(file: IO[str], strict: bool = False) -> Iterator[GameRecord]:
+    """
+    Read games written as text, one at a time.
+
+    :param file: a text file.
+    :param strict: (optional) check every move is legal.
+    :return: a generator of games.
+    """
+    tags: dict[str, str] = {}
+    game: GameRecord = None
+    pos: Position = None
+    for number, line in enumerate(file, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if game is not None and line.startswith("["):
+            yield game  # no result token before the next game's tags
+            tags, game = {}, None
+        if game is None:
+            if line.startswith("["):
+                tag = _TAG_LINE.match(line)
+                if not tag:
+                    raise RecordError(f"line {number}: bad tag {line!r}")
+                tags[tag.group(1)] = _unquote(tag.group(2))
+                continue
+            # the first line of moves: the tags are complete
+            try:
+                armies = tags.pop("White"), tags.pop("Black")
+            except KeyError:
+                raise RecordError(f"line {number}: no White or Black "
+                                  f"army tag") from None
+            if not set(armies) <= set(ARMIES):
+                raise RecordError(f"line {number}: unknown army in "
+                                  f"{armies}")
+            game = GameRecord(armies, [], tags.pop("Result", "*"), tags)
+            pos = game.start()
+
+        for token in line.split():
+            if token in RESULTS:
+                game.result = token
+                yield game
+                tags, game = {}, None
+                break
+            if _NUMBER_TOKEN.match(token):
+                continue
+            try:
+                move = parse_move(pos, token, strict)
+            except RecordError as error:
+                raise RecordError(f"line {number}: {error}") from None
+            pos.make(move)
+            game.moves.append(move)
+    if game is not None:
+        yield game  # no result token at the end of the file
+
+
+#===============================================================================
+# Binary
+#===============================================================================
+def move_word(pos: Position, move: int) -> int:
+    """
+    :param pos: a position of the game, for its armies' promotions.
+    :param move: an encoded move.
+    :return: the move as 16 bits, as in the binary format.
+    """
+    promotion = move_promotion(move)
+    if promotion is None:
+        return move & 0xFFF
+    return move & 0xFFF | (pos.promotions.index(promotion) + 1) << 12
+
+
+def word_move(pos: Position, word: int, strict: bool = False) -> int:
+    """
+    :param pos: the position before the move.
+    :param word: a move from move_word().
+    :param strict: (optional) check the move is legal.
+    :return: the encoded move.
+    """
+    promotion = word >> 12
+    if promotion > len(pos.promotions):
+        raise RecordError(f"no promotion {promotion} in {pos.armies}")
+    return complete_move(pos, word & 63, (word >> 6) & 63,
+                         pos.promotions[promotion - 1] if promotion else None,
+                         strict)
+
+
+def write_binary(file: IO[bytes], games: Iterable[GameRecord]) -> int:
+    """
+    Write games in the binary format.
+
+    :param file: a binary file.
+    :param games: the games; any iterable, e.g. a reader.
+    :return: the number of games written.
+    """
+    # armies -> {piece code: promotion field}, as move_word() without a
+    # position
+    promotions = {}
+    count = 0
+    for game in games:
+        indices = promotions.get(game.armies)
+        if indices is None:
+            indices = promotions[game.armies] = {
+                code: i for i, code in
+                enumerate(Position(game.armies).promotions, 1)}
+        tags = "\n".join(f"{name}\t{value}"
+                         for name, value in game.tags.items()).encode()
+        words = [move & 0xFFF | (indices[move_promotion(move)] << 12
+                                 if move >> 15 else 0)
+                 for move in game.moves]
+        file.write(_GAME.pack(MARKER, ARMIES.index(game.armies[0]),
+                              ARMIES.index(game.armies[1]),
+                              RESULTS.index(game.result), len(words),
+                              len(tags)))
+        file.write(tags)
+        file.write(struct.pack(f">{len(words)}H", *words))
+        count += 1
+    return count
+
+
+def read_binary(file: IO[bytes],
+                strict: bool = False) -> Iterator[GameRecord]:
+    """
+    Read games written in the binary format, one at a time.
+
+    :param file: a binary file.
+    :param strict: (optional) check every move is legal.
+    :return: a generator of games.
+    """
+    offset = 0
+    while True:
+        header = file.read(_GAME.size)
+        if not header:
+            return
+        if len(header) < _GAME.size or header[0] != MARKER:
+            raise RecordError(f"offset {offset}: not a game record")
+        _, white, black, result, plies, length = _GAME.unpack(header)
+        tags = dict(line.split("\t", 1) for line in
+                    file.read(length).decode().splitlines())
+        data = file.read(2 * plies)
+        if len(data) < 2 * plies:
+            raise RecordError(f"offset {offset}: game cut off")
+        offset += _GAME.size + length + 2 * plies
+
+        game = GameRecord((ARMIES[white], ARMIES[black]), [],
+                          RESULTS[result], tags)
+        pos = game.start()
+        for word in struct.unpack(f">{plies}H", data):
+            try:
+                move = word_move(pos, word, strict)
+            except RecordError as error:
+                raise RecordError(f"offset {offset}: {error}") from None
+            pos.make(move)
+            game.moves.append(move)
+        yield game
+
+
+#===============================================================================
+# Tournament results
+#===============================================================================
+def result_game(result: dict) -> GameRecord:
+    """
+    Convert one game played by tournament.py.
+
+    :param result: a result from tournament.play_game(), with the moves in
+                   coordinate notation.
+    :return: the game, tagged with its Event (the job id) and Reason.
+    """
+    game = GameRecord((result["white"], result["black"]), [],
+                      result["result"],
+                      {"Event": result["id"], "Reason": result["reason"]})
+    pos = game.start()
+    for name in result["moves"]:
+        promotion = None
+        if len(name) > 4:  # e.g. "e7e8[CA]"
+            promotion = pos.lookup_symbol(name[5:-1], pos.side)
+        move = complete_move(pos, parse_square(name[:2]),
+                             parse_square(name[2:4]), promotion)
+        pos.make(move)
+        game.moves.append(move)
+    return game
+
+
+def read_results(file: IO[str]) -> Iterator[GameRecord]:
+    """
+    Read the games of a tournament.py results file, one at a time.
+
+    :param file: a JSON Lines results file.
+    :return: a generator of games, as from result_game().
+    """
+    for line in file:
+        if line.strip().endswith("}"):  # else cut off by an interrupted run
+            yield result_game(json.loads(line))
+
+
+#===============================================================================
+# Conversion
+#===============================================================================
+def _kind(path: str) -> str:
+    for kind, extensions in (("binary", (".gtb", ".bin")),
+                             ("results", (".jsonl",))):
+        if path.endswith(extensions):
+            return kind
+    return "text"
+
+
+def read_file(path: str, strict: bool = False) -> Iterator[GameRecord]:
+    """
+    Read games from a file of any kind, one at a time; the file is open
+    while the generator is.
+
+    :param path: .gtb or .bin for binary, .jsonl for tournament results,
+                 else text.
+    :param strict: (optional) check every move is legal.
+    :return: a generator of games.
+    """
+    kind = _kind(path)
+    with open(path, "rb" if kind == "binary" else "r") as file:
+        if kind == "binary":
+            yield from read_binary(file, strict)
+        elif kind == "results":
+            yield from read_results(file)
+        else:
+            yield from read_text(file, strict)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", help=".gtb or .bin for binary, .jsonl for "
+                                      "tournament results, else text")
+    parser.add_argument("output", help=".gtb or .bin for binary, else text; "
+                                       "- for standard output")
+    parser.add_argument("--strict", action="store_true",
+                        help="check every move is legal")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    games = read_file(args.input, args.strict)
+    if args.output == "-":
+        count = write_text(sys.stdout, games)
+    elif _kind(args.output) == "binary":
+        with open(args.output, "wb") as target:
+            count = write_binary(target, games)
+    else:
+        with open(args.output, "w") as target:
+            count = write_text(target, games)
+    seconds = time.perf_counter() - start
+    print(f"{count} games in {seconds:.2f} s "
+          f"({count / max(seconds, 1e-9):.0f} games/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Dirty-rectangle rendering.
+
+Instead of clearing and flipping the whole display every frame, the
+renderer compares each component's get_state() with the last frame and
+repaints only the areas of components that changed: it clips to each area,
+fills the background and lets the screen draw itself there, then passes
+just those areas to pygame.display.update(). An idle screen costs a state
+comparison per component and uploads nothing.
+
+The whole screen is repainted on the first frame, on a screen change, when
+a global setting changes, and after invalidate(). During a screen
+transition, snapshot() renders each screen once off-screen and
+draw_transition() shows the composite.
+"""
+
+import pygame.display
+from pygame import Surface, Rect
+
+from settings import *
+from profiler import section
+from ui import Drawable
+
+
+class Renderer:
+    """
+    Repaints the parts of a screen that changed since the last frame.
+    """
+
+    def __init__(self) -> None:
+        """
+        Constructor.
+        """
+        self.settings: tuple = None  # global settings at the last repaint
+        self.states: dict[Drawable, tuple] = {}  # last drawn states
+        self.rects: dict[Drawable, Rect] = {}  # last drawn areas
+        self.full = True
+
+    def invalidate(self) -> None:
+        """
+        Repaint the whole screen on the next frame.
+        """
+        self.full = True
+
+    def draw(self, display: Surface, screen,
+             overlay: Drawable = None) -> list[Rect]:
+        """
+        Repaint what changed and update those areas of the display.
+
+        :param display: the display surface.
+        :param screen: the screen module, with a display(surface) function
+                       and a list of Drawable components.
+        :param overlay: (optional) a component drawn on top of the screen
+                        on every frame, e.g. the profiler overlay. Call
+                        invalidate() when it goes away.
+        :return: the updated areas; empty when nothing changed.
+        """
+        with section("display"):
+            updated = self._repaint(display, screen)
+        if overlay is not None:
+            with section("overlay"):
+                overlay.draw(display)
+            updated.append(overlay.get_rect())
+
+        with section("flip"):
+            if updated and updated[0] == display.get_rect():
+                pygame.display.update()
+            elif updated:
+                pygame.display.update(updated)
+        return updated
+
+    def snapshot(self, display: Surface, screen) -> Surface:
+        """
+        Render a whole screen off-screen, e.g. for a transition.
+
+        :param display: the display surface, for the size and pixel format.
+        :param screen: the screen module.
+        :return: a new surface with the screen drawn on it.
+        """
+        surface = Surface(display.get_size()).convert(display)
+        self._paint(surface, screen, None)
+        return surface
+
+    def draw_transition(self, display: Surface, transition,
+                        overlay: Drawable = None) -> None:
+        """
+        Show a frame of a screen transition instead of a screen. The whole
+        screen is repainted on the first frame after the transition.
+
+        :param display: the display surface.
+        :param transition: a ui.Transition.
+        :param overlay: (optional) as in draw().
+        """
+        self.full = True
+        with section("display"):
+            transition.draw(display)
+        if overlay is not None:
+            with section("overlay"):
+                overlay.draw(display)
+        with section("flip"):
+            pygame.display.update()
+
+    def _repaint(self, display: Surface, screen) -> list[Rect]:
+        settings = (screen, get_version())
+        if settings != self.settings:
+            self.settings = settings
+            self.full = True
+
+        if self.full:
+            self.full = False
+            self.states.clear()
+            self.rects.clear()
+            for component in screen.components:
+                self._remember(component)
+            self._paint(display, screen, None)
+            return [display.get_rect()]
+
+        dirty = []
+        for component in screen.components:
+            if component.dirty \
+                    or component.get_state() != self.states.get(component):
+                old = self.rects.get(component)
+                new = self._remember(component)
+                dirty.append(new if old is None else new.union(old))
+
+        # merge overlapping areas so nothing is painted twice
+        merged = []
+        for rect in dirty:
+            for i in reversed(range(len(merged))):
+                if rect.colliderect(merged[i]):
+                    rect = rect.union(merged.pop(i))
+            merged.append(rect)
+
+        for rect in merged:
+            self._paint(display, screen, rect)
+        return merged
+
+    def _remember(self, component: Drawable) -> Rect:
+        component.dirty = False
+        self.states[component] = component.get_state()
+        rect = self.rects[component] = component.get_rect()
+        return rect
+
+    def _paint(self, display: Surface, screen, area: Rect | None) -> None:
+        display.set_clip(area)
+        display.fill(C_BACKGROUND_DARK if get_dark_mode()
+                     else C_BACKGROUND_LIGHT, area)
+        screen.display(display)
+        display.set_clip(None)
@@ -0,0 +1,416 @@
+"""
+Headless multi-game server, for hosting a whole tournament from one machine.
+
+Every game, player and spectator lives on one asyncio event loop. Clients
+speak the lan.py framing, with a game id in front of each message, so one
+connection can play or watch any number of games:
+
+* PLAY (game id, White army, Black army): take the next free seat; START
+  (game id + lan START) follows for both players once both are seated.
+* WATCH (game id): spectate; a REPLAY (game id + lan REPLAY) of the moves
+  so far follows, then every move.
+* MOVE (game id + lan MOVE): a move, once both seats have been taken,
+  validated against the server's own Position before it is relayed, byte
+  for byte, to the opponent and every spectator. Invalid moves get an
+  ERROR (game id + text).
+* RESULT (game id + text, e.g. "1-0 checkmate"): sent to the players and
+  spectators when the game ends, by the rules or because both players
+  left ("* abandoned"). The game is then forgotten, and its id is free.
+
+A player who takes a seat in a game under way (e.g. after reconnecting)
+gets a REPLAY of the moves so far after START.
+
+Moves are not written to sockets one by one: frames are appended to each
+client's buffer, and all buffers are flushed once per event loop pass, so a
+busy spectator gets one write for many games' moves. A spectator whose
+socket falls behind (more than HIGH_WATER bytes unsent) stops receiving
+moves until it drains below LOW_WATER, then catches up with one REPLAY per
+game; a player that falls that far behind is disconnected. Usage, from this
+directory:
+
+$ python3 server.py --port 47500 --stats
+"""
+
+import argparse
+import asyncio
+import socket
+import struct
+import time
+
+from movegen import ARMIES
+from lan import (NetGame, ProtocolError, frame, read_frame, decode_move,
+                 encode_replay, START, MOVE, REPLAY, PING, PONG, START_STRUCT)
+
+PORT = 47500
+PLAY = 16
+WATCH = 17
+ERROR = 18
+RESULT = 19
+
+HIGH_WATER = 256 * 1024  # unsent bytes at which a spectator is paused
+LOW_WATER = 16 * 1024  # unsent bytes at which it resumes
+PLAYER_LIMIT = 4 * 1024 * 1024  # unsent bytes at which a player is dropped
+RESUME_INTERVAL = 0.05  # seconds between checks on paused spectators
+# socket send buffer, in bytes; left to the kernel, it grows to megabytes
+# and hides a slow reader from the checks above
+SEND_BUFFER = 64 * 1024
+
+# game id, in front of every payload
+ID_STRUCT = struct.Struct(">I")
+# game id, White army, Black army
+PLAY_STRUCT = struct.Struct(">IBB")
+
+
+class Client:
+    """
+    One connection: its write buffer and the games it plays or watches.
+    """
+
+    __slots__ = ("writer", "buffer", "seats", "watching", "paused")
+
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.buffer = bytearray()  # frames not yet handed to the socket
+        self.seats: dict[int, int] = {}  # game id -> color
+        self.watching: dict[int, int] = {}  # game id -> plies sent
+        self.paused = False
+
+    def unsent(self) -> int:
+        """
+        :return: bytes waiting to be sent, here and in the socket.
+        """
+        return len(self.buffer) \
+            + self.writer.transport.get_write_buffer_size()
+
+
+class Game:
+    """
+    One game on the server: the authoritative position, the players and the
+    spectators.
+    """
+
+    __slots__ = ("id", "net", "players", "spectators", "started")
+
+    def __init__(self, game_id: int, armies: tuple[str, str]) -> None:
+        self.id = game_id
+        self.net = NetGame(armies, 600.0, 0.0)
+        self.players: list[Client | None] = [None, None]
+        self.spectators: set[Client] = set()
+        self.started = False  # both seats have been taken
+
+
+class Server:
+    """
+    Runs any number of games and relays their moves.
+    """
+
+    def __init__(self, high_water: int = HIGH_WATER,
+                 low_water: int = LOW_WATER) -> None:
+        """
+        Constructor.
+
+        :param high_water: (optional) unsent bytes at which a spectator is
+                           paused.
+        :param low_water: (optional) unsent bytes at which it resumes.
+        """
+        self.high_water = high_water
+        self.low_water = low_water
+        self.games: dict[int, Game] = {}
+        self.clients: set[Client] = set()
+        self.dirty: set[Client] = set()  # clients with buffered frames
+        self.loop: asyncio.AbstractEventLoop = None
+        self.flushing = False
+        # statistics
+        self.moves = 0
+        self.frames = 0
+        self.writes = 0
+        self.pauses = 0
+
+    async def serve(self, address: str = "0.0.0.0", port: int = PORT,
+                    stats: bool = False) -> None:
+        """
+        Accept clients until cancelled.
+
+        :param address: (optional) address to listen on.
+        :param port: (optional) TCP port.
+        :param stats: (optional) print statistics every few seconds.
+        """
+        self.loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self.connection, address, port)
+        tasks = [asyncio.create_task(self._resume())]
+        if stats:
+            tasks.append(asyncio.create_task(self._report()))
+        print(f"serving on port {server.sockets[0].getsockname()[1]}",
+              flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def connection(self, reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter) -> None:
+        """
+        Handle one client until it disconnects.
+        """
+        writer.get_extra_info("socket").setsockopt(
+            socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        client = Client(writer)
+        self.clients.add(client)
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                self.handle(client, kind, payload)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError,
+                ProtocolError, struct.error):
+            pass
+        finally:
+            self.drop(client)
+
+    def handle(self, client: Client, kind: int, payload: bytes) -> None:
+        """
+        React to one message from a client.
+        """
+        if kind == MOVE:
+            self.move(client, payload)
+        elif kind == PLAY:
+            game_id, white, black = PLAY_STRUCT.unpack(payload)
+            if max(white, black) >= len(ARMIES):
+                self.error(client, game_id, "no such army")
+            else:
+                self.play(client, game_id, (ARMIES[white], ARMIES[black]))
+        elif kind == WATCH:
+            game_id, = ID_STRUCT.unpack(payload)
+            self.watch(client, game_id)
+        elif kind == PING:
+            self.send(client, frame(PONG, payload))
+
+    #---------------------------------------------------------------------------
+    # Games
+    #---------------------------------------------------------------------------
+    def get_game(self, game_id: int,
+                 armies: tuple[str, str] = ("fide", "fide")) -> Game:
+        game = self.games.get(game_id)
+        if game is None:
+            game = self.games[game_id] = Game(game_id, armies)
+        return game
+
+    def play(self, client: Client, game_id: int,
+             armies: tuple[str, str]) -> None:
+        """
+        Seat a client in a game, creating the game if needed; start it once
+        both seats are taken, and catch the client up if it is under way.
+        """
+        game = self.get_game(game_id, armies)
+        if None not in game.players:
+            self.error(client, game_id, "both seats are taken")
+            return
+        color = game.players.index(None)
+        game.players[color] = client
+        client.seats[game_id] = color
+        if None not in game.players:
+            game.started = True
+            net = game.net
+            for color, player in enumerate(game.players):
+                self.send(player, frame(START, ID_STRUCT.pack(game_id)
+                                        + START_STRUCT.pack(
+                    ARMIES.index(net.armies[0]), ARMIES.index(net.armies[1]),
+                    color, round(1000 * net.base),
+                    round(1000 * net.increment))))
+            if net.moves:
+                self.send(client, frame(REPLAY, ID_STRUCT.pack(game_id)
+                                        + encode_replay(0, net.clocks(),
+                                                        net.moves)))
+
+    def watch(self, client: Client, game_id: int) -> None:
+        """
+        Add a spectator to a game and send it the moves so far.
+        """
+        game = self.get_game(game_id)
+        game.spectators.add(client)
+        client.watching[game_id] = 0
+        self.send_replay(client, game)
+
+    def move(self, client: Client, payload: bytes) -> None:
+        """
+        Validate a move and relay it to the opponent and the spectators;
+        end the game if it is over.
+        """
+        game_id, = ID_STRUCT.unpack_from(payload)
+        game = self.games.get(game_id)
+        if game is None or client.seats.get(game_id) != game.net.pos.side:
+            self.error(client, game_id, "not your move")
+            return
+        if not game.started:
+            self.error(client, game_id, "the game has not started")
+            return
+        try:
+            move, clock = decode_move(game.net.pos,
+                                      payload[ID_STRUCT.size:])
+        except (ProtocolError, struct.error) as error:
+            self.error(client, game_id, str(error))
+            return
+        net = game.net
+        mover = net.pos.side
+        net.play(move)
+        net.clock[mover] = clock
+        self.moves += 1
+
+        data = frame(MOVE, payload)  # built once for every receiver
+        opponent = game.players[mover ^ 1]
+        if opponent is not None:
+            self.send(opponent, data)
+        ply = len(net.moves)
+        for spectator in game.spectators:
+            if not spectator.paused:
+                self.send(spectator, data)
+                spectator.watching[game_id] = ply
+
+        outcome = net.pos.outcome()
+        if outcome is not None:
+            self.end(game, *outcome)
+
+    def end(self, game: Game, result: str, reason: str) -> None:
+        """
+        Tell the players and spectators how a game ended, and forget it.
+        Paused spectators are sent the moves they missed first.
+
+        :param game: the game.
+        :param result: "1-0", "0-1", "1/2-1/2", or "*" if unfinished.
+        :param reason: how it ended, e.g. "checkmate".
+        """
+        data = frame(RESULT, ID_STRUCT.pack(game.id)
+                     + f"{result} {reason}".encode())
+        for player in game.players:
+            if player is not None:
+                self.send(player, data)
+                del player.seats[game.id]
+        for spectator in game.spectators:
+            if spectator.paused:
+                self.send_replay(spectator, game)
+            self.send(spectator, data)
+            del spectator.watching[game.id]
+        del self.games[game.id]
+
+    def send_replay(self, client: Client, game: Game) -> None:
+        """
+        Send a spectator the moves it has not seen yet.
+        """
+        net = game.net
+        ply = client.watching[game.id]
+        self.send(client, frame(REPLAY, ID_STRUCT.pack(game.id)
+                                + encode_replay(ply, net.clocks(),
+                                                net.moves[ply:])))
+        client.watching[game.id] = len(net.moves)
+
+    def error(self, client: Client, game_id: int, text: str) -> None:
+        self.send(client, frame(ERROR, ID_STRUCT.pack(game_id)
+                                + text.encode()))
+
+    def drop(self, client: Client) -> None:
+        """
+        Forget a client: free its seats and stop its spectating. Games left
+        with no players end as abandoned; games left with no one at all are
+        forgotten.
+        """
+        self.clients.discard(client)
+        self.dirty.discard(client)
+        seats, client.seats = client.seats, {}
+        for game_id in seats:
+            game = self.games[game_id]
+            game.players = [None if player is client else player
+                            for player in game.players]
+            if game.players == [None, None]:
+                game.spectators.discard(client)
+                self.end(game, "*", "abandoned")
+        watching, client.watching = client.watching, {}
+        for game_id in watching:
+            game = self.games.get(game_id)
+            if game is not None:
+                game.spectators.discard(client)
+                if game.players == [None, None] and not game.spectators:
+                    del self.games[game_id]
+        client.writer.close()
+
+    #---------------------------------------------------------------------------
+    # Batched writes and backpressure
+    #---------------------------------------------------------------------------
+    def send(self, client: Client, data: bytes) -> None:
+        """
+        Queue a frame; it is written with everything else queued during
+        this pass of the event loop.
+        """
+        client.buffer += data
+        self.frames += 1
+        self.dirty.add(client)
+        if not self.flushing:
+            self.flushing = True
+            self.loop.call_soon(self.flush)
+
+    def flush(self) -> None:
+        """
+        Hand every client's buffered frames to its socket in one write, and
+        pause or drop clients that are not keeping up.
+        """
+        self.flushing = False
+        dirty, self.dirty = self.dirty, set()
+        for client in dirty:
+            if client.writer.is_closing():
+                continue
+            client.writer.write(bytes(client.buffer))
+            client.buffer.clear()
+            self.writes += 1
+
+            backlog = client.writer.transport.get_write_buffer_size()
+            if client.seats and backlog > PLAYER_LIMIT:
+                self.drop(client)
+            elif not client.seats and backlog > self.high_water \
+                    and not client.paused:
+                client.paused = True
+                self.pauses += 1
+
+    async def _resume(self) -> None:
+        """
+        Let paused spectators catch up once their sockets drain.
+        """
+        while True:
+            await asyncio.sleep(RESUME_INTERVAL)
+            for client in list(self.clients):
+                if client.paused and client.unsent() < self.low_water:
+                    client.paused = False
+                    for game_id in client.watching:
+                        self.send_replay(client, self.games[game_id])
+
+    async def _report(self) -> None:
+        last, start = 0, time.perf_counter()
+        while True:
+            await asyncio.sleep(5)
+            now = time.perf_counter()
+            print(f"{len(self.games)} games, {len(self.clients)} clients, "
+                  f"{(self.moves - last) / (now - start):.0f} moves/s, "
+                  f"{self.frames} frames in {self.writes} writes, "
+                  f"{self.pauses} pauses", flush=True)
+            last, start = self.moves, now
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--address", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--stats", action="store_true",
+                        help="print statistics every 5 seconds")
+    parser.add_argument("--high-water", type=int, default=HIGH_WATER,
+                        help="unsent bytes at which a spectator is paused")
+    parser.add_argument("--low-water", type=int, default=LOW_WATER,
+                        help="unsent bytes at which it resumes")
+    args = parser.parse_args()
+    server = Server(args.high_water, args.low_water)
+    try:
+        asyncio.run(server.serve(args.address, args.port, args.stats))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,49 @@
-"""Global settings."""
+"""
+Global settings.
+
+Every change bumps a version number, so anything derived from the settings
+(e.g. the UI layout) can be cached and recomputed only when the version
+moves on; listeners are also called on every change.
+"""
+
+from typing import Callable
 
 from constants import *
 
 _dark_mode: bool
 _text_mode: int
 _button_mode: int
+_assist_mode: bool
 _resolution: tuple[int, int]
 
+_version = 0
+_listeners: list[Callable[[], None]] = []
+
+
+def get_version() -> int:
+    """
+    Get the settings version, which changes whenever any setting does.
+
+    :return: the current version.
+    """
+    return _version
+
+
+def add_listener(listener: Callable[[], None]) -> None:
+    """
+    Call a function whenever any setting changes.
+
+    :param listener: called with no arguments, after the change.
+    """
+    _listeners.append(listener)
+
+
+def _changed() -> None:
+    global _version
+    _version += 1
+    for listener in _listeners:
+        listener()
+
 
 def get_dark_mode() -> bool:
     """
@@ -30,6 +67,7 @@ def set_dark_mode(value: bool) -> None:
     """
     global _dark_mode
     _dark_mode = value
+    _changed()
 
 
 def get_text_mode() -> int:
@@ -56,6 +94,7 @@ def set_text_mode(value: int) -> None:
     """
     global _text_mode
     _text_mode = value
+    _changed()
 
 
 def get_button_mode() -> int:
@@ -82,6 +121,33 @@ def set_button_mode(value: int) -> None:
     """
     global _button_mode
     _button_mode = value
+    _changed()
+
+
+def get_assist_mode() -> bool:
+    """
+    Get the current assist mode setting: whether the board outlines the
+    player's pieces that the opponent attacks.
+
+    :return: the current assist mode setting.
+    """
+    global _assist_mode
+    try:
+        return _assist_mode
+    except NameError:
+        _assist_mode = True
+        return _assist_mode
+
+
+def set_assist_mode(value: bool) -> None:
+    """
+    Change the current assist mode setting.
+
+    :param value: the desired assist mode setting.
+    """
+    global _assist_mode
+    _assist_mode = value
+    _changed()
 
 
 def get_resolution() -> tuple[int, int]:
@@ -106,3 +172,4 @@ def set_resolution(value: tuple[int, int]) -> None:
     """
     global _resolution
     _resolution = value
+    _changed()
@@ -0,0 +1,270 @@
+"""
+Headless engine-vs-engine tournament for army balance testing.
+
+Plays every ordered army pairing (so each army gets both colors) on all
+cores, appending each game to a JSON Lines file as soon as it finishes, then
+reports each pairing's score and Elo difference with 95% error bars. Does
+not import pygame. Usage, from this directory:
+
+$ python3 tournament.py --games 100 --time 0.1 --output results.jsonl
+$ python3 tournament.py --report results.jsonl
+
+Rerunning with the same output file resumes, skipping finished games. With
+--record, finished games are also appended to a binary game record (see
+record.py).
+"""
+
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+import zlib
+
+from movegen import *
+from engine import Search
+from record import result_game, write_binary
+
+#===============================================================================
+# Games
+#===============================================================================
+_search: Search = None  # one per worker process, reused between games
+
+
+def _init_worker(megabytes: float) -> None:
+    global _search
+    _search = Search(megabytes)
+
+
+def play_game(job: dict) -> dict:
+    """
+    Play one engine-vs-engine game.
+
+    :param job: dict with the game's id, white and black armies, time per
+                move, depth limit, number of random opening plies, maximum
+                plies and random seed.
+    :return: the job, plus result, reason, plies, seconds and the moves in
+             coordinate notation.
+    """
+    start = time.perf_counter()
+    rng = random.Random(job["seed"])
+    pos = Position.start(job["white"], job["black"])
+    _search.tt.clear()
+    moves = []
+
+    outcome = pos.outcome()
+    while outcome is None:
+        if len(moves) >= job["max_plies"]:
+            outcome = "1/2-1/2", "adjudicated"
+            break
+        if len(moves) < job["random_plies"]:
+            move = rng.choice(pos.legal_moves())
+        else:
+            move = _search.search(pos, job["time"], job["depth"]).move
+        moves.append(move_name(move))
+        pos.make(move)
+        outcome = pos.outcome()
+
+    return dict(job, result=outcome[0], reason=outcome[1], plies=len(moves),
+                seconds=round(time.perf_counter() - start, 3), moves=moves)
+
+
+#===============================================================================
+# Statistics
+#===============================================================================
+def elo(score: float) -> float:
+    """
+    Convert an expected score to an Elo rating difference.
+
+    :param score: expected score, between 0 and 1.
+    :return: the Elo difference; infinite for scores of 0 or 1.
+    """
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def pairing_stats(results: list[dict]) -> dict[tuple[str, str], dict]:
+    """
+    Summarize results per unordered army pairing, from the point of view of
+    the army that comes first in ARMIES.
+
+    :param results: game results from play_game().
+    :return: map from (army, opponent) to a dict of games, wins, draws,
+             losses, score, elo and elo_low/elo_high (95% interval).
+    """
+    scores: dict[tuple[str, str], list[float]] = {}
+    for game in results:
+        white_score = {"1-0": 1.0, "0-1": 0.0}.get(game["result"], 0.5)
+        if ARMIES.index(game["white"]) <= ARMIES.index(game["black"]):
+            key, score = (game["white"], game["black"]), white_score
+        else:
+            key, score = (game["black"], game["white"]), 1 - white_score
+        scores.setdefault(key, []).append(score)
+
+    stats = {}
+    for key, values in sorted(scores.items(),
+                              key=lambda item: (ARMIES.index(item[0][0]),
+                                                ARMIES.index(item[0][1]))):
+        n = len(values)
+        mean = sum(values) / n
+        variance = sum((value - mean) ** 2 for value in values) / n
+        margin = 1.96 * math.sqrt(variance / n)
+        stats[key] = dict(
+            games=n,
+            wins=values.count(1.0),
+            draws=values.count(0.5),
+            losses=values.count(0.0),
+            score=mean,
+            elo=elo(mean),
+            elo_low=elo(mean - margin),
+            elo_high=elo(mean + margin),
+        )
+    return stats
+
+
+def report(results: list[dict]) -> str:
+    """
+    Format a per-pairing results table.
+
+    :param results: game results from play_game().
+    :return: the table, one line per pairing plus a header and a line for
+             White's overall advantage.
+    """
+    lines = [f"{'pairing':<18}{'games':>7}{'+':>6}{'=':>6}{'-':>6}"
+             f"{'score':>8}{'elo':>8}   95% interval"]
+    for (army, opponent), s in pairing_stats(results).items():
+        lines.append(
+            f"{army + ' v ' + opponent:<18}{s['games']:>7}{s['wins']:>6}"
+            f"{s['draws']:>6}{s['losses']:>6}{100 * s['score']:>7.1f}%"
+            f"{s['elo']:>8.0f}   [{s['elo_low']:.0f}, {s['elo_high']:.0f}]"
+        )
+    if results:
+        white = sum({"1-0": 1.0, "0-1": 0.0}.get(game["result"], 0.5)
+                    for game in results) / len(results)
+        lines.append(f"White scores {100 * white:.1f}% "
+                     f"({elo(white):+.0f} Elo) over {len(results)} games")
+    return "\n".join(lines)
+
+
+def load_results(path: str) -> list[dict]:
+    """
+    Read every finished game from a results file.
+
+    :param path: JSON Lines file written by run().
+    :return: the results; an empty list if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        # a line cut off by an interrupted run has no result; skip it
+        return [json.loads(line) for line in file
+                if line.strip().endswith("}")]
+
+
+#===============================================================================
+# Runner
+#===============================================================================
+def make_jobs(armies: list[str], games: int, mirror: bool,
+              **settings) -> list[dict]:
+    """
+    Create one job per game: every ordered pairing of armies, `games` times.
+
+    :param armies: army folders taking part.
+    :param games: games per ordered pairing.
+    :param mirror: whether armies also play themselves.
+    :param settings: time, depth, random_plies and max_plies for every game.
+    :return: the jobs, in an order that interleaves pairings.
+    """
+    pairings = [(white, black)
+                for white, black in itertools.product(armies, repeat=2)
+                if mirror or white != black]
+    jobs = []
+    for i in range(games):
+        for white, black in pairings:
+            name = f"{white}-{black}-{i}"
+            jobs.append(dict(id=name, white=white, black=black,
+                             seed=zlib.crc32(name.encode()), **settings))
+    return jobs
+
+
+def run(jobs: list[dict], output: str, workers: int,
+        megabytes: float, record: str = None) -> list[dict]:
+    """
+    Play jobs on a process pool, appending each result to the output file as
+    soon as its game ends. Jobs whose id is already in the file are skipped.
+
+    :param jobs: jobs from make_jobs().
+    :param output: JSON Lines results file.
+    :param workers: number of worker processes.
+    :param megabytes: transposition table budget per worker.
+    :param record: (optional) binary game record to append the games to.
+    :return: every result in the output file, old and new.
+    """
+    results = load_results(output)
+    done = {game["id"] for game in results}
+    jobs = [job for job in jobs if job["id"] not in done]
+    if not jobs:
+        return results
+
+    start = time.perf_counter()
+    with open(output, "a") as file, \
+            open(record or os.devnull, "ab") as record_file, \
+            multiprocessing.Pool(workers, _init_worker, (megabytes,)) as pool:
+        for i, game in enumerate(pool.imap_unordered(play_game, jobs), 1):
+            file.write(json.dumps(game) + "\n")
+            file.flush()
+            if record:
+                write_binary(record_file, [result_game(game)])
+                record_file.flush()
+            results.append(game)
+            elapsed = time.perf_counter() - start
+            print(f"[{i}/{len(jobs)}] {game['white']} v {game['black']}: "
+                  f"{game['result']} ({game['reason']}, {game['plies']} "
+                  f"plies) - {3600 * i / elapsed:.0f} games/hour", flush=True)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--armies", nargs="+", default=ARMIES, choices=ARMIES)
+    parser.add_argument("--games", type=int, default=10,
+                        help="games per ordered pairing")
+    parser.add_argument("--mirror", action="store_true",
+                        help="also play each army against itself")
+    parser.add_argument("--time", type=float, default=0.1,
+                        help="seconds per move")
+    parser.add_argument("--depth", type=int, default=None,
+                        help="depth limit per move")
+    parser.add_argument("--random-plies", type=int, default=4,
+                        help="random opening plies, so games differ")
+    parser.add_argument("--max-plies", type=int, default=300,
+                        help="adjudicate a draw after this many plies")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--hash", type=float, default=8, metavar="MB",
+                        help="transposition table budget per worker")
+    parser.add_argument("--output", default="tournament.jsonl")
+    parser.add_argument("--record", metavar="FILE",
+                        help="also append the games to a binary game record")
+    parser.add_argument("--report", metavar="FILE",
+                        help="only print the report for a results file")
+    args = parser.parse_args()
+
+    if args.report:
+        print(report(load_results(args.report)))
+        return
+
+    jobs = make_jobs(args.armies, args.games, args.mirror, time=args.time,
+                     depth=args.depth, random_plies=args.random_plies,
+                     max_plies=args.max_plies)
+    print(report(run(jobs, args.output, args.workers, args.hash,
+                     args.record)))
+
+
+if __name__ == "__main__":
+    main()
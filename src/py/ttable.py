@@ -0,0 +1,102 @@
+"""
+Fixed-size transposition table keyed by Zobrist hash.
+
+Entries live in parallel typed arrays rather than Python objects, so the
+table's memory use is set once by its budget and never grows.
+"""
+
+from array import array
+
+EXACT = 0
+LOWER = 1  # score is a lower bound (the search failed high)
+UPPER = 2  # score is an upper bound (the search failed low)
+
+# bytes per entry: key, move, score, depth, bound and generation
+ENTRY_SIZE = 8 + 4 + 4 + 1 + 1
+
+
+class TranspositionTable:
+    """
+    Hash table of search results. When two positions share a slot, the
+    result searched to the greater depth is kept, unless the stored one is
+    left over from an earlier search.
+    """
+
+    def __init__(self, megabytes: float = 16) -> None:
+        """
+        Constructor.
+
+        :param megabytes: (optional) memory budget. The number of entries is
+                          the largest power of two that fits.
+        """
+        entries = max(int(megabytes * 1024 * 1024) // ENTRY_SIZE, 1)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.generation = 0
+        self.clear()
+
+    def clear(self) -> None:
+        """
+        Remove every entry.
+        """
+        self.keys = array("Q", bytes(8 * self.size))
+        self.moves = array("I", bytes(4 * self.size))
+        self.scores = array("i", bytes(4 * self.size))
+        self.depths = array("b", bytes(self.size))
+        # bound in the low two bits, generation above
+        self.flags = array("B", bytes(self.size))
+
+    def new_search(self) -> None:
+        """
+        Age the table, so entries from earlier searches are replaced first.
+        """
+        self.generation = (self.generation + 1) & 63
+
+    def probe(self, key: int) -> tuple[int, int, int, int] | None:
+        """
+        Look up a position.
+
+        :param key: the position's 64-bit hash.
+        :return: a (move, score, depth, bound) tuple, or None if the position
+                 is not stored. A move of 0 means no best move was known.
+        """
+        i = key & self.mask
+        if self.keys[i] != key:
+            return None
+        return self.moves[i], self.scores[i], self.depths[i], \
+            self.flags[i] & 3
+
+    def store(self, key: int, move: int, score: int, depth: int,
+              bound: int) -> None:
+        """
+        Store a search result, if it is worth more than the slot's entry.
+
+        :param key: the position's 64-bit hash.
+        :param move: best move found, or 0.
+        :param score: the search score.
+        :param depth: remaining depth the position was searched to.
+        :param bound: EXACT, LOWER or UPPER.
+        """
+        i = key & self.mask
+        same = self.keys[i] == key
+        if not same and self.flags[i] >> 2 == self.generation \
+                and depth < self.depths[i]:
+            return
+        if same and not move:
+            move = self.moves[i]  # keep the old best move for ordering
+        self.keys[i] = key
+        self.moves[i] = move
+        self.scores[i] = score
+        self.depths[i] = max(min(depth, 127), -128)
+        self.flags[i] = self.generation << 2 | bound
+
+    def hashfull(self) -> int:
+        """
+        Estimate how full the table is, from a sample of its first slots.
+
+        :return: used entries per thousand, counting only this search.
+        """
+        sample = min(self.size, 1000)
+        used = sum(1 for i in range(sample)
+                   if self.keys[i] and self.flags[i] >> 2 == self.generation)
+        return used * 1000 // sample
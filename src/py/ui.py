@@ -1,11 +1,16 @@
 """General UI components."""
 
-import pygame.mouse
+import time
+from collections import OrderedDict
+
+import pygame
 from pygame import Surface, Rect
 from pygame.freetype import STYLE_DEFAULT
 from pygame.event import post, Event
 
+import profiler
 from settings import *
+from animation import ease
 
 
 def center(corner: tuple[float, float],
@@ -15,14 +20,171 @@ def center(corner: tuple[float, float],
             corner[1] - dimensions.height / 2)
 
 
+#===============================================================================
+# Text rendering
+#===============================================================================
+# (font, text, size, color, style) -> (surface, bounds), least recently used
+# first
+_text_cache: OrderedDict[tuple, tuple[Surface, Rect]] = OrderedDict()
+
+
+def render_text(font: Font, text: str, color: tuple[int, int, int],
+                size: float = None, style: int = STYLE_DEFAULT) \
+        -> tuple[Surface, Rect]:
+    """
+    Render a line of text, reusing the surface from an earlier identical
+    render if it is still cached. The returned surface is shared, so it must
+    only be blitted, never drawn onto.
+
+    :param font: the font.
+    :param text: the text.
+    :param color: the text color.
+    :param size: (optional) the text size; defaults to the font's size.
+    :param style: (optional) freetype style flags.
+    :return: the rendered surface and its bounds, as from Font.render().
+    """
+    if size is None:
+        size = font.size
+    key = (font, text, size, color, style)
+    render = _text_cache.get(key)
+    if render is not None:
+        _text_cache.move_to_end(key)
+        return render
+
+    render = font.render(text=text, fgcolor=color, bgcolor=None,
+                         style=style, rotation=0, size=size)
+    _text_cache[key] = render
+    if len(_text_cache) > TEXT_CACHE_SIZE:
+        _text_cache.popitem(last=False)
+    return render
+
+
+#===============================================================================
+# Components
+#===============================================================================
 class Drawable:
     """
     A UI component that can be drawn to the screen.
+
+    The renderer only repaints a component when get_state() differs from the
+    last frame, or when dirty is set; components whose look changes in ways
+    get_state() does not capture (e.g. a board after a move) should call
+    mark_dirty().
     """
 
+    dirty = False
+    layouts = 0  # update_layout() runs by any component, for hit testing
+    _layout_key = None
+    _render_key: tuple = None
+    _render: tuple[Surface, Rect] = None
+
     def draw(self, surface: Surface) -> None:
         pass
 
+    def layout_key(self) -> object:
+        """
+        Get everything this component's layout depends on.
+
+        :return: a value that changes when update_layout() must run again;
+                 by default, the settings version.
+        """
+        return get_version()
+
+    def update_layout(self) -> None:
+        """
+        Resolve relative positions, paddings, alignment modes and theme
+        colors into absolute geometry and styles, cached on this component.
+        """
+        pass
+
+    def check_layout(self) -> None:
+        """
+        Run update_layout() if anything it depends on changed since it last
+        ran. Drawing and hit testing call this, so the layout pass runs once
+        per settings change rather than every frame.
+        """
+        key = self.layout_key()
+        if key != self._layout_key:
+            self._layout_key = key
+            self.update_layout()
+            Drawable.layouts += 1
+
+    def get_rect(self) -> Rect:
+        """
+        Get the area this component draws to.
+
+        :return: the absolute bounding rectangle.
+        """
+        return Rect(0, 0, 0, 0)
+
+    def get_state(self) -> tuple:
+        """
+        Get everything that affects how this component looks, apart from
+        global settings (resolution, dark mode, text and button modes), which
+        repaint the whole screen when they change.
+
+        :return: a tuple that compares equal between frames when this
+                 component does not need repainting.
+        """
+        return ()
+
+    def mark_dirty(self) -> None:
+        """
+        Repaint this component on the next frame.
+        """
+        self.dirty = True
+
+    def next_update(self) -> float | None:
+        """
+        Get when this component's look next changes on its own (e.g. a
+        blinking caret or an animation), so an idle main loop knows when to
+        wake up.
+
+        :return: a time.perf_counter() time, or None if the component only
+                 changes on input. A time in the past means it is animating.
+        """
+        return None
+
+    # Mouse input, dispatched by hittest.Pointer. Components that don't react
+    # to the mouse leave these alone.
+    def mouse_enter(self) -> None:
+        pass
+
+    def mouse_leave(self) -> None:
+        pass
+
+    def mouse_down(self) -> None:
+        pass
+
+    def mouse_up(self, inside: bool) -> None:
+        """
+        :param inside: whether the button was released over this component.
+        """
+        pass
+
+    def blur(self) -> None:
+        """
+        Called when the mouse is pressed elsewhere after being pressed on
+        this component.
+        """
+        pass
+
+    def render(self, text: str, color: tuple[int, int, int]) \
+            -> tuple[Surface, Rect]:
+        """
+        Render this component's text, only asking the text cache when the
+        text, color or font size changed since the last frame.
+
+        :param text: the text.
+        :param color: the text color.
+        :return: the rendered surface and its bounds.
+        """
+        key = (text, color, self.font.size)
+        if key != self._render_key:
+            self._render_key = key
+            self._render = render_text(self.font, text, color)
+        return self._render
+
 
 class Label(Drawable):
     """
@@ -42,29 +204,49 @@ class Label(Drawable):
         self.position = position
         self.font = font
 
+        self.rect: Rect = None
+        self.text_color: tuple[int, int, int] = None
+
+    def layout_key(self) -> tuple:
+        return get_version(), self.text
+
+    def update_layout(self) -> None:
+        """
+        Resolve this label's color and absolute bounds.
+        """
+        x, y = (self.position[0] * get_resolution()[0],
+                self.position[1] * get_resolution()[1])
+        self.text_color = C_TEXT_DARK if get_dark_mode() else C_TEXT_LIGHT
+        render = self.render(self.text, self.text_color)
+
+        if get_text_mode() == CENTER:
+            self.rect = render[0].get_rect(topleft=center((x, y), render[1]))
+        else:  # CORNER
+            self.rect = render[0].get_rect(topleft=(x, y - render[1].height))
+
     def draw(self, surface: Surface) -> None:
         """
         Draws this label to the given surface.
 
         :param surface: pygame Surface to draw onto.
         """
-        x, y = (self.position[0] * get_resolution()[0],
-                self.position[1] * get_resolution()[1])
+        self.check_layout()
+        surface.blit(self.render(self.text, self.text_color)[0], self.rect)
+
+    def get_rect(self) -> Rect:
+        """
+        Get the area this label draws to.
 
-        render = self.font.render(
-            text=self.text,
-            fgcolor=C_TEXT_DARK if get_dark_mode() else C_TEXT_LIGHT,
-            bgcolor=None,
-            style=STYLE_DEFAULT,
-            rotation=0,
-            size=self.font.size
-        )
+        :return: the absolute bounding rectangle.
+        """
+        self.check_layout()
+        return self.rect
 
-        if get_text_mode() == CORNER:
-            surface.blit(render[0], (x, y - render[1].height))
-        elif get_text_mode() == CENTER:
-            surface.blit(render[0],
-                         center((x, y), render[1]))
+    def get_state(self) -> tuple:
+        """
+        :return: the label text.
+        """
+        return (self.text,)
 
 
 def get_padding() -> float:
@@ -113,64 +295,61 @@ class Button(Drawable):
 
         self.text_align = text_align
         self.event_type = event_type
+        self.hovered = False
+        self.pressed = False
 
-    def draw(self, surface: Surface) -> None:
-        """
-        Draws this button to the given surface.
+        self.rect: Rect = None
+        self.text_position: tuple[float, float] = None
+        self.text_color: tuple[int, int, int] = None
+        self.colors: tuple = None  # normal, hovered, pressed
 
-        :param surface: pygame Surface to draw onto.
+    def layout_key(self) -> tuple:
+        return get_version(), self.text
+
+    def update_layout(self) -> None:
+        """
+        Resolve this button's size, absolute bounds, text position and
+        colors.
         """
         x, y = self.get_coordinates()
-
-        render = self.font.render(
-            text=self.text,
-            fgcolor=C_TEXT_DARK if get_dark_mode() else C_TEXT_LIGHT,
-            bgcolor=None,
-            style=STYLE_DEFAULT,
-            rotation=0,
-            size=self.font.size
-        )
-        bounds = render[1]
+        padding = get_padding()
+        self.text_color = C_TEXT_DARK if get_dark_mode() else C_TEXT_LIGHT
+        bounds = self.render(self.text, self.text_color)[1]
         if not self.dimensions_flag:
-            self.dimensions = (bounds.width + 2 * get_padding(),
-                               self.font.size + 2 * get_padding())
+            self.dimensions = (bounds.width + 2 * padding,
+                               self.font.size + 2 * padding)
+        w, h = self.dimensions
+
+        if get_button_mode() == CENTER:
+            x, y = x - w / 2, y - h / 2
+        self.rect = Rect(x, y, w, h)
 
         if self.text_align == CENTER:
-            x_adjust = (self.dimensions[0] - render[1].width) / 2
+            x_adjust = (w - bounds.width) / 2
         elif self.text_align == LEFT:
-            x_adjust = get_padding()
+            x_adjust = padding
         else:  # self.text_align == RIGHT
-            x_adjust = self.dimensions[0] - render[1].width - get_padding()
-        y_adjust = (self.dimensions[1] - self.font.size) / 2
-
-        if get_button_mode() == CORNER:
-            pygame.draw.rect(
-                surface,
-                self.get_color(),
-                Rect(x, y,
-                     self.dimensions[0], self.dimensions[1])
-            )
-            surface.blit(
-                render[0],
-                (x + x_adjust,
-                 y + y_adjust)
-            )
-        elif get_button_mode() == CENTER:
-            pygame.draw.rect(
-                surface,
-                self.get_color(),
-                Rect(x - self.dimensions[0] / 2,
-                     y - self.dimensions[1] / 2,
-                     self.dimensions[0],
-                     self.dimensions[1])
-            )
-            surface.blit(
-                render[0],
-                (x - self.dimensions[0] / 2 + x_adjust,
-                 y - self.dimensions[1] / 2 + y_adjust,
-                 self.dimensions[0],
-                 self.dimensions[1])
-            )
+            x_adjust = w - bounds.width - padding
+        y_adjust = (h - self.font.size) / 2
+        self.text_position = (x + x_adjust, y + y_adjust)
+
+        if get_dark_mode():
+            self.colors = (C_BUTTON_DARK, C_BUTTON_HOVER_DARK,
+                           C_BUTTON_PRESSED_DARK)
+        else:
+            self.colors = (C_BUTTON_LIGHT, C_BUTTON_HOVER_LIGHT,
+                           C_BUTTON_PRESSED_LIGHT)
+
+    def draw(self, surface: Surface) -> None:
+        """
+        Draws this button to the given surface.
+
+        :param surface: pygame Surface to draw onto.
+        """
+        self.check_layout()
+        pygame.draw.rect(surface, self.get_color(), self.rect)
+        surface.blit(self.render(self.text, self.text_color)[0],
+                     self.text_position)
 
     def get_coordinates(self) -> tuple[float, float]:
         """
@@ -181,46 +360,59 @@ class Button(Drawable):
         return (self.position[0] * get_resolution()[0],
                 self.position[1] * get_resolution()[1])
 
-    def check_click(self) -> None:
+    def get_rect(self) -> Rect:
         """
-        Should be called on each frame; checks if this button is clicked,
-        and if so, posts this button's event.
+        Get the area this button draws to.
+
+        :return: the absolute bounding rectangle.
         """
-        if self.event_type is None:
-            return
-        if self.is_pressed():
+        self.check_layout()
+        return self.rect
+
+    def get_state(self) -> tuple:
+        """
+        :return: the button text and its hover/pressed color.
+        """
+        return self.text, self.get_color()
+
+    def mouse_enter(self) -> None:
+        self.hovered = True
+
+    def mouse_leave(self) -> None:
+        self.hovered = False
+
+    def mouse_down(self) -> None:
+        self.pressed = True
+
+    def mouse_up(self, inside: bool) -> None:
+        """
+        Posts this button's event once per click: when the mouse button is
+        released over the button it was pressed on.
+
+        :param inside: whether the mouse is still over this button.
+        """
+        self.pressed = False
+        if inside and self.event_type is not None:
             post(Event(self.event_type))
 
     def is_hovered(self) -> bool:
         """
-        Get whether the mouse is currently hovering above this button.
-        Ignores the presence of occluding objects.
+        Get whether the mouse is hovering above this button, as of the last
+        mouse event.
 
-        :return: whether the mouse's coordinates are within the bounds of
-                 this button.
+        :return: whether this button is the topmost component under the
+                 mouse.
         """
-        x, y = self.get_coordinates()
-
-        if get_button_mode() == CORNER:
-            return Rect(x, y,
-                        self.dimensions[0], self.dimensions[1]) \
-                .collidepoint(pygame.mouse.get_pos())
-        elif get_button_mode() == CENTER:
-            return Rect(x - self.dimensions[0] / 2,
-                        y - self.dimensions[1] / 2,
-                        self.dimensions[0],
-                        self.dimensions[1]
-                        ) \
-                .collidepoint(pygame.mouse.get_pos())
+        return self.hovered
 
     def is_pressed(self) -> bool:
         """
         Get whether the mouse is pressed on this button.
-        Ignores the presence of occluding objects.
 
-        :return: whether the mouse is inside this button and pressed (mouse 1).
+        :return: whether mouse 1 was pressed on this button and is still
+                 down over it.
         """
-        return pygame.mouse.get_pressed()[0] and self.is_hovered()
+        return self.pressed and self.hovered
 
     def get_color(self) -> tuple[int, int, int]:
         """
@@ -229,18 +421,12 @@ class Button(Drawable):
 
         :return: an int 3-tuple for the color's RGB.
         """
-        if get_dark_mode():
-            if self.is_pressed():
-                return C_BUTTON_PRESSED_DARK
-            if self.is_hovered():
-                return C_BUTTON_HOVER_DARK
-            return C_BUTTON_DARK
-        else:
-            if self.is_pressed():
-                return C_BUTTON_PRESSED_LIGHT
-            if self.is_hovered():
-                return C_BUTTON_HOVER_LIGHT
-            return C_BUTTON_LIGHT
+        self.check_layout()
+        if self.is_pressed():
+            return self.colors[2]
+        if self.is_hovered():
+            return self.colors[1]
+        return self.colors[0]
 
 
 class TextBox(Drawable):
@@ -268,7 +454,32 @@ class TextBox(Drawable):
             self.prompt = prompt
         self.text = ""
         self.selected = False
-        self.caret_frame_count = 0
+        self.caret_start = 0.0  # time.perf_counter() of the last reset
+
+        self.rect: Rect = None
+        self.text_position: tuple[float, float] = None
+        self.colors: dict[str, tuple[int, int, int]] = None
+
+    def update_layout(self) -> None:
+        """
+        Resolve this text box's absolute bounds, text position and colors.
+        """
+        x, y = self.get_coordinates()
+        w, h = self.get_width(), self.font.size + 2 * get_padding()
+
+        if get_button_mode() == CENTER:
+            x, y = x - w / 2, y - h / 2
+        self.rect = Rect(x, y, w, h)
+        self.text_position = (x + get_padding(), y + get_padding())
+
+        if get_dark_mode():
+            self.colors = dict(text=C_TEXT_DARK, prompt=C_TEXT_PROMPT_DARK,
+                               box=C_TEXT_BOX_DARK,
+                               active=C_TEXT_BOX_ACTIVE_DARK)
+        else:
+            self.colors = dict(text=C_TEXT_LIGHT, prompt=C_TEXT_PROMPT_LIGHT,
+                               box=C_TEXT_BOX_LIGHT,
+                               active=C_TEXT_BOX_ACTIVE_LIGHT)
 
     def draw(self, surface: Surface) -> None:
         """
@@ -276,52 +487,23 @@ class TextBox(Drawable):
 
         :param surface: the surface to draw to.
         """
-        x, y = self.get_coordinates()
-        w, h = self.get_width(), self.font.size + 2 * get_padding()
+        self.check_layout()
 
-        # TODO: "caret" simulation
-        text_to_render = self.text if len(self.text) > 0 else self.prompt
-        if get_dark_mode():
-            text_color = C_TEXT_DARK if len(self.text) > 0\
-                else C_TEXT_PROMPT_DARK
-            box_color = C_TEXT_BOX_ACTIVE_DARK if self.selected\
-                else C_TEXT_BOX_DARK
+        if len(self.text) > 0:
+            render = self.render(self.text, self.colors["text"])
         else:
-            text_color = C_TEXT_LIGHT if len(self.text) > 0\
-                else C_TEXT_PROMPT_LIGHT
-            box_color = C_TEXT_BOX_ACTIVE_LIGHT if self.selected\
-                else C_TEXT_BOX_ACTIVE_LIGHT
-        render = self.font.render(
-            text=text_to_render,
-            fgcolor=text_color,
-            bgcolor=None,
-            style=STYLE_DEFAULT,
-            rotation=0,
-            size=self.font.size
-        )
-
-        if get_button_mode() == CORNER:
-            pygame.draw.rect(
-                surface,
-                box_color,
-                Rect(x, y, w, h)
-            )
-            surface.blit(
-                render[0],
-                (x + get_padding(),
-                 y + get_padding())
-            )
-        elif get_button_mode() == CENTER:
-            pygame.draw.rect(
-                surface,
-                box_color,
-                Rect(x - w / 2, y - h / 2, w, h)
-            )
-            surface.blit(
-                render[0],
-                (x - w / 2 + get_padding(),
-                 y - h / 2 + get_padding())
-            )
+            render = self.render(self.prompt, self.colors["prompt"])
+
+        pygame.draw.rect(surface,
+                         self.colors["active" if self.selected else "box"],
+                         self.rect)
+        surface.blit(render[0], self.text_position)
+
+        if self.is_caret_visible():
+            x = self.text_position[0] + (render[1].width if self.text else 0)
+            y = self.text_position[1]
+            pygame.draw.line(surface, self.colors["text"],
+                             (x, y), (x, y + self.font.size), 2)
 
     def get_coordinates(self) -> tuple[float, float]:
         """
@@ -340,19 +522,56 @@ class TextBox(Drawable):
         """
         return self.width * get_resolution()[0]
 
-    def check_click(self) -> None:
+    def get_rect(self) -> Rect:
         """
-        Should be called on each frame; checks if this text box is clicked,
-        and if so, selects this text box as active. If the mouse is clicked
-        outside the text box, unselects this text box.
+        Get the area this text box draws to.
+
+        :return: the absolute bounding rectangle.
         """
-        if pygame.mouse.get_pressed()[0]:
-            if self.is_hovered():
-                self.selected = True
-                self.caret_frame_count = 0
-                # TODO: use caret frame count to animate caret
-            else:
-                self.selected = False
+        self.check_layout()
+        return self.rect
+
+    def get_state(self) -> tuple:
+        """
+        :return: the entered text, whether this text box is selected and
+                 whether the caret is showing.
+        """
+        return self.text, self.selected, self.is_caret_visible()
+
+    def is_caret_visible(self) -> bool:
+        """
+        Get whether the caret shows now. It blinks while this text box is
+        selected, and shows right after a click or keystroke.
+
+        :return: whether to draw the caret.
+        """
+        if not self.selected:
+            return False
+        half = CARET_BLINK_PERIOD / 2
+        return int((time.perf_counter() - self.caret_start) / half) % 2 == 0
+
+    def next_update(self) -> float | None:
+        """
+        :return: when the caret next blinks, or None if not selected.
+        """
+        if not self.selected:
+            return None
+        half = CARET_BLINK_PERIOD / 2
+        blinks = int((time.perf_counter() - self.caret_start) / half)
+        return self.caret_start + (blinks + 1) * half
+
+    def mouse_down(self) -> None:
+        """
+        Selects this text box as active when it is clicked.
+        """
+        self.selected = True
+        self.caret_start = time.perf_counter()
+
+    def blur(self) -> None:
+        """
+        Unselects this text box when the mouse is clicked outside it.
+        """
+        self.selected = False
 
     def check_type(self, key_down: Event) -> None:
         """
@@ -368,24 +587,153 @@ class TextBox(Drawable):
             self.text = self.text[:-1]
         else:
             self.text += key_down.unicode
+        self.caret_start = time.perf_counter()
 
-    def is_hovered(self) -> bool:
+
+class ProfilerOverlay(Drawable):
+    """
+    Box in the top right corner showing FPS, frame-time percentiles and the
+    time spent in each phase of the frame, from the profiler module.
+    """
+
+    PHASES = ["events", "update", "display", "overlay", "flip"]
+
+    def __init__(self, font: Font) -> None:
         """
-        Get whether the mouse is currently hovering above this button.
-        Ignores the presence of occluding objects.
+        Constructor.
 
-        :return: whether the mouse's coordinates are within the bounds of
-                 this button.
+        :param font: font family of the overlay text.
         """
-        x, y = self.get_coordinates()
-        w, h = self.get_width(), self.font.size + 2 * get_padding()
+        self.font = font
+        self.frame_count = 0
+        self.lines: list[Surface] = []
+
+        self.rect: Rect = None
+        self.padding = 0.0
+        self.line_height = 0.0
+        self.colors: tuple = None  # text, background
+
+    def update_layout(self) -> None:
+        """
+        Resolve the box's absolute bounds and colors.
+        """
+        self.padding = padding = get_padding() / 2
+        self.line_height = PROFILER_FONT_SIZE * 1.4
+        w = 0.22 * get_resolution()[0]
+        h = (3 + len(self.PHASES)) * self.line_height + 2 * padding
+        self.rect = Rect(get_resolution()[0] - w - padding, padding, w, h)
+        if get_dark_mode():
+            self.colors = (C_TEXT_DARK, C_BUTTON_PRESSED_DARK)
+        else:
+            self.colors = (C_TEXT_LIGHT, C_BUTTON_PRESSED_LIGHT)
+
+    def get_text(self) -> list[str]:
+        """
+        :return: the lines of text to show.
+        """
+        stats = profiler.frame_stats()
+        if not stats:
+            return ["profiling..."]
+        phases = stats["phases"]
+        return [f"{stats['fps']:.1f} FPS",
+                f"frame p50 {stats['p50']:.2f}  p95 {stats['p95']:.2f} ms",
+                f"p99 {stats['p99']:.2f}  max {stats['max']:.2f} ms"] \
+            + [f"{phase:<8} {phases.get(phase, 0.0):.3f} ms"
+               for phase in self.PHASES]
+
+    def draw(self, surface: Surface) -> None:
+        """
+        Draw the overlay; its text is refreshed every PROFILER_REFRESH
+        frames. Rendered directly rather than through render_text(), so
+        the ever-changing numbers don't push labels out of the text cache.
+
+        :param surface: the surface to draw to.
+        """
+        self.check_layout()
+        if self.frame_count % PROFILER_REFRESH == 0:
+            self.lines = [self.font.render(text=text, fgcolor=self.colors[0],
+                                           size=PROFILER_FONT_SIZE)[0]
+                          for text in self.get_text()]
+        self.frame_count += 1
+
+        pygame.draw.rect(surface, self.colors[1], self.rect)
+        clip = surface.get_clip()
+        surface.set_clip(self.rect)
+        for i, line in enumerate(self.lines):
+            surface.blit(line, (self.rect.x + self.padding,
+                                self.rect.y + self.padding
+                                + i * self.line_height))
+        surface.set_clip(clip)
 
-        if get_button_mode() == CORNER:
-            return Rect(x, y, w, h).collidepoint(pygame.mouse.get_pos())
-        elif get_button_mode() == CENTER:
-            return Rect(x - w / 2, y - h / 2, w, h) \
-                .collidepoint(pygame.mouse.get_pos())
+    def get_rect(self) -> Rect:
+        """
+        Get the area this overlay draws to.
+
+        :return: the absolute bounding rectangle.
+        """
+        self.check_layout()
+        return self.rect
 
 
+#===============================================================================
+# Transitions
+#===============================================================================
 class Transition:
-    pass
+    """
+    Cross-fade from one screen to another.
+
+    Both screens are rendered once, to off-screen snapshots, when the
+    transition starts; each frame of the effect only composites the two
+    snapshots rather than drawing either screen's components.
+    """
+
+    def __init__(self, old: Surface, new: Surface,
+                 duration: float = TRANSITION_TIME) -> None:
+        """
+        Constructor.
+
+        :param old: snapshot of the outgoing screen.
+        :param new: snapshot of the incoming screen, the same size.
+        :param duration: (optional) length in seconds.
+        """
+        self.old = old
+        self.new = new
+        self.duration = duration
+        self.start = time.perf_counter()
+
+    def get_progress(self, now: float = None) -> float:
+        """
+        :param now: (optional) a time.perf_counter() time; defaults to now.
+        :return: linear progress, from 0 to 1.
+        """
+        if now is None:
+            now = time.perf_counter()
+        return min(1.0, max(0.0, (now - self.start) / self.duration))
+
+    def is_done(self, now: float = None) -> bool:
+        """
+        :param now: (optional) a time.perf_counter() time; defaults to now.
+        :return: whether the incoming screen is fully shown.
+        """
+        return self.get_progress(now) >= 1
+
+    def draw(self, surface: Surface, now: float = None) -> None:
+        """
+        Draw the current frame of the transition.
+
+        :param surface: the surface to draw to, e.g. the display.
+        :param now: (optional) a time.perf_counter() time; defaults to now.
+        """
+        self.composite(surface, ease(self.get_progress(now)))
+
+    def composite(self, surface: Surface, t: float) -> None:
+        """
+        Blend the snapshots.
+
+        :param surface: the surface to draw to.
+        :param t: eased progress, from 0 to 1.
+        """
+        surface.blit(self.old, (0, 0))
+        self.new.set_alpha(int(255 * t))
+        surface.blit(self.new, (0, 0))
+        self.new.set_alpha(None)
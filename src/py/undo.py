@@ -0,0 +1,250 @@
+"""
+Undo cache: a game's history as compact deltas, with periodic keyframes.
+
+Every ply is stored as a packed delta of about ten bytes (see
+boardstate.encode_delta()), instead of a full board state. Every
+keyframe_interval plies a full state is kept as a keyframe, so reaching any
+earlier position replays at most a few deltas from the nearest keyframe (or
+reverts them from the current position). Keyframes are only shortcuts: when
+the cache outgrows its memory ceiling, the oldest are compressed, then
+evicted. Deltas are never dropped, so a game can always be undone to its
+start. To check the cache against full states on random games, from this
+directory:
+
+$ python3 undo.py --check
+"""
+
+import argparse
+import random
+import sys
+import zlib
+from array import array
+from typing import Iterator
+
+from boardstate import BoardState, Delta, encode_delta, decode_delta
+
+
+class UndoCache:
+    """
+    Stack of the deltas played since a starting state. Ply 0 is the starting
+    state; ply n is the state after n deltas.
+    """
+
+    def __init__(self, start: BoardState, keyframe_interval: int = 32,
+                 max_bytes: int = 64 * 1024) -> None:
+        """
+        Constructor.
+
+        :param start: the starting state; it is copied.
+        :param keyframe_interval: (optional) plies between keyframes.
+        :param max_bytes: (optional) memory ceiling, in bytes of deltas and
+                          keyframes, above which keyframes are compressed and
+                          then evicted, oldest first.
+        """
+        self.keyframe_interval = keyframe_interval
+        self.max_bytes = max_bytes
+        self.current = start.copy()  # the state at the top of the stack
+
+        # delta i is data[offsets[i]:offsets[i + 1]]
+        self.data = bytearray()
+        self.offsets = array("I", [0])
+        # ply -> serialized state, compressed if the ply is in `compressed`
+        self.keyframes: dict[int, bytes] = {0: bytes(start)}
+        self.compressed: set[int] = set()
+
+    def __len__(self) -> int:
+        """
+        :return: the number of plies, i.e. the ply of the current state.
+        """
+        return len(self.offsets) - 1
+
+    #---------------------------------------------------------------------------
+    # Stack
+    #---------------------------------------------------------------------------
+    def push(self, delta: Delta) -> None:
+        """
+        Record a ply, e.g. Position.delta() of the move about to be played.
+
+        :param delta: the delta from the current state to the next.
+        """
+        self.current.apply(delta)
+        self.data += encode_delta(delta)
+        self.offsets.append(len(self.data))
+        ply = len(self)
+        if ply % self.keyframe_interval == 0:
+            self.keyframes[ply] = bytes(self.current)
+            self._trim()
+
+    def pop(self) -> Delta:
+        """
+        Undo the last ply. The returned delta is what a move-back animation
+        needs: its pieces moved, removed and added, in reverse.
+
+        :return: the delta from the new current state to the old one.
+        """
+        if not len(self):
+            raise IndexError("nothing to undo")
+        delta = self.delta(len(self) - 1)
+        self.keyframes.pop(len(self), None)
+        self.compressed.discard(len(self))
+        del self.data[self.offsets[-2]:]
+        self.offsets.pop()
+        self.current.revert(delta)
+        return delta
+
+    def peek(self) -> Delta | None:
+        """
+        :return: the delta of the last ply, or None at the start.
+        """
+        return self.delta(len(self) - 1) if len(self) else None
+
+    def truncate(self, ply: int) -> None:
+        """
+        Go back to an earlier ply and forget every later one, e.g. to start a
+        new branch from there.
+
+        :param ply: the ply to keep as the current state.
+        """
+        if ply >= len(self):
+            return
+        self.current = self.state_at(ply)
+        del self.data[self.offsets[ply]:]
+        del self.offsets[ply + 1:]
+        for key in [key for key in self.keyframes if key > ply]:
+            del self.keyframes[key]
+            self.compressed.discard(key)
+
+    #---------------------------------------------------------------------------
+    # History
+    #---------------------------------------------------------------------------
+    def delta(self, ply: int) -> Delta:
+        """
+        :param ply: from 0 to len(self) - 1.
+        :return: the delta from the state at ply to the next.
+        """
+        if not 0 <= ply < len(self):
+            raise IndexError(f"no delta after ply {ply}")
+        return decode_delta(self.data[self.offsets[ply]:
+                                      self.offsets[ply + 1]])
+
+    def deltas(self, start: int = 0, stop: int = None) -> Iterator[Delta]:
+        """
+        Iterate over consecutive deltas, e.g. to animate a replay.
+
+        :param start: (optional) the first ply.
+        :param stop: (optional) the ply after the last; defaults to len(self).
+        :return: the deltas from start to stop.
+        """
+        for ply in range(start, len(self) if stop is None else stop):
+            yield self.delta(ply)
+
+    def state_at(self, ply: int) -> BoardState:
+        """
+        Reconstruct the state at an earlier ply from the nearest keyframe or
+        the current state, whichever needs fewer deltas.
+
+        :param ply: from 0 to len(self).
+        :return: a new BoardState.
+        """
+        if not 0 <= ply <= len(self):
+            raise IndexError(f"no ply {ply}")
+        nearest = min(self.keyframes, key=lambda key: abs(key - ply),
+                      default=len(self))
+        if abs(nearest - ply) >= len(self) - ply:
+            nearest = len(self)
+        state = self.current.copy() if nearest == len(self) \
+            else BoardState(self._keyframe(nearest))
+
+        for i in range(nearest, ply):
+            state.apply(self.delta(i))
+        for i in range(nearest - 1, ply - 1, -1):
+            state.revert(self.delta(i))
+        return state
+
+    #---------------------------------------------------------------------------
+    # Memory
+    #---------------------------------------------------------------------------
+    def memory(self) -> int:
+        """
+        :return: bytes used by deltas and keyframes, not counting object
+                 overhead.
+        """
+        return (len(self.data) + self.offsets.itemsize * len(self.offsets)
+                + sum(map(len, self.keyframes.values())))
+
+    def _keyframe(self, ply: int) -> bytes:
+        data = self.keyframes[ply]
+        return zlib.decompress(data) if ply in self.compressed else data
+
+    def _trim(self) -> None:
+        """
+        Compress, then evict, the oldest keyframes until under the ceiling.
+        """
+        for ply in sorted(self.keyframes):
+            if self.memory() <= self.max_bytes:
+                return
+            if ply not in self.compressed:
+                self.keyframes[ply] = zlib.compress(self.keyframes[ply], 9)
+                self.compressed.add(ply)
+        for ply in sorted(self.keyframes):
+            if self.memory() <= self.max_bytes:
+                return
+            del self.keyframes[ply]
+            self.compressed.discard(ply)
+
+
+def check(games: int = 20, seed: int = 0) -> bool:
+    """
+    Play random games, undoing and redoing moves at random, and compare
+    every state the cache gives back with the positions' own states.
+
+    :param games: (optional) number of games.
+    :param seed: (optional) seed for the random moves.
+    :return: whether every state matched.
+    """
+    from movegen import Position, ARMIES  # only needed for the check
+
+    rng = random.Random(seed)
+    ok = True
+    for game in range(games):
+        pos = Position.start(rng.choice(ARMIES), rng.choice(ARMIES))
+        cache = UndoCache(pos.state(), keyframe_interval=8,
+                          max_bytes=rng.choice((300, 2000, 64 * 1024)))
+        states = [pos.state()]
+        for _ in range(200):
+            if len(cache) and rng.random() < 0.2:
+                # pop, then push again below, so a stale offset would show
+                cache.pop()
+                pos.unmake()
+                states.pop()
+            moves = pos.legal_moves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            cache.push(pos.delta(move))
+            pos.make(move)
+            states.append(pos.state())
+        matched = cache.current == states[-1] and all(
+            cache.state_at(ply) == state for ply, state in enumerate(states))
+        while matched and len(cache):
+            cache.pop()
+            states.pop()
+            matched = cache.current == states[-1]
+        print(f"game {game} {pos.armies}: {'ok' if matched else 'FAIL'}")
+        ok = ok and matched
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--check", action="store_true",
+                        help="check undo and redo on random games")
+    parser.add_argument("--games", type=int, default=20)
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(0 if check(args.games) else 1)
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()